@@ -3,7 +3,9 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 import os
 
-db = SQLAlchemy()
+from app.services.replicas import SesionConReplica
+
+db = SQLAlchemy(session_options={'class_': SesionConReplica})
 login_manager = LoginManager()
 
 def create_app(config_name=None):
@@ -29,20 +31,67 @@ def create_app(config_name=None):
     login_manager.login_message = 'Por favor inicia sesión para acceder a esta página.'
     login_manager.login_message_category = 'info'
     
-    # Configurar el cargador de usuarios
-    from app.models import Usuario
+    # Lecturas de reportes desde la réplica, si está configurada
+    from app.services.replicas import init_replicas
+    init_replicas(app)
+    
+    # Cargas perezosas de relaciones: permitir, avisar o error (CARGA_PEREZOSA)
+    from app.services.relaciones import init_relaciones
+    init_relaciones(app)
+    
+    # Versión de las notas de cada curso, incrementada al guardar (reportes, PDFs y ETag)
+    from app.services.versiones import init_versiones_notas
+    init_versiones_notas(app)
+    
+    # Tiempo máximo de las consultas en MySQL (el pool se configura en config.py)
+    from app.services.motor import init_motor
+    init_motor(app)
+    
+    # Perfilador de consultas SQL por petición
+    from app.services.perfilador import init_perfilador
+    init_perfilador(app)
+    
+    # Cola de trabajos en segundo plano (PDFs)
+    from app.services.trabajos import init_cola_trabajos
+    init_cola_trabajos(app)
+    
+    # Configurar el cargador de usuarios (identidad compacta en caché)
+    from app.services.identidades import init_cache_usuarios, cargar_identidad
+    init_cache_usuarios(app)
     
     @login_manager.user_loader
     def load_user(user_id):
-        return Usuario.query.get(int(user_id))
+        return cargar_identidad(int(user_id))
+    
+    # Caché de las búsquedas de autocompletado del administrador
+    from app.services.busqueda import init_cache_busquedas
+    init_cache_busquedas(app)
+    
+    # Caché de los expedientes (cursos y notas publicadas) de cada alumno
+    from app.services.expedientes import init_cache_expedientes
+    init_cache_expedientes(app)
+    
+    # Caché de fragmentos HTML de las plantillas ({% cache %})
+    from app.services.fragmentos import init_cache_fragmentos
+    init_cache_fragmentos(app)
+    
+    # ETag en páginas de notas y reportes (RESPUESTAS_CONDICIONALES)
+    from app.services.condicionales import init_respuestas_condicionales
+    init_respuestas_condicionales(app)
     
     # Registrar blueprints
     from .routes import blueprints
     for bp in blueprints:
         app.register_blueprint(bp)
     
-    # Crear tablas de la base de datos
-    with app.app_context():
-        db.create_all()
+    # Comandos de consola (flask --app app crear-tablas)
+    from app.comandos import registrar_comandos, crear_tablas
+    registrar_comandos(app)
+    
+    # Crear las tablas al iniciar solo si se pide (desarrollo); en producción se usa
+    # `flask --app app crear-tablas` y cada worker arranca sin consultar el esquema
+    if app.config.get('CREAR_TABLAS_AL_INICIAR'):
+        with app.app_context():
+            crear_tablas()
     
     return app
\ No newline at end of file
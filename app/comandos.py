@@ -0,0 +1,26 @@
+"""
+Comandos de consola de la aplicación (Flask CLI).
+
+    flask --app app crear-tablas      # crea las tablas que falten en la base principal
+
+Las tablas ya no se crean en cada arranque de create_app (salvo con
+CREAR_TABLAS_AL_INICIAR, activo en desarrollo): se crean una vez al instalar o
+desplegar, y los índices de bases existentes se agregan con migrar_indices.py.
+"""
+
+import click
+
+from app import db
+
+
+def crear_tablas():
+    """Crea las tablas que falten (solo en la base principal: la réplica las recibe por replicación)"""
+    db.create_all(bind_key=None)
+
+
+def registrar_comandos(app):
+    @app.cli.command('crear-tablas')
+    def crear_tablas_comando():
+        """Crea las tablas que falten en la base de datos principal."""
+        crear_tablas()
+        click.echo('✅ Tablas creadas (las existentes no se modifican).')
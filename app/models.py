@@ -1,11 +1,17 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 from app import db
+from app.services.calificaciones import promedio_notas, promedio_final
+from app.services.contrasenas import generar_hash, verificar_contrasena
 
 class Usuario(UserMixin, db.Model):
     __tablename__ = 'usuarios'
+    __table_args__ = (
+        # Búsqueda por prefijo de nombre o apellido (autocompletado)
+        db.Index('ix_usuarios_rol_nombre', 'rol', 'nombre'),
+        db.Index('ix_usuarios_rol_apellido', 'rol', 'apellido'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     dni = db.Column(db.String(20), unique=True, nullable=False)
@@ -17,22 +23,26 @@ class Usuario(UserMixin, db.Model):
     activo = db.Column(db.Boolean, default=True)
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
     
-    # Relaciones
-    cursos_asignados = db.relationship('CursoDocente', backref='docente', lazy=True)
-    notas_como_alumno = db.relationship('Nota', foreign_keys='Nota.alumno_id', backref='alumno', lazy=True)
-    notas_como_docente = db.relationship('Nota', foreign_keys='Nota.docente_id', backref='docente', lazy=True)
+    # Relaciones: las colecciones no se recorren (se cuentan o se consultan aparte);
+    # lazy='raise' evita cargarlas por accidente. Ver app/services/relaciones.py
+    cursos_asignados = db.relationship('CursoDocente', backref=db.backref('docente', lazy='select'), lazy='raise')
+    notas_como_alumno = db.relationship('Nota', foreign_keys='Nota.alumno_id', backref=db.backref('alumno', lazy='select'), lazy='raise')
+    notas_como_docente = db.relationship('Nota', foreign_keys='Nota.docente_id', backref=db.backref('docente', lazy='select'), lazy='raise')
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generar_hash(password, self.rol)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verificar_contrasena(self.password_hash, password)
     
     def __repr__(self):
         return f'<Usuario {self.nombre} {self.apellido}>'
 
 class Curso(db.Model):
     __tablename__ = 'cursos'
+    __table_args__ = (
+        db.Index('ix_cursos_nombre', 'nombre'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(100), nullable=False)
@@ -43,20 +53,25 @@ class Curso(db.Model):
     ciclo_academico_id = db.Column(db.Integer, db.ForeignKey('ciclos_academicos.id'), nullable=True)
     activo = db.Column(db.Boolean, default=True)
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+    # Contador que cambia con cada escritura de sus notas (app/services/versiones.py)
+    version_notas = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
-    # Relaciones
-    docentes = db.relationship('CursoDocente', backref='curso', lazy=True)
-    alumnos = db.relationship('CursoAlumno', backref='curso', lazy=True)
-    notas = db.relationship('Nota', backref='curso', lazy=True)
-    notas_actividades = db.relationship('NotaActividades', backref='curso', lazy=True)
-    notas_practicas = db.relationship('NotaPracticas', backref='curso', lazy=True)
-    notas_parciales = db.relationship('NotaParcial', backref='curso', lazy=True)
+    # Relaciones: colecciones solo para joins; la referencia inversa (curso) se carga por consulta
+    docentes = db.relationship('CursoDocente', backref=db.backref('curso', lazy='select'), lazy='raise')
+    alumnos = db.relationship('CursoAlumno', backref=db.backref('curso', lazy='select'), lazy='raise')
+    notas = db.relationship('Nota', backref=db.backref('curso', lazy='select'), lazy='raise')
+    notas_actividades = db.relationship('NotaActividades', backref=db.backref('curso', lazy='select'), lazy='raise')
+    notas_practicas = db.relationship('NotaPracticas', backref=db.backref('curso', lazy='select'), lazy='raise')
+    notas_parciales = db.relationship('NotaParcial', backref=db.backref('curso', lazy='select'), lazy='raise')
     
     def __repr__(self):
         return f'<Curso {self.nombre}>'
 
 class CursoDocente(db.Model):
     __tablename__ = 'curso_docente'
+    __table_args__ = (
+        db.Index('uq_curso_docente', 'curso_id', 'docente_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     curso_id = db.Column(db.Integer, db.ForeignKey('cursos.id'), nullable=False)
@@ -64,10 +79,13 @@ class CursoDocente(db.Model):
     fecha_asignacion = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
-        return f'<CursoDocente {self.curso.nombre} - {self.docente.nombre}>'
+        return f'<CursoDocente curso={self.curso_id} docente={self.docente_id}>'
 
 class CursoAlumno(db.Model):
     __tablename__ = 'curso_alumno'
+    __table_args__ = (
+        db.Index('uq_curso_alumno', 'curso_id', 'alumno_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     curso_id = db.Column(db.Integer, db.ForeignKey('cursos.id'), nullable=False)
@@ -75,11 +93,14 @@ class CursoAlumno(db.Model):
     fecha_matricula = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
-        return f'<CursoAlumno {self.curso.nombre} - {self.alumno.nombre}>'
+        return f'<CursoAlumno curso={self.curso_id} alumno={self.alumno_id}>'
 
 # NUEVA TABLA: NotaActividades (8 notas + promedio)
 class NotaActividades(db.Model):
     __tablename__ = 'notas_actividades'
+    __table_args__ = (
+        db.Index('uq_notas_actividades_curso_alumno', 'curso_id', 'alumno_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     curso_id = db.Column(db.Integer, db.ForeignKey('cursos.id'), nullable=False)
@@ -106,8 +127,8 @@ class NotaActividades(db.Model):
     comentarios = db.Column(db.Text)
     
     # Relaciones
-    alumno = db.relationship('Usuario', foreign_keys=[alumno_id], backref='notas_actividades_como_alumno', lazy=True)
-    docente = db.relationship('Usuario', foreign_keys=[docente_id], backref='notas_actividades_como_docente', lazy=True)
+    alumno = db.relationship('Usuario', foreign_keys=[alumno_id], backref=db.backref('notas_actividades_como_alumno', lazy='raise'), lazy='select')
+    docente = db.relationship('Usuario', foreign_keys=[docente_id], backref=db.backref('notas_actividades_como_docente', lazy='raise'), lazy='select')
     
     def calcular_promedio_actividades(self):
         """Calcula el promedio de las 8 actividades"""
@@ -115,23 +136,18 @@ class NotaActividades(db.Model):
             self.actividad1, self.actividad2, self.actividad3, self.actividad4,
             self.actividad5, self.actividad6, self.actividad7, self.actividad8
         ]
-        
-        # Filtrar notas válidas (mayores a 0)
-        notas_validas = [nota for nota in actividades if nota and nota > 0]
-        
-        if notas_validas:
-            self.promedio_actividades = sum(notas_validas) / len(notas_validas)
-        else:
-            self.promedio_actividades = 0.0
-            
+        self.promedio_actividades = promedio_notas(actividades)
         return self.promedio_actividades
     
     def __repr__(self):
-        return f'<NotaActividades {self.alumno.nombre} - {self.curso.nombre}: {self.promedio_actividades}>'
+        return f'<NotaActividades curso={self.curso_id} alumno={self.alumno_id}: {self.promedio_actividades}>'
 
 # NUEVA TABLA: NotaPracticas (4 notas + promedio)
 class NotaPracticas(db.Model):
     __tablename__ = 'notas_practicas'
+    __table_args__ = (
+        db.Index('uq_notas_practicas_curso_alumno', 'curso_id', 'alumno_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     curso_id = db.Column(db.Integer, db.ForeignKey('cursos.id'), nullable=False)
@@ -154,29 +170,24 @@ class NotaPracticas(db.Model):
     comentarios = db.Column(db.Text)
     
     # Relaciones
-    alumno = db.relationship('Usuario', foreign_keys=[alumno_id], backref='notas_practicas_como_alumno', lazy=True)
-    docente = db.relationship('Usuario', foreign_keys=[docente_id], backref='notas_practicas_como_docente', lazy=True)
+    alumno = db.relationship('Usuario', foreign_keys=[alumno_id], backref=db.backref('notas_practicas_como_alumno', lazy='raise'), lazy='select')
+    docente = db.relationship('Usuario', foreign_keys=[docente_id], backref=db.backref('notas_practicas_como_docente', lazy='raise'), lazy='select')
     
     def calcular_promedio_practicas(self):
         """Calcula el promedio de las 4 prácticas"""
         practicas = [self.practica1, self.practica2, self.practica3, self.practica4]
-        
-        # Filtrar notas válidas (mayores a 0)
-        notas_validas = [nota for nota in practicas if nota and nota > 0]
-        
-        if notas_validas:
-            self.promedio_practicas = sum(notas_validas) / len(notas_validas)
-        else:
-            self.promedio_practicas = 0.0
-            
+        self.promedio_practicas = promedio_notas(practicas)
         return self.promedio_practicas
     
     def __repr__(self):
-        return f'<NotaPracticas {self.alumno.nombre} - {self.curso.nombre}: {self.promedio_practicas}>'
+        return f'<NotaPracticas curso={self.curso_id} alumno={self.alumno_id}: {self.promedio_practicas}>'
 
 # NUEVA TABLA: NotaParcial (2 notas + promedio)
 class NotaParcial(db.Model):
     __tablename__ = 'notas_parciales'
+    __table_args__ = (
+        db.Index('uq_notas_parciales_curso_alumno', 'curso_id', 'alumno_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     curso_id = db.Column(db.Integer, db.ForeignKey('cursos.id'), nullable=False)
@@ -197,29 +208,26 @@ class NotaParcial(db.Model):
     comentarios = db.Column(db.Text)
     
     # Relaciones
-    alumno = db.relationship('Usuario', foreign_keys=[alumno_id], backref='notas_parciales_como_alumno', lazy=True)
-    docente = db.relationship('Usuario', foreign_keys=[docente_id], backref='notas_parciales_como_docente', lazy=True)
+    alumno = db.relationship('Usuario', foreign_keys=[alumno_id], backref=db.backref('notas_parciales_como_alumno', lazy='raise'), lazy='select')
+    docente = db.relationship('Usuario', foreign_keys=[docente_id], backref=db.backref('notas_parciales_como_docente', lazy='raise'), lazy='select')
     
     def calcular_promedio_parciales(self):
         """Calcula el promedio de los 2 parciales"""
         parciales = [self.parcial1, self.parcial2]
-        
-        # Filtrar notas válidas (mayores a 0)
-        notas_validas = [nota for nota in parciales if nota and nota > 0]
-        
-        if notas_validas:
-            self.promedio_parciales = sum(notas_validas) / len(notas_validas)
-        else:
-            self.promedio_parciales = 0.0
-            
+        self.promedio_parciales = promedio_notas(parciales)
         return self.promedio_parciales
     
     def __repr__(self):
-        return f'<NotaParcial {self.alumno.nombre} - {self.curso.nombre}: {self.promedio_parciales}>'
+        return f'<NotaParcial curso={self.curso_id} alumno={self.alumno_id}: {self.promedio_parciales}>'
 
 # TABLA MODIFICADA: Nota (ahora con promedios de las 3 nuevas tablas)
 class Nota(db.Model):
     __tablename__ = 'notas'
+    __table_args__ = (
+        db.Index('uq_notas_curso_alumno', 'curso_id', 'alumno_id', unique=True),
+        # Paginación por clave del listado de notas del administrador
+        db.Index('ix_notas_fecha_actualizacion_id', 'fecha_actualizacion', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     curso_id = db.Column(db.Integer, db.ForeignKey('cursos.id'), nullable=False)
@@ -244,15 +252,15 @@ class Nota(db.Model):
     
     # Fechas
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
-    fecha_actualizacion = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    fecha_actualizacion = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Comentarios
     comentarios = db.Column(db.Text)
     
-    # Relaciones con las tablas de notas detalladas
-    nota_actividades = db.relationship('NotaActividades', foreign_keys=[nota_actividades_id], lazy=True)
-    nota_practicas = db.relationship('NotaPracticas', foreign_keys=[nota_practicas_id], lazy=True)
-    nota_parcial = db.relationship('NotaParcial', foreign_keys=[nota_parcial_id], lazy=True)
+    # Relaciones con las tablas de notas detalladas (las vistas que listan notas las piden con selectinload)
+    nota_actividades = db.relationship('NotaActividades', foreign_keys=[nota_actividades_id], lazy='select')
+    nota_practicas = db.relationship('NotaPracticas', foreign_keys=[nota_practicas_id], lazy='select')
+    nota_parcial = db.relationship('NotaParcial', foreign_keys=[nota_parcial_id], lazy='select')
     
     def calcular_promedio_final(self):
         """Calcula el promedio final basado en los 3 promedios"""
@@ -293,22 +301,14 @@ class Nota(db.Model):
         self.promedio_practicas = self.promedio_practicas or 0.0
         self.promedio_parciales = self.promedio_parciales or 0.0
         
-        # Calcular promedio final (puedes ajustar los pesos según necesites)
-        # Ejemplo: 30% actividades, 30% prácticas, 40% parciales
-        peso_actividades = 0.10
-        peso_practicas = 0.30
-        peso_parciales = 0.60
-        
-        self.promedio_final = (
-            (self.promedio_actividades * peso_actividades) +
-            (self.promedio_practicas * peso_practicas) +
-            (self.promedio_parciales * peso_parciales)
+        # Promedio final ponderado (10% actividades, 30% prácticas, 60% parciales)
+        self.promedio_final = promedio_final(
+            self.promedio_actividades, self.promedio_practicas, self.promedio_parciales
         )
-            
         return self.promedio_final
     
     def __repr__(self):
-        return f'<Nota {self.alumno.nombre} - {self.curso.nombre}: {self.promedio_final}>'
+        return f'<Nota curso={self.curso_id} alumno={self.alumno_id}: {self.promedio_final}>'
 
 class CicloAcademico(db.Model):
     __tablename__ = 'ciclos_academicos'
@@ -323,15 +323,18 @@ class CicloAcademico(db.Model):
     fecha_fin = db.Column(db.Date)
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
     
-    # Relaciones
-    cursos = db.relationship('Curso', backref='ciclo_academico', lazy=True)
-    matriculas = db.relationship('MatriculaAlumno', backref='ciclo_academico', lazy=True)
+    # Relaciones: las vistas cuentan cursos y matrículas con consultas agregadas
+    cursos = db.relationship('Curso', backref=db.backref('ciclo_academico', lazy='select'), lazy='raise')
+    matriculas = db.relationship('MatriculaAlumno', backref=db.backref('ciclo_academico', lazy='select'), lazy='raise')
     
     def __repr__(self):
         return f'<CicloAcademico {self.nombre}>'
 
 class MatriculaAlumno(db.Model):
     __tablename__ = 'matriculas_alumnos'
+    __table_args__ = (
+        db.Index('ix_matriculas_alumnos_alumno_estado', 'alumno_id', 'estado'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     alumno_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
@@ -340,7 +343,45 @@ class MatriculaAlumno(db.Model):
     estado = db.Column(db.Enum('activa', 'completada', 'suspendida'), default='activa')
     
     # Relaciones
-    alumno = db.relationship('Usuario', backref='matriculas', lazy=True)
+    alumno = db.relationship('Usuario', backref=db.backref('matriculas', lazy='raise'), lazy='select')
+    
+    def __repr__(self):
+        return f'<MatriculaAlumno alumno={self.alumno_id} ciclo={self.ciclo_academico_id}>'
+
+
+class ResumenCurso(db.Model):
+    """Resumen de las notas finales de un curso por docente.
+
+    Se mantiene al guardar notas o cambiar su estado para que los paneles
+    lean una fila precalculada en lugar de recorrer todas las notas.
+    """
+    __tablename__ = 'resumen_curso'
+    __table_args__ = (
+        db.Index('uq_resumen_curso_docente', 'curso_id', 'docente_id', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    curso_id = db.Column(db.Integer, db.ForeignKey('cursos.id'), nullable=False)
+    docente_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    
+    total_notas = db.Column(db.Integer, nullable=False, default=0)
+    notas_publicadas = db.Column(db.Integer, nullable=False, default=0)
+    
+    # Solo cuentan las notas con promedio final mayor a 0
+    notas_con_promedio = db.Column(db.Integer, nullable=False, default=0)
+    suma_promedios = db.Column(db.Float, nullable=False, default=0.0)
+    promedio_minimo = db.Column(db.Float)
+    promedio_maximo = db.Column(db.Float)
+    
+    fecha_actualizacion = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @property
+    def notas_borrador(self):
+        return self.total_notas - self.notas_publicadas
+    
+    @property
+    def promedio(self):
+        return self.suma_promedios / self.notas_con_promedio if self.notas_con_promedio else 0
     
     def __repr__(self):
-        return f'<MatriculaAlumno {self.alumno.nombre} - {self.ciclo_academico.nombre}>'
\ No newline at end of file
+        return f'<ResumenCurso curso={self.curso_id} docente={self.docente_id}: {self.total_notas} notas>'
@@ -1,9 +1,22 @@
 from flask import render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
 from app import db
 from app.models import Usuario, Curso, CursoDocente, CursoAlumno, CicloAcademico, MatriculaAlumno, Nota, NotaActividades, NotaPracticas, NotaParcial
+from app.services.estadisticas import consulta_docentes, consulta_alumnos, consulta_cursos, consulta_ciclos, consulta_alumnos_ciclo, cursos_por_ciclo
+from app.services.resumenes import combinar_resumenes, resumen_curso, resumenes_docente, total_notas
+from app.services.paginacion import paginar_por_clave
+from app.services.identidades import invalidar_identidad
+from app.services.busqueda import buscar_alumnos, buscar_cursos, invalidar_busquedas
+from app.services.expedientes import invalidar_expedientes
+from app.services.replicas import lectura_en_replica
+from app.services.matriculas import matricular_en_cursos, matricular_alumnos_en_ciclo, leer_dnis_csv, alumnos_por_dni
+from app.services.importacion import ErrorImportacion, leer_filas, registrar_usuarios
 from . import admin_bp
 
+# Filas por página en los listados del administrador
+ELEMENTOS_POR_PAGINA = 50
+
 def admin_required(f):
     """Decorator para requerir rol de administrador"""
     from functools import wraps
@@ -18,6 +31,7 @@ def admin_required(f):
 @admin_bp.route('/')
 @login_required
 @admin_required
+@lectura_en_replica
 def dashboard():
     total_docentes = Usuario.query.filter_by(rol='docente').count()
     total_alumnos = Usuario.query.filter_by(rol='alumno').count()
@@ -41,14 +55,13 @@ def dashboard():
 @login_required
 @admin_required
 def docentes():
-    docentes_data = []
-    docentes = Usuario.query.filter_by(rol='docente').all()
+    page = request.args.get('page', 1, type=int)
+    docentes_paginados = consulta_docentes().paginate(
+        page=page, per_page=ELEMENTOS_POR_PAGINA, error_out=False
+    )
     
-    for docente in docentes:
-        # Verificar relaciones para cada docente
-        cursos_asignados = CursoDocente.query.filter_by(docente_id=docente.id).count()
-        notas_registradas = Nota.query.filter_by(docente_id=docente.id).count()
-        
+    docentes_data = []
+    for docente, cursos_asignados, notas_registradas in docentes_paginados.items:
         # Determinar si se puede desactivar/eliminar
         puede_desactivar = True  # Los docentes siempre se pueden desactivar
         puede_eliminar = cursos_asignados == 0 and notas_registradas == 0
@@ -61,7 +74,7 @@ def docentes():
             'puede_eliminar': puede_eliminar
         })
     
-    return render_template('admin/docentes.html', docentes=docentes_data)
+    return render_template('admin/docentes.html', docentes=docentes_data, docentes_paginados=docentes_paginados)
 
 @admin_bp.route('/docentes/registrar', methods=['GET', 'POST'])
 @login_required
@@ -102,20 +115,55 @@ def registrar_docente():
     
     return render_template('admin/registrar_docente.html')
 
+@admin_bp.route('/usuarios/importar', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def importar_usuarios():
+    """Importación masiva de alumnos o docentes desde un archivo CSV o Excel"""
+    rol = request.values.get('rol', 'alumno')
+    if rol not in ('alumno', 'docente'):
+        rol = 'alumno'
+    
+    resultado = None
+    if request.method == 'POST':
+        archivo = request.files.get('archivo')
+        if not archivo or not archivo.filename:
+            flash('Selecciona un archivo CSV o Excel.', 'error')
+            return render_template('admin/importar_usuarios.html', rol=rol)
+        
+        try:
+            filas = leer_filas(archivo.stream, archivo.filename)
+            resultado = registrar_usuarios(filas, rol, request.form.get('password_inicial') or None)
+        except (ErrorImportacion, UnicodeDecodeError) as e:
+            db.session.rollback()
+            mensaje = str(e) if isinstance(e, ErrorImportacion) else 'El archivo CSV debe estar en UTF-8.'
+            flash(mensaje, 'error')
+            return render_template('admin/importar_usuarios.html', rol=rol)
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error al importar usuarios: {str(e)}', 'error')
+            return render_template('admin/importar_usuarios.html', rol=rol)
+        
+        if resultado.creados:
+            invalidar_busquedas()
+            flash(f'{resultado.creados} {rol}(s) registrados correctamente.', 'success')
+        if resultado.errores:
+            flash(f'{len(resultado.errores)} fila(s) no se importaron; revisa el detalle.', 'warning')
+    
+    return render_template('admin/importar_usuarios.html', rol=rol, resultado=resultado)
+
 # Gestión de Cursos
 @admin_bp.route('/cursos')
 @login_required
 @admin_required
 def cursos():
-    cursos_data = []
-    cursos = db.session.query(Curso, CicloAcademico).outerjoin(CicloAcademico).all()
+    page = request.args.get('page', 1, type=int)
+    cursos_paginados = consulta_cursos().paginate(
+        page=page, per_page=ELEMENTOS_POR_PAGINA, error_out=False
+    )
     
-    for curso, ciclo in cursos:
-        # Verificar relaciones para cada curso
-        docentes_asignados = CursoDocente.query.filter_by(curso_id=curso.id).count()
-        alumnos_matriculados = CursoAlumno.query.filter_by(curso_id=curso.id).count()
-        notas_registradas = Nota.query.filter_by(curso_id=curso.id).count()
-        
+    cursos_data = []
+    for curso, ciclo, docentes_asignados, alumnos_matriculados, notas_registradas in cursos_paginados.items:
         # Determinar si se puede desactivar/eliminar
         puede_desactivar = docentes_asignados == 0 and alumnos_matriculados == 0 and notas_registradas == 0
         puede_eliminar = puede_desactivar
@@ -130,7 +178,7 @@ def cursos():
             'puede_eliminar': puede_eliminar
         })
     
-    return render_template('admin/cursos.html', cursos=cursos_data)
+    return render_template('admin/cursos.html', cursos=cursos_data, cursos_paginados=cursos_paginados)
 
 @admin_bp.route('/cursos/registrar', methods=['GET', 'POST'])
 @login_required
@@ -158,6 +206,7 @@ def registrar_curso():
         try:
             db.session.add(curso)
             db.session.commit()
+            invalidar_busquedas()
             flash('Curso registrado correctamente.', 'success')
             return redirect(url_for('admin.cursos'))
         except Exception as e:
@@ -171,7 +220,7 @@ def registrar_curso():
 @login_required
 @admin_required
 def editar_curso(id):
-    curso = Curso.query.get_or_404(id)
+    curso = Curso.query.options(joinedload(Curso.ciclo_academico)).get_or_404(id)
     
     if request.method == 'POST':
         curso.nombre = request.form.get('nombre')
@@ -187,6 +236,8 @@ def editar_curso(id):
         
         try:
             db.session.commit()
+            invalidar_busquedas()
+            invalidar_expedientes()
             flash('Curso actualizado correctamente.', 'success')
             return redirect(url_for('admin.cursos'))
         except Exception as e:
@@ -229,6 +280,7 @@ def toggle_activo_curso(id):
         
         curso.activo = not curso.activo
         db.session.commit()
+        invalidar_busquedas()
         
         estado = 'activado' if curso.activo else 'desactivado'
         return jsonify({
@@ -273,6 +325,8 @@ def eliminar_curso(id):
         
         db.session.delete(curso)
         db.session.commit()
+        invalidar_busquedas()
+        invalidar_expedientes()
         return jsonify({'success': True, 'message': 'Curso eliminado correctamente.'})
     except Exception as e:
         db.session.rollback()
@@ -294,6 +348,7 @@ def asignar_cursos():
             asignacion = CursoDocente(curso_id=curso_id, docente_id=docente_id)
             db.session.add(asignacion)
             db.session.commit()
+            invalidar_expedientes()
             flash('Curso asignado correctamente.', 'success')
         
         return redirect(url_for('admin.asignar_cursos'))
@@ -312,21 +367,13 @@ def asignar_cursos():
 @login_required
 @admin_required
 def alumnos():
-    alumnos_data = []
-    alumnos = db.session.query(Usuario).filter_by(rol='alumno').all()
+    page = request.args.get('page', 1, type=int)
+    alumnos_paginados = consulta_alumnos().paginate(
+        page=page, per_page=ELEMENTOS_POR_PAGINA, error_out=False
+    )
     
-    for alumno in alumnos:
-        # Verificar relaciones para cada alumno
-        cursos_matriculados = CursoAlumno.query.filter_by(alumno_id=alumno.id).count()
-        matriculas_ciclos = MatriculaAlumno.query.filter_by(alumno_id=alumno.id).count()
-        notas_registradas = Nota.query.filter_by(alumno_id=alumno.id).count()
-        
-        # Obtener matrícula activa
-        matricula_activa = MatriculaAlumno.query.filter_by(
-            alumno_id=alumno.id, 
-            estado='activa'
-        ).first()
-        
+    alumnos_data = []
+    for alumno, cursos_matriculados, matriculas_ciclos, notas_registradas, matricula_activa, _ in alumnos_paginados.items:
         # Determinar si se puede desactivar/eliminar
         puede_desactivar = True  # Los alumnos siempre se pueden desactivar
         puede_eliminar = cursos_matriculados == 0 and matriculas_ciclos == 0 and notas_registradas == 0
@@ -341,7 +388,7 @@ def alumnos():
             'puede_eliminar': puede_eliminar
         })
     
-    return render_template('admin/alumnos.html', alumnos=alumnos_data)
+    return render_template('admin/alumnos.html', alumnos=alumnos_data, alumnos_paginados=alumnos_paginados)
 
 @admin_bp.route('/alumnos/registrar', methods=['GET', 'POST'])
 @login_required
@@ -374,6 +421,7 @@ def registrar_alumno():
         try:
             db.session.add(alumno)
             db.session.commit()
+            invalidar_busquedas()
             flash('Alumno registrado correctamente.', 'success')
             return redirect(url_for('admin.alumnos'))
         except Exception as e:
@@ -417,6 +465,8 @@ def editar_docente(id):
         
         try:
             db.session.commit()
+            invalidar_identidad(id)
+            invalidar_expedientes()
             flash('Docente actualizado correctamente.', 'success')
             return redirect(url_for('admin.docentes'))
         except Exception as e:
@@ -437,6 +487,7 @@ def toggle_activo_docente(id):
     try:
         docente.activo = not docente.activo
         db.session.commit()
+        invalidar_identidad(id)
         
         estado = 'activado' if docente.activo else 'desactivado'
         return jsonify({
@@ -476,6 +527,7 @@ def eliminar_docente(id):
         
         db.session.delete(docente)
         db.session.commit()
+        invalidar_identidad(id)
         return jsonify({'success': True, 'message': 'Docente eliminado correctamente.'})
     except Exception as e:
         db.session.rollback()
@@ -503,24 +555,22 @@ def ver_cursos_docente(id):
         CursoDocente.docente_id == id
     ).all()
     
+    # Resumen de notas precalculado por curso (tabla resumen_curso)
+    resumenes = resumenes_docente(id)
+    
     for asignacion, curso, ciclo in asignaciones:
         # Obtener estadísticas del curso
         total_alumnos = CursoAlumno.query.filter_by(curso_id=curso.id).count()
-        notas_registradas = Nota.query.filter_by(curso_id=curso.id, docente_id=id).count()
-        notas_publicadas = Nota.query.filter_by(curso_id=curso.id, docente_id=id, estado='publicada').count()
-        
-        # Calcular promedio del curso
-        notas_finales = [nota.promedio_final for nota in Nota.query.filter_by(curso_id=curso.id, docente_id=id).all() if nota.promedio_final and nota.promedio_final > 0]
-        promedio_curso = sum(notas_finales) / len(notas_finales) if notas_finales else 0
+        resumen = resumenes.get(curso.id) or combinar_resumenes([])
         
         cursos_data.append({
             'curso': curso,
             'ciclo': ciclo,
             'asignacion': asignacion,
             'total_alumnos': total_alumnos,
-            'notas_registradas': notas_registradas,
-            'notas_publicadas': notas_publicadas,
-            'promedio_curso': promedio_curso
+            'notas_registradas': resumen.total_notas,
+            'notas_publicadas': resumen.notas_publicadas,
+            'promedio_curso': resumen.promedio
         })
     
     return render_template('admin/cursos_docente.html', 
@@ -530,6 +580,7 @@ def ver_cursos_docente(id):
 @admin_bp.route('/docentes/<int:id>/estadisticas')
 @login_required
 @admin_required
+@lectura_en_replica
 def estadisticas_docente(id):
     """Ver estadísticas detalladas de un docente"""
     docente = Usuario.query.get_or_404(id)
@@ -545,8 +596,11 @@ def estadisticas_docente(id):
     cursos_docente_ids = [cd.curso_id for cd in CursoDocente.query.filter_by(docente_id=id).all()]
     total_alumnos = CursoAlumno.query.filter(CursoAlumno.curso_id.in_(cursos_docente_ids)).count()
     
-    total_notas = Nota.query.filter_by(docente_id=id).count()
-    notas_publicadas = Nota.query.filter_by(docente_id=id, estado='publicada').count()
+    # Resumen de notas precalculado por curso (tabla resumen_curso)
+    resumenes = resumenes_docente(id)
+    resumen_general = combinar_resumenes(resumenes.values())
+    total_notas = resumen_general.total_notas
+    notas_publicadas = resumen_general.notas_publicadas
     
     # Estadísticas por curso
     cursos_estadisticas = []
@@ -558,24 +612,17 @@ def estadisticas_docente(id):
     
     for asignacion, curso in asignaciones:
         alumnos_curso = CursoAlumno.query.filter_by(curso_id=curso.id).count()
-        notas_curso = Nota.query.filter_by(curso_id=curso.id, docente_id=id).count()
-        notas_publicadas_curso = Nota.query.filter_by(curso_id=curso.id, docente_id=id, estado='publicada').count()
-        
-        # Calcular promedio del curso
-        notas_finales = [nota.nota_final for nota in Nota.query.filter_by(curso_id=curso.id, docente_id=id).all() if nota.nota_final > 0]
-        promedio_curso = sum(notas_finales) / len(notas_finales) if notas_finales else 0
+        resumen = resumenes.get(curso.id) or combinar_resumenes([])
         
         cursos_estadisticas.append({
             'curso': curso,
             'alumnos': alumnos_curso,
-            'notas_total': notas_curso,
-            'notas_publicadas': notas_publicadas_curso,
-            'promedio': promedio_curso
+            'notas_total': resumen.total_notas,
+            'notas_publicadas': resumen.notas_publicadas,
+            'promedio': resumen.promedio
         })
     
-    # Calcular promedio general
-    todas_las_notas = [nota.promedio_final for nota in Nota.query.filter_by(docente_id=id).all() if nota.promedio_final and nota.promedio_final > 0]
-    promedio_general = sum(todas_las_notas) / len(todas_las_notas) if todas_las_notas else 0
+    promedio_general = resumen_general.promedio
     
     return render_template('admin/estadisticas_docente.html',
                          docente=docente,
@@ -605,6 +652,18 @@ def ver_alumnos_docente(id):
         CursoDocente.docente_id == id
     ).all()
     
+    # Cantidad de notas y promedio de cada alumno con este docente, en una sola consulta
+    promedio_valido = db.case((Nota.promedio_final > 0, Nota.promedio_final))
+    notas_por_alumno = {
+        alumno_id: (total, suma / con_promedio if con_promedio else 0)
+        for alumno_id, total, con_promedio, suma in db.session.query(
+            Nota.alumno_id,
+            db.func.count(Nota.id),
+            db.func.count(promedio_valido),
+            db.func.sum(promedio_valido)
+        ).filter(Nota.docente_id == id).group_by(Nota.alumno_id)
+    }
+    
     # Crear un diccionario para evitar duplicados
     alumnos_dict = {}
     
@@ -618,14 +677,7 @@ def ver_alumnos_docente(id):
         
         for curso_alumno, alumno in curso_alumnos:
             if alumno.id not in alumnos_dict:
-                # Obtener información adicional del alumno
-                notas_alumno = Nota.query.filter_by(alumno_id=alumno.id, docente_id=id).count()
-                promedio_alumno = 0
-                
-                # Calcular promedio del alumno con este docente
-                notas_finales = [nota.promedio_final for nota in Nota.query.filter_by(alumno_id=alumno.id, docente_id=id).all() if nota.promedio_final and nota.promedio_final > 0]
-                if notas_finales:
-                    promedio_alumno = sum(notas_finales) / len(notas_finales)
+                notas_alumno, promedio_alumno = notas_por_alumno.get(alumno.id, (0, 0))
                 
                 alumnos_dict[alumno.id] = {
                     'alumno': alumno,
@@ -648,6 +700,7 @@ def ver_alumnos_docente(id):
 @admin_bp.route('/docentes/<int:id>/notas')
 @login_required
 @admin_required
+@lectura_en_replica
 def ver_notas_docente(id):
     """Ver todas las notas registradas por un docente"""
     docente = Usuario.query.get_or_404(id)
@@ -710,6 +763,7 @@ def desasignar_curso_docente(id, curso_id):
         
         db.session.delete(asignacion)
         db.session.commit()
+        invalidar_expedientes()
         
         return jsonify({
             'success': True, 
@@ -753,6 +807,8 @@ def editar_alumno(id):
         
         try:
             db.session.commit()
+            invalidar_identidad(id)
+            invalidar_busquedas()
             flash('Alumno actualizado correctamente.', 'success')
             return redirect(url_for('admin.alumnos'))
         except Exception as e:
@@ -773,6 +829,8 @@ def toggle_activo_alumno(id):
     try:
         alumno.activo = not alumno.activo
         db.session.commit()
+        invalidar_identidad(id)
+        invalidar_busquedas()
         
         estado = 'activado' if alumno.activo else 'desactivado'
         return jsonify({
@@ -820,6 +878,8 @@ def eliminar_alumno(id):
         
         db.session.delete(alumno)
         db.session.commit()
+        invalidar_identidad(id)
+        invalidar_busquedas()
         return jsonify({'success': True, 'message': 'Alumno eliminado correctamente.'})
     except Exception as e:
         db.session.rollback()
@@ -841,18 +901,8 @@ def alumnos_por_ciclo():
     if ciclo_id:
         ciclo_seleccionado = CicloAcademico.query.get(ciclo_id)
         if ciclo_seleccionado:
-            # Obtener alumnos matriculados en este ciclo
-            matriculas = MatriculaAlumno.query.filter_by(
-                ciclo_academico_id=ciclo_id,
-                estado='activa'
-            ).all()
-            
-            for matricula in matriculas:
-                alumno = matricula.alumno
-                # Obtener información adicional del alumno
-                cursos_matriculados = CursoAlumno.query.filter_by(alumno_id=alumno.id).count()
-                notas_registradas = Nota.query.filter_by(alumno_id=alumno.id).count()
-                
+            # Alumnos matriculados en este ciclo con sus conteos, en una consulta
+            for matricula, alumno, cursos_matriculados, notas_registradas in consulta_alumnos_ciclo(ciclo_id):
                 alumnos_ciclo.append({
                     'alumno': alumno,
                     'matricula': matricula,
@@ -877,7 +927,9 @@ def editar_matricula_alumno(alumno_id):
         return redirect(url_for('admin.alumnos'))
     
     # Obtener la matrícula activa del alumno
-    matricula_activa = MatriculaAlumno.query.filter_by(
+    matricula_activa = MatriculaAlumno.query.options(
+        joinedload(MatriculaAlumno.ciclo_academico)
+    ).filter_by(
         alumno_id=alumno_id, 
         estado='activa'
     ).first()
@@ -888,18 +940,12 @@ def editar_matricula_alumno(alumno_id):
         
         if not nuevo_ciclo_id:
             flash('Selecciona un ciclo válido.', 'error')
-            return render_template('admin/editar_matricula.html', 
-                                 alumno=alumno, 
-                                 matricula_activa=matricula_activa,
-                                 ciclos=CicloAcademico.query.filter_by(activo=True).order_by(CicloAcademico.orden).all())
+            return _formulario_matricula(alumno, matricula_activa)
         
         nuevo_ciclo = CicloAcademico.query.get(nuevo_ciclo_id)
         if not nuevo_ciclo:
             flash('El ciclo seleccionado no existe.', 'error')
-            return render_template('admin/editar_matricula.html', 
-                                 alumno=alumno, 
-                                 matricula_activa=matricula_activa,
-                                 ciclos=CicloAcademico.query.filter_by(activo=True).order_by(CicloAcademico.orden).all())
+            return _formulario_matricula(alumno, matricula_activa)
         
         # Verificar si ya está matriculado en el nuevo ciclo
         if MatriculaAlumno.query.filter_by(
@@ -908,10 +954,7 @@ def editar_matricula_alumno(alumno_id):
             estado='activa'
         ).first():
             flash('El alumno ya está matriculado en este ciclo.', 'error')
-            return render_template('admin/editar_matricula.html', 
-                                 alumno=alumno, 
-                                 matricula_activa=matricula_activa,
-                                 ciclos=CicloAcademico.query.filter_by(activo=True).order_by(CicloAcademico.orden).all())
+            return _formulario_matricula(alumno, matricula_activa)
         
         try:
             # Si tiene matrícula activa, desactivarla
@@ -928,20 +971,14 @@ def editar_matricula_alumno(alumno_id):
             
             # Si se solicita forzar el cambio, matricular automáticamente en los cursos del nuevo ciclo
             if forzar_cambio:
-                cursos_nuevo_ciclo = Curso.query.filter_by(ciclo_academico_id=nuevo_ciclo_id).all()
-                cursos_matriculados = 0
-                
-                for curso in cursos_nuevo_ciclo:
-                    # Verificar que no esté ya matriculado en el curso
-                    if not CursoAlumno.query.filter_by(curso_id=curso.id, alumno_id=alumno_id).first():
-                        curso_alumno = CursoAlumno(curso_id=curso.id, alumno_id=alumno_id)
-                        db.session.add(curso_alumno)
-                        cursos_matriculados += 1
+                cursos_matriculados = matricular_en_cursos(ciclo_id=nuevo_ciclo_id, alumno_ids=[alumno_id])
                 
                 if cursos_matriculados > 0:
                     flash(f'Alumno matriculado automáticamente en {cursos_matriculados} curso(s) del nuevo ciclo.', 'info')
             
             db.session.commit()
+            invalidar_busquedas()
+            invalidar_expedientes([alumno_id])
             flash(f'Matrícula actualizada correctamente. Alumno ahora está en "{nuevo_ciclo.nombre}".', 'success')
             return redirect(url_for('admin.alumnos_por_ciclo', ciclo_id=nuevo_ciclo_id))
             
@@ -949,11 +986,17 @@ def editar_matricula_alumno(alumno_id):
             db.session.rollback()
             flash('Error al actualizar la matrícula.', 'error')
     
-    ciclos = CicloAcademico.query.filter_by(activo=True).order_by(CicloAcademico.orden).all()
+    return _formulario_matricula(alumno, matricula_activa)
+
+def _formulario_matricula(alumno, matricula_activa):
+    """Formulario de editar_matricula_alumno con los totales del alumno (contados, sin cargar sus colecciones)"""
     return render_template('admin/editar_matricula.html', 
                          alumno=alumno, 
                          matricula_activa=matricula_activa,
-                         ciclos=ciclos)
+                         ciclos=CicloAcademico.query.filter_by(activo=True).order_by(CicloAcademico.orden).all(),
+                         total_cursos=CursoAlumno.query.filter_by(alumno_id=alumno.id).count(),
+                         total_notas=Nota.query.filter_by(alumno_id=alumno.id).count(),
+                         total_matriculas=MatriculaAlumno.query.filter_by(alumno_id=alumno.id).count())
 
 @admin_bp.route('/alumnos/suspender-matricula/<int:alumno_id>', methods=['POST'])
 @login_required
@@ -965,7 +1008,9 @@ def suspender_matricula_alumno(alumno_id):
     if alumno.rol != 'alumno':
         return jsonify({'success': False, 'message': 'El usuario no es un alumno.'})
     
-    matricula_activa = MatriculaAlumno.query.filter_by(
+    matricula_activa = MatriculaAlumno.query.options(
+        joinedload(MatriculaAlumno.ciclo_academico)
+    ).filter_by(
         alumno_id=alumno_id, 
         estado='activa'
     ).first()
@@ -989,6 +1034,7 @@ def suspender_matricula_alumno(alumno_id):
 @admin_bp.route('/notas')
 @login_required
 @admin_required
+@lectura_en_replica
 def ver_notas():
     """Vista principal de notas para administradores"""
     # Obtener filtros de la URL (solo ciclo, curso y alumno)
@@ -1016,18 +1062,30 @@ def ver_notas():
     if alumno_id:
         query = query.filter(Nota.alumno_id == alumno_id)
     
-    # Ordenar por fecha de actualización y aplicar paginación
-    page = request.args.get('page', 1, type=int)
-    per_page = 20  # Número de registros por página
+    # Paginación por clave (fecha de actualización, id): cada página cuesta lo
+    # mismo sin importar su profundidad, a diferencia de OFFSET
+    try:
+        notas_paginadas = paginar_por_clave(
+            query.options(joinedload(Curso.ciclo_academico)), (Nota.fecha_actualizacion, Nota.id),
+            lambda fila: (fila[0].fecha_actualizacion, fila[0].id),
+            despues=request.args.get('despues'), antes=request.args.get('antes'),
+            por_pagina=20
+        )
+    except ValueError as e:
+        flash(str(e), 'warning')
+        return redirect(url_for('admin.ver_notas', ciclo_id=ciclo_id, curso_id=curso_id, alumno_id=alumno_id))
     
-    notas_paginadas = query.order_by(Nota.fecha_actualizacion.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # Total: de la tabla de resumen, o contado si se filtra por estudiante
+    # (las notas de un estudiante son pocas)
+    if alumno_id:
+        notas_paginadas.total = query.order_by(None).with_entities(db.func.count(Nota.id)).scalar()
+    else:
+        notas_paginadas.total = total_notas(ciclo_id=ciclo_id, curso_id=curso_id)
+        notas_paginadas.total_aproximado = True
     
-    # Obtener datos para los filtros
+    # Obtener datos para los filtros; cursos y estudiantes se buscan con
+    # autocompletado (api_buscar_cursos / api_buscar_alumnos)
     ciclos = CicloAcademico.query.filter_by(activo=True).order_by(CicloAcademico.orden).all()
-    cursos = Curso.query.filter_by(activo=True).order_by(Curso.nombre).all()
-    alumnos = Usuario.query.filter_by(rol='alumno', activo=True).order_by(Usuario.nombre).all()
     
     # Obtener ciclo y curso seleccionados
     ciclo_seleccionado = CicloAcademico.query.get(ciclo_id) if ciclo_id else None
@@ -1038,8 +1096,6 @@ def ver_notas():
                          notas_paginadas=notas_paginadas,
                          notas=notas_paginadas.items,
                          ciclos=ciclos,
-                         cursos=cursos,
-                         alumnos=alumnos,
                          ciclo_seleccionado=ciclo_seleccionado,
                          curso_seleccionado=curso_seleccionado,
                          alumno_seleccionado=alumno_seleccionado)
@@ -1047,9 +1103,10 @@ def ver_notas():
 @admin_bp.route('/notas/curso/<int:curso_id>')
 @login_required
 @admin_required
+@lectura_en_replica
 def ver_notas_curso(curso_id):
     """Ver notas de un curso específico"""
-    curso = Curso.query.get_or_404(curso_id)
+    curso = Curso.query.options(joinedload(Curso.ciclo_academico)).get_or_404(curso_id)
     
     # Obtener todas las notas del curso con alias para evitar conflicto de nombres
     from sqlalchemy.orm import aliased
@@ -1062,14 +1119,12 @@ def ver_notas_curso(curso_id):
         Nota.curso_id == curso_id
     ).order_by(Alumno.nombre, Alumno.apellido).all()
     
-    # Obtener estadísticas del curso
+    # Obtener estadísticas del curso (resumen precalculado)
     total_alumnos = CursoAlumno.query.filter_by(curso_id=curso_id).count()
-    notas_publicadas = Nota.query.filter_by(curso_id=curso_id, estado='publicada').count()
-    notas_borrador = Nota.query.filter_by(curso_id=curso_id, estado='borrador').count()
-    
-    # Calcular promedios
-    notas_finales = [nota[0].promedio_final for nota in notas if nota[0].promedio_final and nota[0].promedio_final > 0]
-    promedio_curso = sum(notas_finales) / len(notas_finales) if notas_finales else 0
+    resumen = resumen_curso(curso_id)
+    notas_publicadas = resumen.notas_publicadas
+    notas_borrador = resumen.notas_borrador
+    promedio_curso = resumen.promedio
     
     return render_template('admin/notas_curso.html',
                          curso=curso,
@@ -1082,6 +1137,7 @@ def ver_notas_curso(curso_id):
 @admin_bp.route('/notas/alumno/<int:alumno_id>')
 @login_required
 @admin_required
+@lectura_en_replica
 def ver_notas_alumno(alumno_id):
     """Ver notas de un alumno específico"""
     alumno = Usuario.query.get_or_404(alumno_id)
@@ -1096,10 +1152,14 @@ def ver_notas_alumno(alumno_id):
     
     notas = db.session.query(Nota, Curso, Docente).join(Curso).join(
         Docente, Nota.docente_id == Docente.id
+    ).options(
+        joinedload(Curso.ciclo_academico)
     ).filter(Nota.alumno_id == alumno_id).order_by(Curso.nombre).all()
     
     # Obtener matrícula activa
-    matricula_activa = MatriculaAlumno.query.filter_by(
+    matricula_activa = MatriculaAlumno.query.options(
+        joinedload(MatriculaAlumno.ciclo_academico)
+    ).filter_by(
         alumno_id=alumno_id, 
         estado='activa'
     ).first()
@@ -1117,74 +1177,125 @@ def ver_notas_alumno(alumno_id):
 @admin_bp.route('/notas/exportar')
 @login_required
 @admin_required
+@lectura_en_replica
 def exportar_notas():
-    """Exportar notas a CSV"""
+    """Exportar notas a CSV.
+
+    El archivo se envía por partes a medida que se leen las filas (yield_per),
+    por lo que la memoria usada no depende del número de notas exportadas.
+    """
     import csv
     import io
-    from flask import Response
+    from itertools import islice
+    from flask import Response, stream_with_context
+    from app.services.calificaciones import calcular_promedios
     from datetime import datetime
     
     # Obtener filtros
     ciclo_id = request.args.get('ciclo_id')
     curso_id = request.args.get('curso_id')
+    alumno_id = request.args.get('alumno_id')
     estado = request.args.get('estado', 'todas')
     
-    # Construir query con alias para evitar conflicto de nombres
+    # Construir query con alias para evitar conflicto de nombres.
+    # Se seleccionan columnas (no entidades) y se unen las tablas de detalle en la
+    # misma consulta para no cargar objetos ni lanzar consultas adicionales por fila.
     from sqlalchemy.orm import aliased
     Alumno = aliased(Usuario)
     Docente = aliased(Usuario)
     
-    query = db.session.query(Nota, Curso, Alumno, Docente).join(Curso).join(
+    query = db.session.query(
+        Curso.nombre, Curso.codigo,
+        Alumno.nombre, Alumno.apellido, Alumno.dni,
+        Docente.nombre, Docente.apellido,
+        Nota.promedio_final, Nota.estado, Nota.fecha_actualizacion, Nota.comentarios,
+        NotaActividades.id,
+        NotaActividades.actividad1, NotaActividades.actividad2, NotaActividades.actividad3, NotaActividades.actividad4,
+        NotaActividades.actividad5, NotaActividades.actividad6, NotaActividades.actividad7, NotaActividades.actividad8,
+        NotaPracticas.id,
+        NotaPracticas.practica1, NotaPracticas.practica2, NotaPracticas.practica3, NotaPracticas.practica4,
+        NotaParcial.id,
+        NotaParcial.parcial1, NotaParcial.parcial2
+    ).select_from(Nota).join(Curso, Nota.curso_id == Curso.id).join(
         Alumno, Nota.alumno_id == Alumno.id
-    ).join(Docente, Nota.docente_id == Docente.id)
+    ).join(
+        Docente, Nota.docente_id == Docente.id
+    ).outerjoin(
+        NotaActividades, Nota.nota_actividades_id == NotaActividades.id
+    ).outerjoin(
+        NotaPracticas, Nota.nota_practicas_id == NotaPracticas.id
+    ).outerjoin(
+        NotaParcial, Nota.nota_parcial_id == NotaParcial.id
+    )
     
     if ciclo_id:
         query = query.filter(Curso.ciclo_academico_id == ciclo_id)
     if curso_id:
         query = query.filter(Nota.curso_id == curso_id)
+    if alumno_id:
+        query = query.filter(Nota.alumno_id == alumno_id)
     if estado != 'todas':
         query = query.filter(Nota.estado == estado)
     
-    notas = query.order_by(Curso.nombre, Alumno.nombre).all()
-    
-    # Crear CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Escribir encabezados
-    writer.writerow([
-        'Curso', 'Código Curso', 'Alumno', 'DNI Alumno', 'Docente',
-        'Promedio Actividades', 'Promedio Prácticas', 'Promedio Parciales',
-        'Promedio Final', 'Estado', 'Fecha Actualización', 'Comentarios'
-    ])
+    query = query.order_by(Curso.nombre, Alumno.nombre).yield_per(500)
     
-    # Escribir datos
-    for nota, curso, alumno, docente in notas:
-        # Obtener promedios de las tablas relacionadas
-        promedio_actividades = nota.nota_actividades.calcular_promedio_actividades() if nota.nota_actividades else 0
-        promedio_practicas = nota.nota_practicas.calcular_promedio_practicas() if nota.nota_practicas else 0
-        promedio_parciales = nota.nota_parcial.calcular_promedio_parciales() if nota.nota_parcial else 0
+    def generar():
+        output = io.StringIO()
+        writer = csv.writer(output)
         
+        # Escribir encabezados
         writer.writerow([
-            curso.nombre,
-            curso.codigo,
-            f"{alumno.nombre} {alumno.apellido}",
-            alumno.dni,
-            f"{docente.nombre} {docente.apellido}",
-            promedio_actividades,
-            promedio_practicas,
-            promedio_parciales,
-            nota.promedio_final,
-            nota.estado,
-            nota.fecha_actualizacion.strftime('%d/%m/%Y %H:%M') if nota.fecha_actualizacion else '',
-            nota.comentarios or ''
+            'Curso', 'Código Curso', 'Alumno', 'DNI Alumno', 'Docente',
+            'Promedio Actividades', 'Promedio Prácticas', 'Promedio Parciales',
+            'Promedio Final', 'Estado', 'Fecha Actualización', 'Comentarios'
         ])
-    
-    # Preparar respuesta
-    output.seek(0)
+        yield output.getvalue()
+        output.seek(0)
+        output.truncate(0)
+        
+        # Escribir datos en bloques de filas; los promedios de cada bloque
+        # se calculan juntos en una sola pasada
+        filas = iter(query)
+        while True:
+            bloque = list(islice(filas, 500))
+            if not bloque:
+                break
+            promedios = calcular_promedios(
+                [fila[12:20] for fila in bloque],
+                [fila[21:25] for fila in bloque],
+                [fila[26:28] for fila in bloque]
+            )
+            prom_actividades = promedios['actividades'].tolist()
+            prom_practicas = promedios['practicas'].tolist()
+            prom_parciales = promedios['parciales'].tolist()
+            
+            for i, fila in enumerate(bloque):
+                (curso_nombre, curso_codigo, alumno_nombre, alumno_apellido, alumno_dni,
+                 docente_nombre, docente_apellido, promedio_final, estado_nota,
+                 fecha_actualizacion, comentarios) = fila[:11]
+                actividades_id, practicas_id, parciales_id = fila[11], fila[20], fila[25]
+                
+                writer.writerow([
+                    curso_nombre,
+                    curso_codigo,
+                    f"{alumno_nombre} {alumno_apellido}",
+                    alumno_dni,
+                    f"{docente_nombre} {docente_apellido}",
+                    prom_actividades[i] if actividades_id else 0,
+                    prom_practicas[i] if practicas_id else 0,
+                    prom_parciales[i] if parciales_id else 0,
+                    promedio_final,
+                    estado_nota,
+                    fecha_actualizacion.strftime('%d/%m/%Y %H:%M') if fecha_actualizacion else '',
+                    comentarios or ''
+                ])
+            
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
     
     return Response(
-        output.getvalue(),
+        stream_with_context(generar()),
         mimetype='text/csv',
         headers={
             'Content-Disposition': f'attachment; filename=notas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
@@ -1196,20 +1307,13 @@ def exportar_notas():
 @login_required
 @admin_required
 def ciclos():
-    ciclos_data = []
-    ciclos = CicloAcademico.query.order_by(CicloAcademico.orden).all()
+    page = request.args.get('page', 1, type=int)
+    ciclos_paginados = consulta_ciclos().paginate(
+        page=page, per_page=ELEMENTOS_POR_PAGINA, error_out=False
+    )
     
-    for ciclo in ciclos:
-        # Verificar relaciones para cada ciclo
-        cursos_asignados = Curso.query.filter_by(ciclo_academico_id=ciclo.id).count()
-        matriculas = MatriculaAlumno.query.filter_by(ciclo_academico_id=ciclo.id).count()
-        
-        # Verificar notas en cursos del ciclo
-        cursos_ciclo = Curso.query.filter_by(ciclo_academico_id=ciclo.id).all()
-        notas_ciclo = 0
-        for curso in cursos_ciclo:
-            notas_ciclo += Nota.query.filter_by(curso_id=curso.id).count()
-        
+    ciclos_data = []
+    for ciclo, cursos_asignados, matriculas, notas_ciclo in ciclos_paginados.items:
         # Determinar si se puede desactivar/eliminar
         puede_desactivar = cursos_asignados == 0 and matriculas == 0 and notas_ciclo == 0
         puede_eliminar = puede_desactivar
@@ -1223,7 +1327,7 @@ def ciclos():
             'puede_eliminar': puede_eliminar
         })
     
-    return render_template('admin/ciclos.html', ciclos=ciclos_data)
+    return render_template('admin/ciclos.html', ciclos=ciclos_data, ciclos_paginados=ciclos_paginados)
 
 @admin_bp.route('/ciclos/registrar', methods=['GET', 'POST'])
 @login_required
@@ -1281,7 +1385,9 @@ def matricular_ciclo():
             flash('Este alumno ya está matriculado en este ciclo.', 'error')
         else:
             # Verificar si ya está matriculado en otro ciclo activo
-            matricula_activa = MatriculaAlumno.query.filter_by(
+            matricula_activa = MatriculaAlumno.query.options(
+                joinedload(MatriculaAlumno.ciclo_academico)
+            ).filter_by(
                 alumno_id=alumno_id, 
                 estado='activa'
             ).first()
@@ -1292,10 +1398,11 @@ def matricular_ciclo():
                       f'Si necesita matricularlo en otro ciclo (por ejemplo, por cursos jalados), '
                       f'marque la casilla "Forzar matrícula" y confirme.', 'warning')
                 return render_template('admin/matricular_ciclo.html', 
-                                     alumnos=Usuario.query.filter_by(rol='alumno', activo=True).all(),
                                      ciclos=CicloAcademico.query.filter_by(activo=True).order_by(CicloAcademico.orden).all(),
-                                     matriculas=db.session.query(MatriculaAlumno, Usuario, CicloAcademico).join(Usuario).join(CicloAcademico).all(),
-                                     alumno_seleccionado=alumno_id,
+                                     cursos_por_ciclo=cursos_por_ciclo(),
+                                     matriculas=_matriculas_recientes(),
+                                     alumno_seleccionado=Usuario.query.get(alumno_id),
+                                     ciclo_actual=ciclo_actual,
                                      ciclo_seleccionado=ciclo_id,
                                      mostrar_forzar=True)
             
@@ -1309,39 +1416,83 @@ def matricular_ciclo():
             db.session.add(matricula)
             
             # Matricular automáticamente en todos los cursos del ciclo
-            ciclo = CicloAcademico.query.get(ciclo_id)
-            cursos_ciclo = Curso.query.filter_by(ciclo_academico_id=ciclo_id).all()
-            
-            for curso in cursos_ciclo:
-                # Verificar que no esté ya matriculado en el curso
-                if not CursoAlumno.query.filter_by(curso_id=curso.id, alumno_id=alumno_id).first():
-                    curso_alumno = CursoAlumno(curso_id=curso.id, alumno_id=alumno_id)
-                    db.session.add(curso_alumno)
-                    print(f"Matriculando {Usuario.query.get(alumno_id).nombre} en {curso.nombre}")  # Debug
+            num_cursos = Curso.query.filter_by(ciclo_academico_id=ciclo_id).count()
+            matricular_en_cursos(ciclo_id=ciclo_id, alumno_ids=[alumno_id])
             
             db.session.commit()
-            flash(f'Alumno matriculado en el ciclo y {len(cursos_ciclo)} curso(s) automáticamente.', 'success')
+            invalidar_busquedas()
+            invalidar_expedientes([alumno_id])
+            flash(f'Alumno matriculado en el ciclo y {num_cursos} curso(s) automáticamente.', 'success')
         
         return redirect(url_for('admin.matricular_ciclo'))
     
-    # Obtener alumnos con información de matrículas
-    alumnos = db.session.query(Usuario).filter_by(rol='alumno', activo=True).all()
-    
-    # Agregar información de matrícula activa a cada alumno
-    for alumno in alumnos:
-        matricula_activa = MatriculaAlumno.query.filter_by(
-            alumno_id=alumno.id, 
-            estado='activa'
-        ).first()
-        alumno.matricula_activa = matricula_activa
-    
+    # El alumno se busca con autocompletado (api_buscar_alumnos), que también
+    # informa su matrícula activa
     ciclos = CicloAcademico.query.filter_by(activo=True).order_by(CicloAcademico.orden).all()
-    matriculas = db.session.query(MatriculaAlumno, Usuario, CicloAcademico).join(Usuario).join(CicloAcademico).all()
     
     return render_template('admin/matricular_ciclo.html', 
-                         alumnos=alumnos, 
                          ciclos=ciclos, 
-                         matriculas=matriculas)
+                         cursos_por_ciclo=cursos_por_ciclo(),
+                         matriculas=_matriculas_recientes())
+
+@admin_bp.route('/matricular-ciclo/csv', methods=['POST'])
+@login_required
+@admin_required
+def matricular_ciclo_csv():
+    """Matrícula masiva: alumnos de un CSV (columna dni) en un ciclo y sus cursos"""
+    import csv
+    
+    archivo = request.files.get('archivo')
+    ciclo = CicloAcademico.query.get(request.form.get('ciclo_id', type=int) or 0)
+    forzar_matricula = request.form.get('forzar_matricula') == 'on'
+    
+    if not ciclo:
+        flash('Selecciona un ciclo válido.', 'error')
+        return redirect(url_for('admin.matricular_ciclo'))
+    if not archivo or not archivo.filename:
+        flash('Selecciona un archivo CSV.', 'error')
+        return redirect(url_for('admin.matricular_ciclo'))
+    
+    try:
+        dnis = leer_dnis_csv(archivo.stream)
+    except (UnicodeDecodeError, csv.Error):
+        flash('No se pudo leer el archivo. Debe ser un CSV en UTF-8 con una columna "dni".', 'error')
+        return redirect(url_for('admin.matricular_ciclo'))
+    if not dnis:
+        flash('El archivo no contiene DNIs.', 'error')
+        return redirect(url_for('admin.matricular_ciclo'))
+    
+    try:
+        alumnos, no_encontrados = alumnos_por_dni(dnis)
+        resultado = matricular_alumnos_en_ciclo(alumnos.values(), ciclo.id, forzar=forzar_matricula)
+        db.session.commit()
+        invalidar_busquedas()
+        invalidar_expedientes(alumnos.values())
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error en la matrícula masiva: {str(e)}', 'error')
+        return redirect(url_for('admin.matricular_ciclo'))
+    
+    flash(f'{resultado.matriculados} alumno(s) matriculados en "{ciclo.nombre}" '
+          f'con {resultado.cursos_creados} inscripción(es) en cursos.', 'success')
+    if resultado.suspendidas:
+        flash(f'{resultado.suspendidas} matrícula(s) anteriores suspendidas.', 'info')
+    if resultado.ya_matriculados:
+        flash(f'{len(resultado.ya_matriculados)} alumno(s) ya tenían matrícula en este ciclo.', 'info')
+    if resultado.con_otro_ciclo:
+        flash(f'{len(resultado.con_otro_ciclo)} alumno(s) no se matricularon porque tienen matrícula activa '
+              f'en otro ciclo. Marque "Forzar matrícula" para suspenderla y matricularlos.', 'warning')
+    if no_encontrados:
+        muestra = ', '.join(no_encontrados[:20])
+        flash(f'{len(no_encontrados)} DNI(s) no corresponden a un alumno activo: {muestra}'
+              f'{"..." if len(no_encontrados) > 20 else ""}', 'warning')
+    return redirect(url_for('admin.matricular_ciclo'))
+
+def _matriculas_recientes(limite=50):
+    """Últimas matrículas registradas, para la tabla de matricular_ciclo"""
+    return db.session.query(MatriculaAlumno, Usuario, CicloAcademico).join(Usuario).join(CicloAcademico).order_by(
+        MatriculaAlumno.fecha_matricula.desc(), MatriculaAlumno.id.desc()
+    ).limit(limite).all()
 
 # Funcionalidades adicionales para ciclos académicos
 @admin_bp.route('/ciclos/editar/<int:id>', methods=['GET', 'POST'])
@@ -1366,7 +1517,7 @@ def editar_ciclo(id):
         # Verificar que no exista otro ciclo con el mismo orden
         if CicloAcademico.query.filter(CicloAcademico.orden == ciclo.orden, CicloAcademico.id != id).first():
             flash('Ya existe un ciclo con ese orden.', 'error')
-            return render_template('admin/editar_ciclo.html', ciclo=ciclo)
+            return _formulario_ciclo(ciclo)
         
         try:
             db.session.commit()
@@ -1376,7 +1527,79 @@ def editar_ciclo(id):
             db.session.rollback()
             flash('Error al actualizar el ciclo académico.', 'error')
     
-    return render_template('admin/editar_ciclo.html', ciclo=ciclo)
+    return _formulario_ciclo(ciclo)
+
+def _formulario_ciclo(ciclo):
+    """Formulario de editar_ciclo con el número de cursos y de matrículas del ciclo"""
+    return render_template('admin/editar_ciclo.html', ciclo=ciclo,
+                         total_cursos=Curso.query.filter_by(ciclo_academico_id=ciclo.id).count(),
+                         total_matriculas=MatriculaAlumno.query.filter_by(ciclo_academico_id=ciclo.id).count())
+
+@admin_bp.route('/ciclos/<int:id>/reportes-pdf')
+@login_required
+@admin_required
+def reportes_pdf_ciclo(id):
+    """Descargar en un ZIP el reporte PDF de cada curso del ciclo.
+
+    Los PDFs se dibujan en el pool de procesos de app.services.lotes y el ZIP
+    se envía a medida que cada curso termina.
+    """
+    from flask import Response, stream_with_context
+    from app.services.lotes import zip_reportes_cursos
+
+    ciclo = CicloAcademico.query.get_or_404(id)
+    cursos = Curso.query.filter_by(ciclo_academico_id=id).order_by(Curso.codigo).all()
+    if not cursos:
+        flash(f'El ciclo {ciclo.nombre} no tiene cursos asignados.', 'warning')
+        return redirect(url_for('admin.ciclos'))
+
+    return Response(
+        stream_with_context(zip_reportes_cursos(cursos)),
+        mimetype='application/zip',
+        headers={
+            'Content-Disposition': f'attachment; filename=reportes_ciclo_{ciclo.id}.zip'
+        }
+    )
+
+@admin_bp.route('/ciclos/<int:id>/libretas')
+@login_required
+@admin_required
+def libretas_ciclo(id):
+    """Libretas de notas de todos los alumnos del ciclo: un PDF (formato=pdf) o un ZIP
+    con un PDF por alumno (formato=zip)"""
+    from flask import Response, stream_with_context
+    from app.services.libretas import datos_libretas_ciclo
+    from app.services.lotes import pdf_libretas_ciclo, zip_libretas_ciclo
+
+    ciclo = CicloAcademico.query.get_or_404(id)
+    formato = request.args.get('formato', 'pdf')
+    if formato not in ('pdf', 'zip'):
+        flash('Formato no válido.', 'error')
+        return redirect(url_for('admin.ciclos'))
+
+    libretas = datos_libretas_ciclo(id)
+    if not libretas:
+        flash(f'El ciclo {ciclo.nombre} no tiene alumnos en sus cursos.', 'warning')
+        return redirect(url_for('admin.ciclos'))
+
+    if formato == 'zip':
+        return Response(
+            stream_with_context(zip_libretas_ciclo(ciclo.nombre, libretas)),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename=libretas_ciclo_{ciclo.id}.zip'}
+        )
+
+    try:
+        contenido = pdf_libretas_ciclo(ciclo.nombre, libretas)
+    except Exception as e:
+        flash(f'Error generando las libretas: {str(e)}', 'error')
+        return redirect(url_for('admin.ciclos'))
+    return Response(
+        contenido,
+        mimetype='application/pdf',
+        headers={'Content-Disposition': f'attachment; filename=libretas_ciclo_{ciclo.id}.pdf'}
+    )
+
 @admin_bp.route('/ciclos/toggle-activo/<int:id>', methods=['POST'])
 @login_required
 @admin_required
@@ -1541,7 +1764,7 @@ def asignar_ciclo_cursos():
 @login_required
 @admin_required
 def cambiar_ciclo_curso(curso_id):
-    curso = Curso.query.get_or_404(curso_id)
+    curso = Curso.query.options(joinedload(Curso.ciclo_academico)).get_or_404(curso_id)
     nuevo_ciclo_id = request.form.get('ciclo_id')
     
     if not nuevo_ciclo_id:
@@ -1565,7 +1788,7 @@ def cambiar_ciclo_curso(curso_id):
 @login_required
 @admin_required
 def quitar_ciclo_curso(curso_id):
-    curso = Curso.query.get_or_404(curso_id)
+    curso = Curso.query.options(joinedload(Curso.ciclo_academico)).get_or_404(curso_id)
     
     try:
         ciclo_anterior = curso.ciclo_academico.nombre if curso.ciclo_academico else 'Sin ciclo'
@@ -1586,29 +1809,10 @@ def quitar_ciclo_curso(curso_id):
 def sincronizar_matriculas():
     """Sincroniza las matrículas de ciclos con las matrículas de cursos"""
     try:
-        # Obtener todas las matrículas activas en ciclos
-        matriculas_activas = MatriculaAlumno.query.filter_by(estado='activa').all()
-        matriculas_creadas = 0
-        
-        for matricula in matriculas_activas:
-            # Obtener cursos del ciclo
-            cursos_ciclo = Curso.query.filter_by(ciclo_academico_id=matricula.ciclo_academico_id).all()
-            
-            for curso in cursos_ciclo:
-                # Verificar si ya está matriculado en el curso
-                if not CursoAlumno.query.filter_by(
-                    curso_id=curso.id, 
-                    alumno_id=matricula.alumno_id
-                ).first():
-                    # Crear matrícula en el curso
-                    curso_alumno = CursoAlumno(
-                        curso_id=curso.id,
-                        alumno_id=matricula.alumno_id
-                    )
-                    db.session.add(curso_alumno)
-                    matriculas_creadas += 1
-        
+        # Inscribir cada matrícula activa en los cursos de su ciclo que le falten
+        matriculas_creadas = matricular_en_cursos()
         db.session.commit()
+        invalidar_expedientes()
         
         return jsonify({
             'success': True, 
@@ -1649,6 +1853,44 @@ def api_cursos_por_ciclo(ciclo_id):
             'message': f'Error al obtener cursos: {str(e)}'
         })
 
+@admin_bp.route('/api/buscar-alumnos')
+@login_required
+@admin_required
+def api_buscar_alumnos():
+    """API de autocompletado: alumnos activos por prefijo de DNI, nombre o apellido"""
+    try:
+        estudiantes = buscar_alumnos(
+            request.args.get('q', ''),
+            ciclo_id=request.args.get('ciclo_id', type=int),
+            con_matricula=request.args.get('matricula') == '1'
+        )
+        return jsonify({
+            'success': True,
+            'estudiantes': estudiantes
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error al buscar estudiantes: {str(e)}'
+        })
+
+@admin_bp.route('/api/buscar-cursos')
+@login_required
+@admin_required
+def api_buscar_cursos():
+    """API de autocompletado: cursos activos por prefijo de nombre o código"""
+    try:
+        cursos = buscar_cursos(request.args.get('q', ''), ciclo_id=request.args.get('ciclo_id', type=int))
+        return jsonify({
+            'success': True,
+            'cursos': cursos
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error al buscar cursos: {str(e)}'
+        })
+
 @admin_bp.route('/api/estudiantes-por-ciclo/<int:ciclo_id>')
 @login_required
 @admin_required
@@ -1660,7 +1902,7 @@ def api_estudiantes_por_ciclo(ciclo_id):
             MatriculaAlumno, Usuario.id == MatriculaAlumno.alumno_id
         ).filter(
             MatriculaAlumno.ciclo_academico_id == ciclo_id,
-            MatriculaAlumno.activo == True,
+            MatriculaAlumno.estado == 'activa',
             Usuario.rol == 'alumno',
             Usuario.activo == True
         ).order_by(Usuario.nombre, Usuario.apellido).all()
@@ -1683,3 +1925,11 @@ def api_estudiantes_por_ciclo(ciclo_id):
             'success': False,
             'message': f'Error al obtener estudiantes: {str(e)}'
         })
+
+@admin_bp.route('/api/fragmentos')
+@login_required
+@admin_required
+def api_metricas_fragmentos():
+    """Métricas de la caché de fragmentos de plantillas: aciertos, fallos y bytes ahorrados por ámbito"""
+    from app.services.fragmentos import estadisticas_fragmentos
+    return jsonify({'success': True, **estadisticas_fragmentos()})
@@ -1,7 +1,7 @@
 from flask import render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
-from app import db
-from app.models import Usuario, Curso, CursoAlumno, CursoDocente, Nota, NotaActividades, NotaPracticas, NotaParcial
+from app.services.expedientes import obtener_expediente, obtener_expediente_versionado
+from app.services.condicionales import respuesta_condicional
 from . import alumno_bp
 
 def alumno_required(f):
@@ -15,14 +15,24 @@ def alumno_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def version_expediente(curso_id=None):
+    """Validador de las páginas que se leen del expediente del alumno.
+
+    Para las notas de un curso en el que no está matriculado devuelve None:
+    la vista redirige.
+    """
+    version, cursos = obtener_expediente_versionado(current_user.id)
+    if curso_id is not None and not any(curso['id'] == curso_id for curso in cursos):
+        return None
+    return version
+
 @alumno_bp.route('/')
 @login_required
 @alumno_required
+@respuesta_condicional(version_expediente)
 def dashboard():
-    # Obtener cursos del alumno
-    cursos = db.session.query(Curso).join(CursoAlumno).filter(
-        CursoAlumno.alumno_id == current_user.id
-    ).all()
+    # Cursos del alumno desde su expediente en caché
+    cursos = obtener_expediente(current_user.id)
     
     return render_template('alumno/dashboard.html', cursos=cursos)
 
@@ -31,99 +41,34 @@ def dashboard():
 @alumno_bp.route('/notas/curso/<int:curso_id>')
 @login_required
 @alumno_required
+@respuesta_condicional(version_expediente)
 def ver_notas_curso(curso_id):
     # Verificar que el alumno esté matriculado en el curso
-    matricula = CursoAlumno.query.filter_by(
-        curso_id=curso_id, 
-        alumno_id=current_user.id
-    ).first()
+    curso = next((curso for curso in obtener_expediente(current_user.id) if curso['id'] == curso_id), None)
     
-    if not matricula:
+    if not curso:
         flash('No estás matriculado en este curso.', 'error')
         return redirect(url_for('alumno.dashboard'))
     
-    # Obtener nota del curso (solo si está publicada)
-    nota = Nota.query.filter_by(
-        curso_id=curso_id, 
-        alumno_id=current_user.id,
-        estado='publicada'
-    ).first()
-    
-    # Obtener curso con información del docente
-    curso = db.session.query(Curso).join(CursoDocente).join(Usuario).filter(
-        Curso.id == curso_id,
-        Usuario.rol == 'docente'
-    ).first()
-    
-    # Si no se encuentra el curso con docente, obtener solo el curso
-    if not curso:
-        curso = Curso.query.get(curso_id)
-    
-    # Obtener detalles de las notas si existe la nota principal
-    nota_actividades = None
-    nota_practicas = None
-    nota_parcial = None
-    promedio_actividades = 0
-    promedio_practicas = 0
-    promedio_parciales = 0
-    
-    if nota:
-        # Obtener actividades
-        if nota.nota_actividades_id:
-            nota_actividades = NotaActividades.query.get(nota.nota_actividades_id)
-            if nota_actividades:
-                actividades_vals = [
-                    nota_actividades.actividad1, nota_actividades.actividad2,
-                    nota_actividades.actividad3, nota_actividades.actividad4,
-                    nota_actividades.actividad5, nota_actividades.actividad6,
-                    nota_actividades.actividad7, nota_actividades.actividad8
-                ]
-                actividades_validas = [val for val in actividades_vals if val is not None and val > 0]
-                if actividades_validas:
-                    promedio_actividades = sum(actividades_validas) / len(actividades_validas)
-        
-        # Obtener prácticas
-        if nota.nota_practicas_id:
-            nota_practicas = NotaPracticas.query.get(nota.nota_practicas_id)
-            if nota_practicas:
-                practicas_vals = [
-                    nota_practicas.practica1, nota_practicas.practica2,
-                    nota_practicas.practica3, nota_practicas.practica4
-                ]
-                practicas_validas = [val for val in practicas_vals if val is not None and val > 0]
-                if practicas_validas:
-                    promedio_practicas = sum(practicas_validas) / len(practicas_validas)
-        
-        # Obtener parciales
-        if nota.nota_parcial_id:
-            nota_parcial = NotaParcial.query.get(nota.nota_parcial_id)
-            if nota_parcial:
-                parciales_vals = [nota_parcial.parcial1, nota_parcial.parcial2]
-                parciales_validos = [val for val in parciales_vals if val is not None and val > 0]
-                if parciales_validos:
-                    promedio_parciales = sum(parciales_validos) / len(parciales_validos)
+    # Nota del curso (solo si está publicada) con sus detalles y promedios
+    nota = curso['nota']
     
     return render_template('alumno/notas_curso.html', 
                          nota=nota, 
                          curso=curso,
-                         nota_actividades=nota_actividades,
-                         nota_practicas=nota_practicas,
-                         nota_parcial=nota_parcial,
-                         promedio_actividades=promedio_actividades,
-                         promedio_practicas=promedio_practicas,
-                         promedio_parciales=promedio_parciales)
+                         nota_actividades=nota and nota['actividades'],
+                         nota_practicas=nota and nota['practicas'],
+                         nota_parcial=nota and nota['parciales'],
+                         promedio_actividades=nota['promedio_actividades'] if nota else 0,
+                         promedio_practicas=nota['promedio_practicas'] if nota else 0,
+                         promedio_parciales=nota['promedio_parciales'] if nota else 0)
 
 @alumno_bp.route('/cursos')
 @login_required
 @alumno_required
+@respuesta_condicional(version_expediente)
 def ver_cursos():
-    # Obtener cursos del alumno con información de notas (solo publicadas)
-    cursos_notas = db.session.query(Curso, Nota).outerjoin(Nota, 
-        db.and_(
-            Nota.curso_id == Curso.id, 
-            Nota.alumno_id == current_user.id,
-            Nota.estado == 'publicada'
-        )
-    ).join(CursoAlumno).filter(CursoAlumno.alumno_id == current_user.id).all()
+    # Cursos del alumno con su nota (solo publicadas)
+    cursos_notas = [(curso, curso['nota']) for curso in obtener_expediente(current_user.id)]
     
     return render_template('alumno/cursos.html', cursos_notas=cursos_notas)
@@ -2,6 +2,7 @@ from flask import render_template, request, redirect, url_for, flash, session
 from flask_login import login_user, logout_user, login_required, current_user
 from app import db
 from app.models import Usuario
+from app.services.contrasenas import necesita_rehash
 from . import auth_bp
 
 @auth_bp.route('/role-selection')
@@ -16,80 +17,62 @@ def login():
     # Redirigir a la selección de rol en lugar del login directo
     return redirect(url_for('auth.role_selection'))
 
-@auth_bp.route('/login/admin', methods=['GET', 'POST'])
-def login_admin():
+# Plantilla, página de inicio y mensaje de error de cada rol
+LOGIN_POR_ROL = {
+    'admin': ('auth/login_admin.html', 'admin.dashboard',
+              'Credenciales incorrectas o no tienes permisos de administrador.'),
+    'docente': ('auth/login_docente.html', 'docente.dashboard',
+                'Credenciales incorrectas o no tienes permisos de docente.'),
+    'alumno': ('auth/login_alumno.html', 'alumno.dashboard',
+               'Credenciales incorrectas o no tienes permisos de estudiante.'),
+}
+
+def _iniciar_sesion(rol):
+    """Login común de los tres roles.
+
+    La contraseña se verifica en el pool de hashes (ver app/services/contrasenas.py)
+    y, si el hash guardado usa otros parámetros que los configurados para el rol,
+    se recalcula con la contraseña recién verificada.
+    """
     if current_user.is_authenticated:
         return redirect(url_for('main.dashboard'))
     
+    plantilla, inicio, mensaje_error = LOGIN_POR_ROL[rol]
+    
     if request.method == 'POST':
         dni = request.form.get('dni')
         password = request.form.get('password')
         
         if not dni or not password:
             flash('Por favor completa todos los campos.', 'error')
-            return redirect(url_for('auth.login_admin'))
+            return redirect(url_for(f'auth.login_{rol}'))
         
-        user = Usuario.query.filter_by(dni=dni, activo=True, rol='admin').first()
+        user = Usuario.query.filter_by(dni=dni, activo=True, rol=rol).first()
         
         if user and user.check_password(password):
+            if necesita_rehash(user.password_hash, rol):
+                user.set_password(password)
+                db.session.commit()
             login_user(user)
             next_page = request.args.get('next')
-            return redirect(next_page) if next_page else redirect(url_for('admin.dashboard'))
+            return redirect(next_page) if next_page else redirect(url_for(inicio))
         else:
-            flash('Credenciales incorrectas o no tienes permisos de administrador.', 'error')
-            return redirect(url_for('auth.login_admin'))
+            flash(mensaje_error, 'error')
+            return redirect(url_for(f'auth.login_{rol}'))
     
-    return render_template('auth/login_admin.html')
+    return render_template(plantilla)
+
+@auth_bp.route('/login/admin', methods=['GET', 'POST'])
+def login_admin():
+    return _iniciar_sesion('admin')
 
 @auth_bp.route('/login/docente', methods=['GET', 'POST'])
 def login_docente():
-    if current_user.is_authenticated:
-        return redirect(url_for('main.dashboard'))
-    
-    if request.method == 'POST':
-        dni = request.form.get('dni')
-        password = request.form.get('password')
-        
-        if not dni or not password:
-            flash('Por favor completa todos los campos.', 'error')
-            return redirect(url_for('auth.login_docente'))
-        
-        user = Usuario.query.filter_by(dni=dni, activo=True, rol='docente').first()
-        
-        if user and user.check_password(password):
-            login_user(user)
-            next_page = request.args.get('next')
-            return redirect(next_page) if next_page else redirect(url_for('docente.dashboard'))
-        else:
-            flash('Credenciales incorrectas o no tienes permisos de docente.', 'error')
-            return redirect(url_for('auth.login_docente'))
-    
-    return render_template('auth/login_docente.html')
+    return _iniciar_sesion('docente')
 
 @auth_bp.route('/login/alumno', methods=['GET', 'POST'])
 def login_alumno():
-    if current_user.is_authenticated:
-        return redirect(url_for('main.dashboard'))
-    
-    if request.method == 'POST':
-        dni = request.form.get('dni')
-        password = request.form.get('password')
-        
-        if not dni or not password:
-            flash('Por favor completa todos los campos.', 'error')
-            return redirect(url_for('auth.login_alumno'))
-        
-        user = Usuario.query.filter_by(dni=dni, activo=True, rol='alumno').first()
-        
-        if user and user.check_password(password):
-            login_user(user)
-            next_page = request.args.get('next')
-            return redirect(next_page) if next_page else redirect(url_for('alumno.dashboard'))
-        else:
-            flash('Credenciales incorrectas o no tienes permisos de estudiante.', 'error')
-            return redirect(url_for('auth.login_alumno'))
-    
-    return render_template('auth/login_alumno.html')
+    return _iniciar_sesion('alumno')
 
 @auth_bp.route('/logout')
 @login_required
@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+depuracion_bp = Blueprint('depuracion', __name__, url_prefix='/debug')
+
+from . import routes
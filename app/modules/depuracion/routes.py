@@ -0,0 +1,39 @@
+from flask import jsonify, current_app
+from flask_login import current_user
+from app.services.perfilador import perfiles_recientes
+from . import depuracion_bp
+
+def admin_required(f):
+    """Decorator para requerir rol de administrador (respuesta JSON)"""
+    from functools import wraps
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated or current_user.rol != 'admin':
+            return jsonify({'success': False, 'message': 'No tienes permisos para acceder a esta página.'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+def _resumen(registro, detalle):
+    datos = registro['perfil'].como_dict(current_app.config['PERFIL_CONSULTAS_UMBRAL_REPETIDAS'], detalle=detalle)
+    datos['endpoint'] = registro['endpoint']
+    datos['estado'] = registro['estado']
+    return datos
+
+@depuracion_bp.route('/consultas')
+@admin_required
+def consultas():
+    """Consultas SQL de las últimas peticiones"""
+    return jsonify({
+        'success': True,
+        'umbral_repetidas': current_app.config['PERFIL_CONSULTAS_UMBRAL_REPETIDAS'],
+        'peticiones': [_resumen(registro, detalle=False) for registro in perfiles_recientes()]
+    })
+
+@depuracion_bp.route('/consultas/<perfil_id>')
+@admin_required
+def detalle_consultas(perfil_id):
+    """Sentencias agrupadas por huella de una petición"""
+    for registro in perfiles_recientes():
+        if registro['perfil'].id == perfil_id:
+            return jsonify({'success': True, 'peticion': _resumen(registro, detalle=True)})
+    return jsonify({'success': False, 'message': 'Perfil no encontrado.'}), 404
@@ -1,7 +1,16 @@
-﻿from flask import render_template, request, redirect, url_for, flash, jsonify, make_response, abort
+﻿import os
+from flask import render_template, request, redirect, url_for, flash, jsonify, make_response, abort, send_file
 from flask_login import login_required, current_user
 from app import db
 from app.models import Usuario, Curso, CursoDocente, CursoAlumno, Nota, NotaActividades, NotaPracticas, NotaParcial
+from app.services.calificaciones import promedio_ponderado
+from app.services.reportes import obtener_datos_reporte_curso, obtener_pdf_curso, ruta_pdf_curso, version_notas_curso, motor_pdf
+from app.services.trabajos import obtener_cola
+from app.services.notas import filas_desde_formulario, guardar_notas_curso
+from app.services.resumenes import actualizar_resumen_curso
+from app.services.expedientes import invalidar_expedientes
+from app.services.replicas import lectura_en_replica
+from app.services.condicionales import respuesta_condicional
 from . import docente_bp
 
 def docente_required(f):
@@ -194,6 +203,8 @@ def guardar_notas(curso_id):
             alumno_id=alumno_id
         ).first()
         
+        estado_anterior = nota.estado if nota else None
+        
         if not nota:
             nota = Nota(
                 curso_id=curso_id,
@@ -216,8 +227,13 @@ def guardar_notas(curso_id):
         # Calcular promedio final
         nota.calcular_promedio_final()
         
+        actualizar_resumen_curso(curso_id)
         db.session.commit()
         
+        # El expediente del alumno solo muestra notas publicadas
+        if 'publicada' in (estado_anterior, nota.estado):
+            invalidar_expedientes([alumno_id])
+        
         return jsonify({
             'success': True, 
             'message': 'Notas guardadas correctamente.',
@@ -233,6 +249,41 @@ def guardar_notas(curso_id):
         print(f"Error al guardar notas: {e}")  # Para debugging
         return jsonify({'success': False, 'message': f'Error interno del servidor: {str(e)}'})
 
+@docente_bp.route('/cursos/<int:curso_id>/notas/guardar-lote', methods=['POST'])
+@login_required
+@docente_required
+def guardar_notas_lote(curso_id):
+    """Guarda las notas de todo el curso en una sola transacción.
+
+    Acepta JSON ({"notas": [{"alumno_id": ..., "actividad1": ..., ...}, ...]})
+    o arreglos de formulario con un valor por alumno en cada campo.
+    """
+    curso_docente = CursoDocente.query.filter_by(
+        curso_id=curso_id, 
+        docente_id=current_user.id
+    ).first()
+    
+    if not curso_docente:
+        return jsonify({'success': False, 'message': 'No tienes acceso a este curso.'})
+    
+    try:
+        if request.is_json:
+            filas = (request.get_json(silent=True) or {}).get('notas') or []
+        else:
+            filas = filas_desde_formulario(request.form)
+        
+        resultados = guardar_notas_curso(curso_id, current_user.id, filas)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error interno del servidor: {str(e)}'})
+    
+    return jsonify({
+        'success': True,
+        'message': f'Notas guardadas correctamente para {len(resultados)} alumno(s).',
+        'resultados': resultados
+    })
+
 @docente_bp.route('/cursos/<int:curso_id>/notas/<int:alumno_id>')
 @login_required
 @docente_required
@@ -308,7 +359,9 @@ def cambiar_estado_nota(curso_id, alumno_id):
         else:
             nota.estado = 'borrador'
         
+        actualizar_resumen_curso(curso_id)
         db.session.commit()
+        invalidar_expedientes([alumno_id])
         
         return jsonify({
             'success': True, 
@@ -323,6 +376,7 @@ def cambiar_estado_nota(curso_id, alumno_id):
 @docente_bp.route('/reportes')
 @login_required
 @docente_required
+@lectura_en_replica
 def reportes():
     cursos = db.session.query(Curso).join(CursoDocente).filter(
         CursoDocente.docente_id == current_user.id
@@ -345,6 +399,8 @@ def reportes():
 @docente_bp.route('/reportes/curso/<int:curso_id>')
 @login_required
 @docente_required
+@lectura_en_replica
+@respuesta_condicional(version_notas_curso)
 def reporte_curso(curso_id):
     from datetime import datetime
     # Seguridad y contexto del docente si aplica
@@ -353,74 +409,16 @@ def reporte_curso(curso_id):
     except Exception:
         abort(404)
 
-    # Obtener alumnos del curso (modelo Usuario, rol alumno)
-    alumnos = db.session.query(Usuario).join(CursoAlumno).filter(
-        CursoAlumno.curso_id == curso_id,
-        Usuario.rol == 'alumno'
-    ).order_by(Usuario.apellido.asc(), Usuario.nombre.asc()).all()
-    datos = []
-
-    for alumno in alumnos:
-        na = NotaActividades.query.filter_by(curso_id=curso_id, alumno_id=alumno.id).first()
-        np = NotaPracticas.query.filter_by(curso_id=curso_id, alumno_id=alumno.id).first()
-        npa = NotaParcial.query.filter_by(curso_id=curso_id, alumno_id=alumno.id).first()
-        nota = Nota.query.filter_by(curso_id=curso_id, alumno_id=alumno.id).first()
-
-        actividades = []
-        if na:
-            actividades = [na.actividad1, na.actividad2, na.actividad3, na.actividad4, na.actividad5, na.actividad6, na.actividad7, na.actividad8]
-        else:
-            actividades = []
-
-        practicas = []
-        if np:
-            practicas = [np.practica1, np.practica2, np.practica3, np.practica4]
-        else:
-            practicas = []
-
-        parciales = []
-        if npa:
-            parciales = [npa.parcial1, npa.parcial2]
-        else:
-            parciales = []
-
-        prom_acts = 0.0
-        prom_pracs = 0.0
-        prom_parcs = 0.0
-
-        if nota:
-            prom_acts = getattr(nota, 'promedio_actividades', 0.0) or 0.0
-            prom_pracs = getattr(nota, 'promedio_practicas', 0.0) or 0.0
-            prom_parcs = getattr(nota, 'promedio_parciales', 0.0) or 0.0
-        
-        # Si promedios están en cero, intenta calcular desde tablas de detalle
-        if prom_acts == 0.0 and na:
-            prom_acts = getattr(na, 'promedio_actividades', 0.0) or 0.0
-        if prom_pracs == 0.0 and np:
-            prom_pracs = getattr(np, 'promedio_practicas', 0.0) or 0.0
-        if prom_parcs == 0.0 and npa:
-            prom_parcs = getattr(npa, 'promedio_parciales', 0.0) or 0.0
-
-        promedio_final = round((prom_acts * 0.10) + (prom_pracs * 0.30) + (prom_parcs * 0.60), 2)
-        estado = getattr(nota, 'estado', None) if nota else None
-
-        datos.append({
-            'alumno': alumno,
-            'actividades': actividades,
-            'practicas': practicas,
-            'parciales': parciales,
-            'promedio_actividades': round(prom_acts, 2) if prom_acts is not None else None,
-            'promedio_practicas': round(prom_pracs, 2) if prom_pracs is not None else None,
-            'promedio_parciales': round(prom_parcs, 2) if prom_parcs is not None else None,
-            'promedio_final': promedio_final,
-            'estado': estado
-        })
-
-    return render_template('docente/reporte_curso.html', curso=curso, datos=datos)
+    # Las tablas se guardan como fragmento por versión de las notas: los datos
+    # solo se consultan si la plantilla tiene que renderizarlas
+    return render_template('docente/reporte_curso.html', curso=curso,
+                           version=version_notas_curso(curso_id),
+                           cargar_datos=lambda: obtener_datos_reporte_curso(curso_id))
 
 @docente_bp.route('/reportes/alumno/<int:alumno_id>')
 @login_required
 @docente_required
+@lectura_en_replica
 def reporte_alumno(alumno_id):
     alumno = Usuario.query.get_or_404(alumno_id)
 
@@ -435,7 +433,6 @@ def reporte_alumno(alumno_id):
         prom_acts = 0.0
         prom_pracs = 0.0
         prom_parcs = 0.0
-        prom_final = 0.0
         estado = None
 
         if nota:
@@ -453,8 +450,6 @@ def reporte_alumno(alumno_id):
             if prom_parcs == 0:
                 npa = NotaParcial.query.filter_by(curso_id=curso.id, alumno_id=alumno_id).first()
                 prom_parcs = npa.promedio_parciales if npa and npa.promedio_parciales else 0.0
-
-            prom_final = (prom_acts * 0.10) + (prom_pracs * 0.30) + (prom_parcs * 0.60)
         else:
             na = NotaActividades.query.filter_by(curso_id=curso.id, alumno_id=alumno_id).first()
             np = NotaPracticas.query.filter_by(curso_id=curso.id, alumno_id=alumno_id).first()
@@ -462,86 +457,110 @@ def reporte_alumno(alumno_id):
             prom_acts = na.promedio_actividades if na and na.promedio_actividades else 0.0
             prom_pracs = np.promedio_practicas if np and np.promedio_practicas else 0.0
             prom_parcs = npa.promedio_parciales if npa and npa.promedio_parciales else 0.0
-            prom_final = (prom_acts * 0.10) + (prom_pracs * 0.30) + (prom_parcs * 0.60)
 
         datos.append({
             'curso': curso,
             'promedio_actividades': prom_acts,
             'promedio_practicas': prom_pracs,
             'promedio_parciales': prom_parcs,
-            'promedio_final': prom_final,
             'estado': estado
         })
 
+    # Promedios finales de todos los cursos del alumno en una sola pasada
+    finales = promedio_ponderado(
+        [fila['promedio_actividades'] for fila in datos],
+        [fila['promedio_practicas'] for fila in datos],
+        [fila['promedio_parciales'] for fila in datos]
+    ).tolist()
+    for fila, prom_final in zip(datos, finales):
+        fila['promedio_final'] = prom_final
+
     return render_template('docente/reporte_alumno.html', alumno=alumno, datos=datos)
 
 
+def validador_pdf_curso(curso_id):
+    """Validador del PDF del curso: la versión de sus notas y el motor que lo dibuja"""
+    version = version_notas_curso(curso_id)
+    return f'{version}:{motor_pdf()}' if version is not None else None
+
 @docente_bp.route('/reportes/curso/<int:curso_id>/pdf')
 @login_required
 @docente_required
+@lectura_en_replica
+@respuesta_condicional(validador_pdf_curso)
 def reporte_curso_pdf(curso_id):
-    # Construir los mismos datos detallados que en la vista HTML
     try:
         curso = Curso.query.get_or_404(curso_id)
     except Exception:
         abort(404)
 
-    # Obtener alumnos del curso (modelo Usuario, rol alumno)
-    alumnos = db.session.query(Usuario).join(CursoAlumno).filter(
-        CursoAlumno.curso_id == curso_id,
-        Usuario.rol == 'alumno'
-    ).order_by(Usuario.apellido.asc(), Usuario.nombre.asc()).all()
-    datos = []
-    for alumno in alumnos:
-        na = NotaActividades.query.filter_by(curso_id=curso_id, alumno_id=alumno.id).first()
-        np = NotaPracticas.query.filter_by(curso_id=curso_id, alumno_id=alumno.id).first()
-        npa = NotaParcial.query.filter_by(curso_id=curso_id, alumno_id=alumno.id).first()
-        nota = Nota.query.filter_by(curso_id=curso_id, alumno_id=alumno.id).first()
+    # Reutiliza el PDF en disco si las notas no cambiaron desde la última generación
+    ruta = obtener_pdf_curso(curso)
+    if not ruta:
+        flash('Error generando PDF.', 'error')
+        return redirect(url_for('docente.reporte_curso', curso_id=curso_id))
 
-        actividades = [na.actividad1, na.actividad2, na.actividad3, na.actividad4, na.actividad5, na.actividad6, na.actividad7, na.actividad8] if na else []
-        practicas = [np.practica1, np.practica2, np.practica3, np.practica4] if np else []
-        parciales = [npa.parcial1, npa.parcial2] if npa else []
+    return send_file(ruta, mimetype='application/pdf', as_attachment=True,
+                     download_name=f"reporte_curso_{curso.codigo}.pdf")
 
-        prom_acts = 0.0
-        prom_pracs = 0.0
-        prom_parcs = 0.0
-        if nota:
-            prom_acts = getattr(nota, 'promedio_actividades', 0.0) or 0.0
-            prom_pracs = getattr(nota, 'promedio_practicas', 0.0) or 0.0
-            prom_parcs = getattr(nota, 'promedio_parciales', 0.0) or 0.0
-        if prom_acts == 0.0 and na:
-            prom_acts = getattr(na, 'promedio_actividades', 0.0) or 0.0
-        if prom_pracs == 0.0 and np:
-            prom_pracs = getattr(np, 'promedio_practicas', 0.0) or 0.0
-        if prom_parcs == 0.0 and npa:
-            prom_parcs = getattr(npa, 'promedio_parciales', 0.0) or 0.0
-
-        promedio_final = round((prom_acts * 0.10) + (prom_pracs * 0.30) + (prom_parcs * 0.60), 2)
-        estado = getattr(nota, 'estado', None) if nota else None
+@docente_bp.route('/reportes/curso/<int:curso_id>/pdf/solicitar', methods=['POST'])
+@login_required
+@docente_required
+def solicitar_reporte_curso_pdf(curso_id):
+    """Encola la generación del PDF del curso y devuelve el id del trabajo"""
+    curso = Curso.query.get(curso_id)
+    if not curso:
+        return jsonify({'success': False, 'message': 'Curso no encontrado.'})
 
-        datos.append({
-            'alumno': alumno,
-            'actividades': actividades,
-            'practicas': practicas,
-            'parciales': parciales,
-            'promedio_actividades': round(prom_acts, 2) if prom_acts is not None else None,
-            'promedio_practicas': round(prom_pracs, 2) if prom_pracs is not None else None,
-            'promedio_parciales': round(prom_parcs, 2) if prom_parcs is not None else None,
-            'promedio_final': promedio_final,
-            'estado': estado
+    # Si el PDF de la versión actual ya existe no hace falta encolar nada
+    if os.path.exists(ruta_pdf_curso(curso_id, version_notas_curso(curso_id))):
+        return jsonify({
+            'success': True,
+            'estado': 'terminado',
+            'url_descarga': url_for('docente.reporte_curso_pdf', curso_id=curso_id)
         })
 
-    html = render_template('docente/reporte_curso_pdf.html', curso=curso, datos=datos)
-    from xhtml2pdf import pisa
-    from io import BytesIO
-    result = BytesIO()
-    pisa_status = pisa.CreatePDF(html, dest=result)
-    if hasattr(pisa_status, 'err') and pisa_status.err:
-        flash('Error generando PDF.', 'error')
-        return redirect(url_for('docente.reporte_curso', curso_id=curso_id))
-
-    response = make_response(result.getvalue())
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f"attachment; filename=reporte_curso_{curso.codigo}.pdf"
-    return response
+    try:
+        trabajo_id = obtener_cola().encolar('reporte_curso_pdf', {'curso_id': curso_id}, propietario_id=current_user.id)
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error al encolar el reporte: {str(e)}'})
+
+    return jsonify({
+        'success': True,
+        'trabajo_id': trabajo_id,
+        'estado': 'pendiente',
+        'url_estado': url_for('docente.estado_trabajo', trabajo_id=trabajo_id)
+    })
+
+def _trabajo_del_docente(trabajo_id):
+    trabajo = obtener_cola().obtener(trabajo_id)
+    if not trabajo or trabajo['propietario_id'] != current_user.id:
+        return None
+    return trabajo
+
+@docente_bp.route('/reportes/trabajos/<trabajo_id>')
+@login_required
+@docente_required
+def estado_trabajo(trabajo_id):
+    """Consulta el estado de un trabajo de generación de reportes"""
+    trabajo = _trabajo_del_docente(trabajo_id)
+    if not trabajo:
+        return jsonify({'success': False, 'message': 'Trabajo no encontrado.'})
+
+    respuesta = {'success': True, 'trabajo_id': trabajo_id, 'estado': trabajo['estado']}
+    if trabajo['estado'] == 'terminado':
+        respuesta['url_descarga'] = url_for('docente.descargar_trabajo', trabajo_id=trabajo_id)
+    elif trabajo['estado'] == 'error':
+        respuesta['message'] = trabajo['error']
+    return jsonify(respuesta)
+
+@docente_bp.route('/reportes/trabajos/<trabajo_id>/descargar')
+@login_required
+@docente_required
+def descargar_trabajo(trabajo_id):
+    trabajo = _trabajo_del_docente(trabajo_id)
+    if not trabajo or trabajo['estado'] != 'terminado' or not os.path.exists(trabajo['resultado']['ruta']):
+        abort(404)
 
+    return send_file(trabajo['resultado']['ruta'], mimetype='application/pdf', as_attachment=True,
+                     download_name=trabajo['resultado']['nombre'])
@@ -0,0 +1,121 @@
+"""
+Búsqueda por prefijo de alumnos y cursos para los campos de autocompletado.
+
+Las páginas del administrador ya no cargan todos los alumnos y cursos en
+listas desplegables: el navegador consulta /admin/api/buscar-* a medida que
+se escribe. Las búsquedas usan LIKE 'texto%' (prefijo), que se resuelve con
+los índices ix_usuarios_rol_nombre, ix_usuarios_rol_apellido, el índice
+único de dni, ix_cursos_nombre y el índice único de codigo.
+
+Los resultados se guardan en una caché pequeña (BUSQUEDA_CACHE_*) que las
+rutas que crean, editan o eliminan alumnos, cursos o matrículas vacían con
+`invalidar_busquedas()`.
+"""
+
+from flask import current_app
+
+from app import db
+from app.models import Usuario, Curso, CicloAcademico, MatriculaAlumno
+from app.services.cache import crear_cache
+
+LONGITUD_MINIMA = 2
+LIMITE_RESULTADOS = 20
+
+
+def _prefijo(columna, texto):
+    """columna LIKE 'texto%' escapando los comodines del texto"""
+    texto = texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return columna.like(f'{texto}%', escape='\\')
+
+
+def _normalizar(texto):
+    return ' '.join((texto or '').split()).lower()
+
+
+def _en_cache(clave, calcular):
+    cache = current_app.extensions['cache_busquedas']
+    resultado = cache.obtener(clave)
+    if resultado is None:
+        resultado = calcular()
+        cache.guardar(clave, resultado)
+    return resultado
+
+
+def buscar_alumnos(texto, ciclo_id=None, con_matricula=False, limite=LIMITE_RESULTADOS):
+    """Alumnos activos cuyo DNI, nombre o apellido empieza por `texto`.
+
+    Con varias palabras, cada una debe ser prefijo del nombre o del apellido.
+    `ciclo_id` limita a los alumnos con matrícula activa en ese ciclo y
+    `con_matricula` agrega el ciclo de la matrícula activa de cada alumno.
+    """
+    texto = _normalizar(texto)
+    if len(texto) < LONGITUD_MINIMA:
+        return []
+
+    def calcular():
+        palabras = texto.split()
+        query = db.session.query(Usuario.id, Usuario.dni, Usuario.nombre, Usuario.apellido).filter(
+            Usuario.rol == 'alumno', Usuario.activo == True
+        )
+        if len(palabras) == 1:
+            query = query.filter(db.or_(_prefijo(Usuario.dni, texto), _prefijo(Usuario.nombre, texto),
+                                        _prefijo(Usuario.apellido, texto)))
+        else:
+            for palabra in palabras:
+                query = query.filter(db.or_(_prefijo(Usuario.nombre, palabra), _prefijo(Usuario.apellido, palabra)))
+        if ciclo_id:
+            query = query.filter(db.exists().where(
+                MatriculaAlumno.alumno_id == Usuario.id,
+                MatriculaAlumno.ciclo_academico_id == ciclo_id,
+                MatriculaAlumno.estado == 'activa'
+            ))
+        filas = query.order_by(Usuario.apellido, Usuario.nombre, Usuario.id).limit(limite).all()
+        alumnos = [
+            {'id': id, 'dni': dni, 'nombre': f'{nombre} {apellido}'}
+            for id, dni, nombre, apellido in filas
+        ]
+
+        if con_matricula and alumnos:
+            ciclos = dict(db.session.query(MatriculaAlumno.alumno_id, CicloAcademico.nombre).join(
+                CicloAcademico, CicloAcademico.id == MatriculaAlumno.ciclo_academico_id
+            ).filter(
+                MatriculaAlumno.alumno_id.in_([alumno['id'] for alumno in alumnos]),
+                MatriculaAlumno.estado == 'activa'
+            ))
+            for alumno in alumnos:
+                alumno['ciclo_actual'] = ciclos.get(alumno['id'])
+        return alumnos
+
+    clave = f'alumnos:{ciclo_id or ""}:{int(con_matricula)}:{limite}:{texto}'
+    return _en_cache(clave, calcular)
+
+
+def buscar_cursos(texto, ciclo_id=None, limite=LIMITE_RESULTADOS):
+    """Cursos activos cuyo nombre o código empieza por `texto`"""
+    texto = _normalizar(texto)
+    if len(texto) < LONGITUD_MINIMA:
+        return []
+
+    def calcular():
+        query = db.session.query(Curso.id, Curso.nombre, Curso.codigo).filter(
+            Curso.activo == True,
+            db.or_(_prefijo(Curso.nombre, texto), _prefijo(Curso.codigo, texto))
+        )
+        if ciclo_id:
+            query = query.filter(Curso.ciclo_academico_id == ciclo_id)
+        filas = query.order_by(Curso.nombre, Curso.id).limit(limite).all()
+        return [{'id': id, 'nombre': nombre, 'codigo': codigo} for id, nombre, codigo in filas]
+
+    return _en_cache(f'cursos:{ciclo_id or ""}:{limite}:{texto}', calcular)
+
+
+def invalidar_busquedas():
+    """Vacía los resultados en caché; llamar después de modificar alumnos, cursos o matrículas"""
+    current_app.extensions['cache_busquedas'].limpiar()
+
+
+def init_cache_busquedas(app):
+    """Crea la caché de búsquedas y la registra en app.extensions['cache_busquedas']"""
+    cache = crear_cache(app, 'BUSQUEDA_CACHE', 'busquedas', ttl=60, maximo=2000)
+    app.extensions['cache_busquedas'] = cache
+    return cache
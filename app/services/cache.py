@@ -0,0 +1,225 @@
+"""
+Cachés clave-valor con tiempo de vida (TTL) para datos derivados de la base.
+
+Backends disponibles:
+- 'memoria': diccionario LRU del proceso (rápido, no se comparte entre procesos).
+- 'sqlite': archivo SQLite local compartido por los procesos del servidor,
+  útil cuando la aplicación corre con varios workers en la misma máquina.
+
+Los valores deben ser serializables a JSON (diccionarios, listas, números y
+cadenas). Cada caché se configura con variables <PREFIJO>_BACKEND,
+<PREFIJO>_TTL, <PREFIJO>_MAXIMO, <PREFIJO>_MAXIMO_BYTES (solo 'memoria') y
+<PREFIJO>_SQLITE (ver `crear_cache`).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class Cache:
+    """Interfaz común de los backends de caché"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave):
+        """Devuelve el valor guardado o None si no existe o expiró"""
+        raise NotImplementedError
+
+    def guardar(self, clave, valor, ttl=None):
+        raise NotImplementedError
+
+    def invalidar(self, clave):
+        raise NotImplementedError
+
+    def invalidar_prefijo(self, prefijo):
+        """Elimina todas las claves que empiezan con `prefijo`"""
+        raise NotImplementedError
+
+    def limpiar(self):
+        raise NotImplementedError
+
+    def _contar(self, valor):
+        if valor is None:
+            self.fallos += 1
+        else:
+            self.aciertos += 1
+        return valor
+
+    def estadisticas(self):
+        consultas = self.aciertos + self.fallos
+        return {
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'tasa_aciertos': round(self.aciertos / consultas, 4) if consultas else 0.0
+        }
+
+
+class CacheNula(Cache):
+    """Caché deshabilitada: nunca guarda nada"""
+
+    def obtener(self, clave):
+        return self._contar(None)
+
+    def guardar(self, clave, valor, ttl=None):
+        pass
+
+    def invalidar(self, clave):
+        pass
+
+    def invalidar_prefijo(self, prefijo):
+        pass
+
+    def limpiar(self):
+        pass
+
+
+def tamano_valor(valor):
+    """Bytes aproximados que ocupa un valor de la caché (su texto en UTF-8 o su JSON)"""
+    if isinstance(valor, bytes):
+        return len(valor)
+    if not isinstance(valor, str):
+        valor = json.dumps(valor)
+    return len(valor.encode('utf-8'))
+
+
+class CacheMemoria(Cache):
+    """LRU en memoria con expiración por entrada, segura entre hilos.
+
+    Con `maximo_bytes` también se descartan las entradas menos usadas hasta
+    que la suma de los tamaños de los valores (`tamano_valor`) entra en el
+    límite; un valor más grande que el límite no se guarda.
+    """
+
+    def __init__(self, ttl, maximo=1000, maximo_bytes=None):
+        super().__init__(ttl)
+        self.maximo = maximo
+        self.maximo_bytes = maximo_bytes
+        self.bytes = 0
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _quitar(self, clave):
+        expira, valor, tamano = self._datos.pop(clave)
+        self.bytes -= tamano
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return self._contar(None)
+            expira, valor, _ = entrada
+            if expira < time.monotonic():
+                self._quitar(clave)
+                return self._contar(None)
+            self._datos.move_to_end(clave)
+            return self._contar(valor)
+
+    def guardar(self, clave, valor, ttl=None):
+        expira = time.monotonic() + (self.ttl if ttl is None else ttl)
+        tamano = tamano_valor(valor) if self.maximo_bytes else 0
+        with self._lock:
+            if clave in self._datos:
+                self._quitar(clave)
+            if self.maximo_bytes and tamano > self.maximo_bytes:
+                return
+            self._datos[clave] = (expira, valor, tamano)
+            self.bytes += tamano
+            while len(self._datos) > self.maximo or (self.maximo_bytes and self.bytes > self.maximo_bytes):
+                self._quitar(next(iter(self._datos)))
+
+    def invalidar(self, clave):
+        with self._lock:
+            if clave in self._datos:
+                self._quitar(clave)
+
+    def invalidar_prefijo(self, prefijo):
+        with self._lock:
+            for clave in [clave for clave in self._datos if clave.startswith(prefijo)]:
+                self._quitar(clave)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._datos)
+
+
+class CacheSQLite(Cache):
+    """Caché en un archivo SQLite compartido entre procesos de la misma máquina"""
+
+    def __init__(self, ruta, espacio, ttl):
+        super().__init__(ttl)
+        self.ruta = ruta
+        self.espacio = espacio
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        with self._conectar() as conexion:
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS cache (
+                    espacio TEXT NOT NULL,
+                    clave TEXT NOT NULL,
+                    valor TEXT NOT NULL,
+                    expira REAL NOT NULL,
+                    PRIMARY KEY (espacio, clave)
+                )
+            """)
+
+    def _conectar(self):
+        return sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+
+    def obtener(self, clave):
+        with self._conectar() as conexion:
+            fila = conexion.execute(
+                'SELECT valor FROM cache WHERE espacio = ? AND clave = ? AND expira >= ?',
+                (self.espacio, clave, time.time())
+            ).fetchone()
+        return self._contar(json.loads(fila[0]) if fila else None)
+
+    def guardar(self, clave, valor, ttl=None):
+        expira = time.time() + (self.ttl if ttl is None else ttl)
+        with self._conectar() as conexion:
+            conexion.execute(
+                'INSERT OR REPLACE INTO cache (espacio, clave, valor, expira) VALUES (?, ?, ?, ?)',
+                (self.espacio, clave, json.dumps(valor), expira)
+            )
+            conexion.execute('DELETE FROM cache WHERE espacio = ? AND expira < ?', (self.espacio, time.time()))
+
+    def invalidar(self, clave):
+        with self._conectar() as conexion:
+            conexion.execute('DELETE FROM cache WHERE espacio = ? AND clave = ?', (self.espacio, clave))
+
+    def invalidar_prefijo(self, prefijo):
+        with self._conectar() as conexion:
+            conexion.execute(
+                "DELETE FROM cache WHERE espacio = ? AND substr(clave, 1, ?) = ?",
+                (self.espacio, len(prefijo), prefijo)
+            )
+
+    def limpiar(self):
+        with self._conectar() as conexion:
+            conexion.execute('DELETE FROM cache WHERE espacio = ?', (self.espacio,))
+
+
+def crear_cache(app, prefijo, espacio, ttl=300, maximo=1000, maximo_bytes=None):
+    """Crea la caché configurada con las variables <prefijo>_BACKEND, _TTL, _MAXIMO, _MAXIMO_BYTES y _SQLITE"""
+    backend = app.config.get(f'{prefijo}_BACKEND') or 'memoria'
+    ttl = app.config.get(f'{prefijo}_TTL') or ttl
+    if backend == 'memoria':
+        return CacheMemoria(ttl, maximo=app.config.get(f'{prefijo}_MAXIMO') or maximo,
+                            maximo_bytes=app.config.get(f'{prefijo}_MAXIMO_BYTES') or maximo_bytes)
+    if backend == 'sqlite':
+        ruta = app.config.get(f'{prefijo}_SQLITE') or os.path.join(app.instance_path, 'cache.db')
+        return CacheSQLite(ruta, espacio, ttl)
+    if backend == 'ninguno':
+        return CacheNula(ttl)
+    raise ValueError(f'Backend de caché desconocido para {prefijo}: {backend}')
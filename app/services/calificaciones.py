@@ -0,0 +1,83 @@
+"""
+Cálculo de promedios de notas por columnas.
+
+Recibe las notas de muchos alumnos a la vez (una fila por alumno y una
+columna por evaluación) y calcula en una sola pasada vectorizada el
+promedio de las notas válidas (mayores a 0) de cada componente y el
+promedio final ponderado. Los modelos, las vistas y los reportes usan
+estas funciones en lugar de recorrer listas de notas objeto por objeto.
+
+numpy se importa al calcular el primer promedio y no al cargar la
+aplicación (los modelos importan este módulo), para que los procesos que
+no calculan notas arranquen más rápido.
+"""
+
+PESO_ACTIVIDADES = 0.10
+PESO_PRACTICAS = 0.30
+PESO_PARCIALES = 0.60
+
+
+def _columna(valores):
+    """Arreglo float con las notas; None se convierte en NaN"""
+    import numpy as np
+    return np.asarray(valores, dtype=float)
+
+
+def promedio_validas(matriz):
+    """Promedio por fila de las notas mayores a 0 (0.0 si la fila no tiene ninguna).
+
+    `matriz` tiene una fila por alumno y una columna por evaluación; las
+    notas vacías (None) y las menores o iguales a 0 no cuentan.
+    """
+    import numpy as np
+    matriz = _columna(matriz)
+    if matriz.size == 0:
+        return np.zeros(len(matriz))
+
+    validas = matriz > 0
+    # Sumar columna por columna mantiene el mismo orden de suma (y el mismo
+    # resultado exacto) que sum() sobre la lista de notas válidas
+    suma = np.zeros(matriz.shape[0])
+    for j in range(matriz.shape[1]):
+        suma += np.where(validas[:, j], matriz[:, j], 0.0)
+    cantidad = validas.sum(axis=1)
+    return np.divide(suma, cantidad, out=np.zeros_like(suma), where=cantidad > 0)
+
+
+def promedio_ponderado(actividades, practicas, parciales):
+    """Promedio final (10% actividades, 30% prácticas, 60% parciales) por alumno"""
+    import numpy as np
+    actividades = np.nan_to_num(_columna(actividades))
+    practicas = np.nan_to_num(_columna(practicas))
+    parciales = np.nan_to_num(_columna(parciales))
+    return (
+        (actividades * PESO_ACTIVIDADES) +
+        (practicas * PESO_PRACTICAS) +
+        (parciales * PESO_PARCIALES)
+    )
+
+
+def calcular_promedios(actividades, practicas, parciales):
+    """Promedios de componentes y final de un curso o ciclo completo.
+
+    Cada argumento es una matriz (alumnos x evaluaciones). Devuelve un
+    diccionario de arreglos con las claves 'actividades', 'practicas',
+    'parciales' y 'final', alineados con las filas recibidas.
+    """
+    promedios = {
+        'actividades': promedio_validas(actividades),
+        'practicas': promedio_validas(practicas),
+        'parciales': promedio_validas(parciales)
+    }
+    promedios['final'] = promedio_ponderado(promedios['actividades'], promedios['practicas'], promedios['parciales'])
+    return promedios
+
+
+def promedio_notas(valores):
+    """Promedio de las notas válidas de un solo alumno, como float"""
+    return float(promedio_validas([valores])[0])
+
+
+def promedio_final(actividades, practicas, parciales):
+    """Promedio final ponderado de un solo alumno, como float"""
+    return float(promedio_ponderado(actividades or 0.0, practicas or 0.0, parciales or 0.0))
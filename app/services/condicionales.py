@@ -0,0 +1,94 @@
+"""
+Respuestas condicionales (ETag) para vistas de notas y reportes.
+
+Una vista decorada con `@respuesta_condicional(validador)` calcula primero la
+versión de sus datos con `validador(**kwargs_de_la_vista)`, con una consulta
+barata o desde una caché. Si el navegador ya tiene esa versión
+(If-None-Match) se responde 304 Not Modified sin ejecutar la vista: no se
+consultan los datos, no se renderiza la plantilla ni se genera el PDF.
+
+El validador devuelve None cuando la vista tiene que decidir la respuesta
+(el recurso no existe o el usuario no tiene acceso): entonces se ejecuta la
+vista y la respuesta no lleva ETag, así que nunca se responde 304 en lugar
+de un 404 o una redirección.
+
+El ETag combina la versión de los datos, la URL, el usuario (la página
+incluye su menú) y las plantillas desplegadas, y las respuestas se marcan
+`Cache-Control: private, no-cache`: el navegador guarda la página pero la
+revalida en cada visita. No se usa Last-Modified: las fechas HTTP tienen
+precisión de segundos y dos cambios en el mismo segundo no se distinguirían.
+Las páginas que muestran mensajes flash no llevan validadores, porque el
+mensaje no debe repetirse al revalidar.
+
+RESPUESTAS_CONDICIONALES activa el mecanismo (desactivado en desarrollo,
+donde las plantillas cambian sin reiniciar el servidor).
+"""
+
+import hashlib
+import os
+from functools import wraps
+
+from flask import current_app, get_flashed_messages, make_response, request, session
+from flask_login import current_user
+
+
+def version_plantillas(app):
+    """Huella de los archivos de plantillas: cambia con cada despliegue que las modifica.
+
+    Se calcula una vez por proceso.
+    """
+    if 'version_plantillas' not in app.extensions:
+        huella = hashlib.sha1()
+        carpeta = os.path.join(app.root_path, app.template_folder)
+        for raiz, directorios, archivos in os.walk(carpeta):
+            directorios.sort()
+            for nombre in sorted(archivos):
+                info = os.stat(os.path.join(raiz, nombre))
+                huella.update(f'{os.path.relpath(raiz, carpeta)}/{nombre}:{info.st_mtime_ns}:{info.st_size};'.encode('utf-8'))
+        app.extensions['version_plantillas'] = huella.hexdigest()[:12]
+    return app.extensions['version_plantillas']
+
+
+def _etag(version):
+    datos = f"{version}:{request.full_path}:{current_user.get_id()}:{version_plantillas(current_app)}"
+    return hashlib.sha1(datos.encode('utf-8')).hexdigest()[:20]
+
+
+def _agregar_validadores(respuesta, etag):
+    respuesta.set_etag(etag)
+    respuesta.cache_control.private = True
+    respuesta.cache_control.no_cache = True
+    return respuesta
+
+
+def respuesta_condicional(validador):
+    """Decorador para vistas GET cuyo contenido depende solo de la versión que
+    devuelve `validador` (y del usuario autenticado)"""
+    def decorador(vista):
+        @wraps(vista)
+        def decorated_function(*args, **kwargs):
+            if (not current_app.config.get('RESPUESTAS_CONDICIONALES') or request.method != 'GET'
+                    or '_flashes' in session):
+                return vista(*args, **kwargs)
+
+            version = validador(**kwargs)
+            if version is None:
+                return vista(*args, **kwargs)
+            etag = _etag(version)
+            if request.if_none_match.contains(etag):
+                return _agregar_validadores(current_app.response_class(status=304), etag)
+
+            respuesta = make_response(vista(*args, **kwargs))
+            # Sin validadores si la vista redirigió o mostró mensajes flash
+            if respuesta.status_code == 200 and '_flashes' not in session and not get_flashed_messages():
+                _agregar_validadores(respuesta, etag)
+            return respuesta
+        return decorated_function
+    return decorador
+
+
+def init_respuestas_condicionales(app):
+    """Calcula al iniciar la huella de las plantillas que forma parte de los ETag"""
+    app.config.setdefault('RESPUESTAS_CONDICIONALES', False)
+    if app.config['RESPUESTAS_CONDICIONALES']:
+        version_plantillas(app)
@@ -0,0 +1,103 @@
+"""
+Hashes de contraseñas: cálculo, verificación y parámetros por rol.
+
+generate_password_hash y check_password_hash (scrypt por defecto) consumen
+CPU durante decenas de milisegundos por contraseña. Con CONTRASENAS_EJECUTOR
+= 'procesos' ese trabajo se envía a un ProcessPoolExecutor compartido de
+CONTRASENAS_PROCESOS procesos (0 = uno por núcleo): los hilos o greenlets
+del servidor web solo esperan el resultado y, cuando muchos usuarios inician
+sesión a la vez, nunca se calculan más hashes simultáneos que núcleos hay.
+Con 'local' se calculan en el hilo de la petición.
+
+El costo del hash se configura por rol (CONTRASENAS_METODO_ADMIN, _DOCENTE y
+_ALUMNO, en el formato de werkzeug). Al iniciar sesión, los hashes creados
+con otros parámetros se recalculan con los vigentes (`necesita_rehash`).
+"""
+
+import os
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+from app.services.procesos import PoolProcesos
+
+# Valores por defecto de werkzeug
+METODO_POR_DEFECTO = 'scrypt:32768:8:1'
+
+# Por debajo de esta cantidad no compensa repartir una carga masiva entre procesos
+MINIMO_PARA_POOL = 8
+
+
+def _hashear(contrasena, metodo=METODO_POR_DEFECTO):
+    return generate_password_hash(contrasena, method=metodo)
+
+
+def num_procesos():
+    """Procesos del pool según CONTRASENAS_PROCESOS (0 o vacío: uno por núcleo)"""
+    return current_app.config.get('CONTRASENAS_PROCESOS') or os.cpu_count() or 1
+
+
+def _usar_pool():
+    return current_app.config.get('CONTRASENAS_EJECUTOR', 'procesos') == 'procesos'
+
+
+_pool = PoolProcesos(num_procesos)
+
+
+def obtener_pool():
+    """Pool de procesos compartido, creado la primera vez que se usa"""
+    return _pool.obtener()
+
+
+def cerrar_pool():
+    _pool.cerrar()
+
+
+def metodo_hash(rol=None):
+    """Método de werkzeug configurado para el rol (CONTRASENAS_METODO_<ROL>)"""
+    if rol:
+        return current_app.config.get(f'CONTRASENAS_METODO_{rol.upper()}') or METODO_POR_DEFECTO
+    return METODO_POR_DEFECTO
+
+
+def _metodo_completo(metodo):
+    """Método con los parámetros por defecto explícitos: 'scrypt' -> 'scrypt:32768:8:1'"""
+    nombre, *parametros = metodo.split(':')
+    if nombre == 'scrypt':
+        por_defecto = ['32768', '8', '1']
+    elif nombre == 'pbkdf2':
+        por_defecto = ['sha256', str(DEFAULT_PBKDF2_ITERATIONS)]
+    else:
+        return metodo
+    return ':'.join([nombre] + parametros + por_defecto[len(parametros):])
+
+
+def necesita_rehash(password_hash, rol=None):
+    """True si el hash se creó con parámetros distintos de los configurados para el rol"""
+    return _metodo_completo(password_hash.split('$', 1)[0]) != _metodo_completo(metodo_hash(rol))
+
+
+def generar_hash(contrasena, rol=None):
+    """Hash de una contraseña con el método del rol"""
+    metodo = metodo_hash(rol)
+    if _usar_pool():
+        return obtener_pool().submit(_hashear, contrasena, metodo).result()
+    return _hashear(contrasena, metodo)
+
+
+def verificar_contrasena(password_hash, contrasena):
+    """Compara la contraseña con el hash guardado (check_password_hash)"""
+    if _usar_pool():
+        return obtener_pool().submit(check_password_hash, password_hash, contrasena).result()
+    return check_password_hash(password_hash, contrasena)
+
+
+def hashear_contrasenas(contrasenas, rol=None):
+    """Hashes de varias contraseñas, en el mismo orden; en paralelo si son muchas"""
+    contrasenas = list(contrasenas)
+    metodo = metodo_hash(rol)
+    if len(contrasenas) < MINIMO_PARA_POOL or not _usar_pool() or num_procesos() <= 1:
+        return [_hashear(contrasena, metodo) for contrasena in contrasenas]
+    pool = obtener_pool()
+    bloque = max(1, len(contrasenas) // (_pool.procesos * 4))
+    return list(pool.map(_hashear, contrasenas, [metodo] * len(contrasenas), chunksize=bloque))
@@ -0,0 +1,152 @@
+"""
+Consultas de estadísticas por entidad para los listados del administrador.
+
+Cada conteo (cursos asignados, notas registradas, matrículas, etc.) se
+calcula con una subconsulta COUNT ... GROUP BY que se une una sola vez al
+listado, en lugar de lanzar consultas COUNT por cada fila.
+"""
+
+from app import db
+from app.models import Usuario, Curso, CursoDocente, CursoAlumno, CicloAcademico, MatriculaAlumno, Nota
+
+
+def _conteo(columna, *filtros, join=None):
+    """Subconsulta (id, total) con el número de filas agrupadas por `columna`"""
+    query = db.session.query(columna.label('id'), db.func.count().label('total'))
+    if join is not None:
+        query = query.join(join)
+    return query.filter(*filtros).group_by(columna).subquery()
+
+
+def _total(subconsulta):
+    return db.func.coalesce(subconsulta.c.total, 0)
+
+
+def consulta_docentes():
+    """Filas (docente, cursos_asignados, notas_registradas)"""
+    cursos = _conteo(CursoDocente.docente_id)
+    notas = _conteo(Nota.docente_id)
+
+    return db.session.query(
+        Usuario,
+        _total(cursos).label('cursos_asignados'),
+        _total(notas).label('notas_registradas')
+    ).outerjoin(
+        cursos, cursos.c.id == Usuario.id
+    ).outerjoin(
+        notas, notas.c.id == Usuario.id
+    ).filter(
+        Usuario.rol == 'docente'
+    ).order_by(Usuario.id)
+
+
+def consulta_alumnos():
+    """Filas (alumno, cursos_matriculados, matriculas_ciclos, notas_registradas,
+    matricula_activa, ciclo de la matrícula activa)"""
+    cursos = _conteo(CursoAlumno.alumno_id)
+    matriculas = _conteo(MatriculaAlumno.alumno_id)
+    notas = _conteo(Nota.alumno_id)
+    activa = db.session.query(
+        MatriculaAlumno.alumno_id.label('id'),
+        db.func.min(MatriculaAlumno.id).label('matricula_id')
+    ).filter(
+        MatriculaAlumno.estado == 'activa'
+    ).group_by(MatriculaAlumno.alumno_id).subquery()
+
+    # El ciclo se carga en la misma consulta para que matricula.ciclo_academico
+    # se resuelva desde el mapa de identidad sin consultas adicionales
+    return db.session.query(
+        Usuario,
+        _total(cursos).label('cursos_matriculados'),
+        _total(matriculas).label('matriculas_ciclos'),
+        _total(notas).label('notas_registradas'),
+        MatriculaAlumno,
+        CicloAcademico
+    ).outerjoin(
+        cursos, cursos.c.id == Usuario.id
+    ).outerjoin(
+        matriculas, matriculas.c.id == Usuario.id
+    ).outerjoin(
+        notas, notas.c.id == Usuario.id
+    ).outerjoin(
+        activa, activa.c.id == Usuario.id
+    ).outerjoin(
+        MatriculaAlumno, MatriculaAlumno.id == activa.c.matricula_id
+    ).outerjoin(
+        CicloAcademico, CicloAcademico.id == MatriculaAlumno.ciclo_academico_id
+    ).filter(
+        Usuario.rol == 'alumno'
+    ).order_by(Usuario.id)
+
+
+def consulta_cursos():
+    """Filas (curso, ciclo, docentes_asignados, alumnos_matriculados, notas_registradas)"""
+    docentes = _conteo(CursoDocente.curso_id)
+    alumnos = _conteo(CursoAlumno.curso_id)
+    notas = _conteo(Nota.curso_id)
+
+    return db.session.query(
+        Curso,
+        CicloAcademico,
+        _total(docentes).label('docentes_asignados'),
+        _total(alumnos).label('alumnos_matriculados'),
+        _total(notas).label('notas_registradas')
+    ).outerjoin(
+        CicloAcademico, Curso.ciclo_academico_id == CicloAcademico.id
+    ).outerjoin(
+        docentes, docentes.c.id == Curso.id
+    ).outerjoin(
+        alumnos, alumnos.c.id == Curso.id
+    ).outerjoin(
+        notas, notas.c.id == Curso.id
+    ).order_by(Curso.id)
+
+
+def consulta_alumnos_ciclo(ciclo_id):
+    """Filas (matricula, alumno, cursos_matriculados, notas_registradas) de las
+    matrículas activas del ciclo; matricula.alumno queda cargado en la misma consulta"""
+    cursos = _conteo(CursoAlumno.alumno_id)
+    notas = _conteo(Nota.alumno_id)
+
+    return db.session.query(
+        MatriculaAlumno,
+        Usuario,
+        _total(cursos).label('cursos_matriculados'),
+        _total(notas).label('notas_registradas')
+    ).join(
+        Usuario, Usuario.id == MatriculaAlumno.alumno_id
+    ).outerjoin(
+        cursos, cursos.c.id == Usuario.id
+    ).outerjoin(
+        notas, notas.c.id == Usuario.id
+    ).filter(
+        MatriculaAlumno.ciclo_academico_id == ciclo_id,
+        MatriculaAlumno.estado == 'activa'
+    ).order_by(MatriculaAlumno.id)
+
+
+def cursos_por_ciclo():
+    """Diccionario {ciclo_id: número de cursos}"""
+    return dict(db.session.query(Curso.ciclo_academico_id, db.func.count()).filter(
+        Curso.ciclo_academico_id.isnot(None)
+    ).group_by(Curso.ciclo_academico_id).all())
+
+
+def consulta_ciclos():
+    """Filas (ciclo, cursos_asignados, matriculas, notas_ciclo)"""
+    cursos = _conteo(Curso.ciclo_academico_id)
+    matriculas = _conteo(MatriculaAlumno.ciclo_academico_id)
+    notas = _conteo(Curso.ciclo_academico_id, join=Curso.notas)
+
+    return db.session.query(
+        CicloAcademico,
+        _total(cursos).label('cursos_asignados'),
+        _total(matriculas).label('matriculas'),
+        _total(notas).label('notas_ciclo')
+    ).outerjoin(
+        cursos, cursos.c.id == CicloAcademico.id
+    ).outerjoin(
+        matriculas, matriculas.c.id == CicloAcademico.id
+    ).outerjoin(
+        notas, notas.c.id == CicloAcademico.id
+    ).order_by(CicloAcademico.orden)
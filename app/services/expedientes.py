@@ -0,0 +1,143 @@
+"""
+Expediente del alumno: sus cursos con las notas publicadas, en caché.
+
+Las páginas del alumno (inicio, Mis Cursos y notas de un curso) se leen del
+expediente en lugar de consultar matrícula, curso, docentes y las tres
+tablas de detalle en cada visita. El expediente se arma con una sola
+consulta y se guarda por alumno en la caché EXPEDIENTES_CACHE_*; solo
+incluye notas publicadas.
+
+Se invalida por alumno cuando el docente guarda o publica/despublica una
+nota que estaba o queda publicada, y por completo cuando el administrador
+modifica cursos, asignaciones de docentes o matrículas. Junto al expediente
+se guarda su versión (un hash del contenido), que sirve de ETag a las
+páginas del alumno.
+"""
+
+import hashlib
+import json
+from functools import lru_cache
+
+from flask import current_app
+from sqlalchemy.orm import aliased
+
+from app import db
+from app.models import Usuario, Curso, CursoAlumno, CursoDocente, Nota, NotaActividades, NotaPracticas, NotaParcial
+from app.services.cache import crear_cache
+from app.services.calificaciones import promedio_notas
+
+CAMPOS_CURSO = ('id', 'codigo', 'nombre', 'creditos', 'descripcion')
+CAMPOS_NOTA = ('promedio_final', 'estado', 'comentarios')
+CAMPOS_ACTIVIDADES = tuple(f'actividad{i}' for i in range(1, 9))
+CAMPOS_PRACTICAS = tuple(f'practica{i}' for i in range(1, 5))
+CAMPOS_PARCIALES = ('parcial1', 'parcial2')
+COLUMNAS_DETALLE = (
+    (NotaActividades, CAMPOS_ACTIVIDADES, 'actividades'),
+    (NotaPracticas, CAMPOS_PRACTICAS, 'practicas'),
+    (NotaParcial, CAMPOS_PARCIALES, 'parciales'),
+)
+
+
+def _clave(alumno_id):
+    return f'expediente:{alumno_id}'
+
+
+def _detalle(valores, campos):
+    """Notas de una tabla de detalle y su promedio, o (None, 0) si no existe el registro"""
+    if valores[0] is None:
+        return None, 0
+    notas = dict(zip(campos, valores[1:]))
+    return notas, promedio_notas(list(notas.values()))
+
+
+@lru_cache(maxsize=1)
+def _consulta_expediente():
+    """SELECT del expediente con el alumno como parámetro.
+
+    Se construye una sola vez: armar una sentencia de este tamaño cuesta más
+    que ejecutarla.
+    """
+    alumno_id = db.bindparam('alumno_id')
+    docente = aliased(Usuario)
+    columnas = [getattr(Curso, campo) for campo in CAMPOS_CURSO]
+    columnas += [Nota.id] + [getattr(Nota, campo) for campo in CAMPOS_NOTA]
+    for modelo, campos, _ in COLUMNAS_DETALLE:
+        columnas += [modelo.id] + [getattr(modelo, campo) for campo in campos]
+    columnas += [docente.nombre, docente.apellido]
+
+    return db.select(*columnas).select_from(CursoAlumno).join(
+        Curso, Curso.id == CursoAlumno.curso_id
+    ).outerjoin(
+        Nota, db.and_(Nota.curso_id == Curso.id, Nota.alumno_id == alumno_id, Nota.estado == 'publicada')
+    ).outerjoin(
+        NotaActividades, NotaActividades.id == Nota.nota_actividades_id
+    ).outerjoin(
+        NotaPracticas, NotaPracticas.id == Nota.nota_practicas_id
+    ).outerjoin(
+        NotaParcial, NotaParcial.id == Nota.nota_parcial_id
+    ).outerjoin(
+        CursoDocente, CursoDocente.curso_id == Curso.id
+    ).outerjoin(
+        docente, db.and_(docente.id == CursoDocente.docente_id, docente.rol == 'docente')
+    ).where(
+        CursoAlumno.alumno_id == alumno_id
+    ).order_by(CursoAlumno.id, CursoDocente.id)
+
+
+def construir_expediente(alumno_id):
+    """Cursos del alumno con docentes y nota publicada (o None), en una consulta"""
+    filas = db.session.execute(_consulta_expediente(), {'alumno_id': alumno_id}).all()
+
+    cursos = {}
+    for fila in filas:
+        curso = cursos.get(fila[0])
+        if curso is None:
+            curso = dict(zip(CAMPOS_CURSO, fila))
+            curso['docentes'] = []
+            curso['nota'] = None
+            inicio = len(CAMPOS_CURSO)
+            if fila[inicio] is not None:
+                nota = dict(zip(CAMPOS_NOTA, fila[inicio + 1:]))
+                inicio += 1 + len(CAMPOS_NOTA)
+                for _, campos, nombre in COLUMNAS_DETALLE:
+                    nota[nombre], nota[f'promedio_{nombre}'] = _detalle(fila[inicio:inicio + 1 + len(campos)], campos)
+                    inicio += 1 + len(campos)
+                curso['nota'] = nota
+            cursos[fila[0]] = curso
+        if fila[-2] is not None:
+            curso['docentes'].append(f'{fila[-2]} {fila[-1]}')
+    return list(cursos.values())
+
+
+def obtener_expediente_versionado(alumno_id):
+    """(versión, expediente) del alumno desde la caché o, si no está, desde la base de datos"""
+    cache = current_app.extensions['cache_expedientes']
+    guardado = cache.obtener(_clave(alumno_id))
+    if not isinstance(guardado, dict):
+        cursos = construir_expediente(alumno_id)
+        version = hashlib.sha1(json.dumps(cursos, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        guardado = {'version': version, 'cursos': cursos}
+        cache.guardar(_clave(alumno_id), guardado)
+    return guardado['version'], guardado['cursos']
+
+
+def obtener_expediente(alumno_id):
+    """Expediente del alumno desde la caché o, si no está, desde la base de datos"""
+    return obtener_expediente_versionado(alumno_id)[1]
+
+
+def invalidar_expedientes(alumno_ids=None):
+    """Descarta los expedientes de los alumnos indicados o, sin argumentos, todos"""
+    cache = current_app.extensions['cache_expedientes']
+    if alumno_ids is None:
+        cache.limpiar()
+        return
+    for alumno_id in set(alumno_ids):
+        cache.invalidar(_clave(int(alumno_id)))
+
+
+def init_cache_expedientes(app):
+    """Crea la caché de expedientes y la registra en app.extensions['cache_expedientes']"""
+    cache = crear_cache(app, 'EXPEDIENTES_CACHE', 'expedientes', ttl=300, maximo=5000)
+    app.extensions['cache_expedientes'] = cache
+    return cache
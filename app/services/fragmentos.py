@@ -0,0 +1,140 @@
+"""
+Caché de fragmentos HTML renderizados en las plantillas.
+
+Las tablas grandes de algunas plantillas se renderizan fila por fila en cada
+petición aunque los datos no hayan cambiado. La etiqueta `{% cache %}`
+guarda el HTML de un bloque con una clave formada por un ámbito y las
+partes que identifican la versión de los datos:
+
+    {% cache 'reporte_curso', curso.id, version %}
+        {% set datos = cargar_datos() %}
+        ... tabla ...
+    {% endcache %}
+
+Mientras la clave no cambie, el bloque no se ejecuta: ni se renderiza ni se
+evalúa nada de lo que usa (por eso las vistas pueden pasar los datos como
+una función que solo se llama dentro del bloque). Las partes de la clave
+deben cambiar cuando cambian los datos que muestra el bloque, como
+version_notas_curso (que incluye los datos de los alumnos); los cambios que
+no las alteran se cubren invalidando el ámbito (`invalidar_fragmentos`) o
+con el TTL de la caché.
+
+La caché es la de app.services.cache con el prefijo FRAGMENTOS_CACHE: en
+memoria es un LRU limitado en entradas y en bytes (FRAGMENTOS_CACHE_MAXIMO y
+FRAGMENTOS_CACHE_MAXIMO_BYTES); con el backend 'sqlite' se guarda en un
+archivo compartido por los procesos. Las claves incluyen la plantilla, la
+línea del bloque y la huella de las plantillas desplegadas, así que un
+despliegue no reutiliza HTML viejo.
+
+Las métricas por ámbito (aciertos, fallos, tasa de aciertos, bytes servidos
+desde la caché y bytes renderizados) están en /debug/fragmentos.
+"""
+
+import hashlib
+import threading
+
+from flask import current_app
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from app.services.cache import CacheMemoria, crear_cache
+from app.services.condicionales import version_plantillas
+
+PREFIJO = 'fragmento:'
+
+
+class MetricasFragmentos:
+    """Aciertos, fallos y bytes por ámbito, seguras entre hilos"""
+
+    def __init__(self):
+        self._ambitos = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, ambito, acierto, tamano):
+        with self._lock:
+            datos = self._ambitos.setdefault(ambito, {'aciertos': 0, 'fallos': 0, 'bytes_ahorrados': 0, 'bytes_renderizados': 0})
+            if acierto:
+                datos['aciertos'] += 1
+                datos['bytes_ahorrados'] += tamano
+            else:
+                datos['fallos'] += 1
+                datos['bytes_renderizados'] += tamano
+
+    def como_dict(self):
+        with self._lock:
+            ambitos = {ambito: dict(datos) for ambito, datos in self._ambitos.items()}
+        for datos in ambitos.values():
+            consultas = datos['aciertos'] + datos['fallos']
+            datos['tasa_aciertos'] = round(datos['aciertos'] / consultas, 4) if consultas else 0.0
+        return ambitos
+
+    def reiniciar(self):
+        with self._lock:
+            self._ambitos.clear()
+
+
+def _clave(ambito, plantilla, linea, partes):
+    huella = hashlib.sha1(f'{plantilla}:{linea}:{partes!r}:{version_plantillas(current_app)}'.encode('utf-8'))
+    return f'{PREFIJO}{ambito}:{huella.hexdigest()[:20]}'
+
+
+def fragmento(ambito, plantilla, linea, partes, renderizar):
+    """HTML del bloque desde la caché o, si no está, el que devuelve renderizar()"""
+    cache = current_app.extensions['cache_fragmentos']
+    metricas = current_app.extensions['metricas_fragmentos']
+    clave = _clave(ambito, plantilla, linea, partes)
+
+    html = cache.obtener(clave)
+    if html is not None:
+        metricas.registrar(ambito, True, len(html.encode('utf-8')))
+        return Markup(html)
+
+    html = str(renderizar())
+    cache.guardar(clave, html)
+    metricas.registrar(ambito, False, len(html.encode('utf-8')))
+    return Markup(html)
+
+
+class ExtensionFragmentos(Extension):
+    """Etiqueta {% cache 'ambito', parte1, parte2, ... %} ... {% endcache %}"""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        linea = next(parser.stream).lineno
+        ambito = parser.parse_expression()
+        partes = []
+        while parser.stream.skip_if('comma'):
+            partes.append(parser.parse_expression())
+        cuerpo = parser.parse_statements(('name:endcache',), drop_needle=True)
+        argumentos = [ambito, nodes.Const(parser.name), nodes.Const(linea), nodes.List(partes)]
+        return nodes.CallBlock(self.call_method('_renderizar', argumentos), [], [], cuerpo).set_lineno(linea)
+
+    def _renderizar(self, ambito, plantilla, linea, partes, caller):
+        return fragmento(ambito, plantilla, linea, tuple(partes), caller)
+
+
+def invalidar_fragmentos(ambito=None):
+    """Descarta los fragmentos de un ámbito o, sin argumentos, todos"""
+    cache = current_app.extensions['cache_fragmentos']
+    cache.invalidar_prefijo(f'{PREFIJO}{ambito}:' if ambito else PREFIJO)
+
+
+def estadisticas_fragmentos():
+    """Métricas por ámbito y de la caché (aciertos, fallos, tasa y bytes en memoria)"""
+    cache = current_app.extensions['cache_fragmentos']
+    datos = {'cache': cache.estadisticas(), 'ambitos': current_app.extensions['metricas_fragmentos'].como_dict()}
+    if isinstance(cache, CacheMemoria):
+        datos['cache'].update({'entradas': len(cache), 'bytes': cache.bytes, 'maximo_bytes': cache.maximo_bytes})
+    datos['bytes_ahorrados'] = sum(ambito['bytes_ahorrados'] for ambito in datos['ambitos'].values())
+    return datos
+
+
+def init_cache_fragmentos(app):
+    """Crea la caché de fragmentos y registra la etiqueta {% cache %} en Jinja"""
+    cache = crear_cache(app, 'FRAGMENTOS_CACHE', 'fragmentos', ttl=600, maximo=500, maximo_bytes=64 * 1024 * 1024)
+    app.extensions['cache_fragmentos'] = cache
+    app.extensions['metricas_fragmentos'] = MetricasFragmentos()
+    app.jinja_env.add_extension(ExtensionFragmentos)
+    return cache
@@ -0,0 +1,67 @@
+"""
+Identidad del usuario autenticado para Flask-Login, con caché.
+
+En cada petición autenticada Flask-Login necesita el usuario de la sesión.
+En lugar de cargar el modelo Usuario completo desde la base de datos, se
+guarda en caché un objeto compacto con los campos que usan las vistas y
+plantillas (id, dni, nombre, apellido, email, rol, activo).
+
+La caché se invalida desde las rutas del administrador que editan, activan
+o desactivan y eliminan usuarios. Con el backend 'memoria' cada proceso
+tiene su propia caché y los cambios hechos desde otro proceso se ven al
+expirar la entrada (USUARIOS_CACHE_TTL); el backend 'sqlite' la comparte
+entre los procesos de la máquina.
+"""
+
+from flask import current_app
+from flask_login import UserMixin
+
+from app import db
+from app.models import Usuario
+from app.services.cache import crear_cache
+
+CAMPOS_IDENTIDAD = ('id', 'dni', 'nombre', 'apellido', 'email', 'rol', 'activo')
+
+
+class IdentidadUsuario(UserMixin):
+    """Datos mínimos del usuario autenticado (current_user)"""
+
+    __slots__ = CAMPOS_IDENTIDAD
+
+    def __init__(self, **datos):
+        for campo in CAMPOS_IDENTIDAD:
+            setattr(self, campo, datos[campo])
+
+    def __repr__(self):
+        return f'<IdentidadUsuario {self.dni} ({self.rol})>'
+
+
+def _clave(user_id):
+    return f'usuario:{user_id}'
+
+
+def cargar_identidad(user_id):
+    """Identidad del usuario desde la caché o, si no está, desde la base de datos"""
+    cache = current_app.extensions['cache_usuarios']
+    datos = cache.obtener(_clave(user_id))
+    if datos is None:
+        fila = db.session.query(
+            *(getattr(Usuario, campo) for campo in CAMPOS_IDENTIDAD)
+        ).filter(Usuario.id == user_id).first()
+        if fila is None:
+            return None
+        datos = dict(zip(CAMPOS_IDENTIDAD, fila))
+        cache.guardar(_clave(user_id), datos)
+    return IdentidadUsuario(**datos)
+
+
+def invalidar_identidad(user_id):
+    """Descarta la identidad en caché; llamar después de modificar o eliminar el usuario"""
+    current_app.extensions['cache_usuarios'].invalidar(_clave(user_id))
+
+
+def init_cache_usuarios(app):
+    """Crea la caché de identidades y la registra en app.extensions['cache_usuarios']"""
+    cache = crear_cache(app, 'USUARIOS_CACHE', 'usuarios', ttl=300, maximo=5000)
+    app.extensions['cache_usuarios'] = cache
+    return cache
@@ -0,0 +1,202 @@
+"""
+Importación masiva de usuarios (alumnos o docentes) desde CSV o Excel.
+
+El archivo se recorre por lotes: en cada lote se validan las filas, se
+comprueba la unicidad de DNI y email con una consulta por lote (y contra el
+propio archivo), se calculan los hashes de las contraseñas en el pool de
+procesos y se insertan las filas válidas con un solo INSERT. Las filas con
+problemas no se insertan y quedan en el reporte de errores.
+
+Columnas: dni, nombre, apellido, email y, opcionalmente, password (si falta,
+se usa la contraseña inicial indicada en el formulario).
+"""
+
+import csv
+import io
+import re
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import Usuario
+from app.services.contrasenas import hashear_contrasenas
+
+COLUMNAS_REQUERIDAS = ('dni', 'nombre', 'apellido', 'email')
+TAMANO_LOTE = 500
+
+_DNI = re.compile(r'^\d{8}$')
+_EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+class ErrorImportacion(Exception):
+    """El archivo no se puede leer o no tiene las columnas requeridas"""
+
+
+class ResultadoImportacion:
+    """Resumen de una importación y errores por fila"""
+
+    def __init__(self):
+        self.total_filas = 0
+        self.creados = 0
+        self.errores = []  # {'fila', 'dni', 'email', 'mensaje'}
+
+    def agregar_error(self, numero, datos, mensaje):
+        self.errores.append({
+            'fila': numero,
+            'dni': datos.get('dni', ''),
+            'email': datos.get('email', ''),
+            'mensaje': mensaje
+        })
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def _normalizar(encabezado, valores):
+    valores = dict(zip(encabezado, valores))
+    datos = {columna: _texto(valor) for columna, valor in valores.items()}
+    # Excel guarda los DNIs como números y pierde los ceros iniciales
+    if isinstance(valores.get('dni'), (int, float)):
+        datos['dni'] = datos['dni'].zfill(8)
+    return datos
+
+
+def _validar_encabezado(encabezado):
+    faltantes = [columna for columna in COLUMNAS_REQUERIDAS if columna not in encabezado]
+    if faltantes:
+        raise ErrorImportacion(f'Faltan las columnas: {", ".join(faltantes)}.')
+
+
+def _filas_csv(archivo):
+    lector = csv.reader(io.TextIOWrapper(archivo, encoding='utf-8-sig', newline=''))
+    encabezado = [_texto(celda).lower() for celda in next(lector, [])]
+    _validar_encabezado(encabezado)
+    for numero, valores in enumerate(lector, start=2):
+        if any(_texto(valor) for valor in valores):
+            yield numero, _normalizar(encabezado, valores)
+
+
+def _filas_excel(archivo):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ErrorImportacion('Para importar archivos Excel instale openpyxl (pip install openpyxl).')
+
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        encabezado = [_texto(celda).lower() for celda in next(filas, ())]
+        _validar_encabezado(encabezado)
+        for numero, valores in enumerate(filas, start=2):
+            if any(_texto(valor) for valor in valores):
+                yield numero, _normalizar(encabezado, valores)
+    finally:
+        libro.close()
+
+
+def leer_filas(archivo, nombre_archivo):
+    """Itera (número de fila, datos) de un CSV o de la primera hoja de un .xlsx"""
+    if nombre_archivo.lower().endswith('.xlsx'):
+        return _filas_excel(archivo)
+    if nombre_archivo.lower().endswith('.csv'):
+        return _filas_csv(archivo)
+    raise ErrorImportacion('El archivo debe ser .csv o .xlsx.')
+
+
+def _validar_fila(datos, contrasena_inicial):
+    for columna in COLUMNAS_REQUERIDAS:
+        if not datos.get(columna):
+            return f'Falta el campo {columna}.'
+    if not _DNI.match(datos['dni']):
+        return 'El DNI debe tener exactamente 8 números.'
+    if not _EMAIL.match(datos['email']):
+        return 'Email inválido.'
+    if not (datos.get('password') or contrasena_inicial):
+        return 'Falta la contraseña y no se indicó una contraseña inicial.'
+    return None
+
+
+def _insertar(filas):
+    db.session.execute(db.insert(Usuario.__table__), filas)
+    db.session.commit()
+
+
+def _procesar_lote(lote, rol, contrasena_inicial, vistos_dni, vistos_email, resultado):
+    validas = []
+    for numero, datos in lote:
+        mensaje = _validar_fila(datos, contrasena_inicial)
+        if not mensaje and datos['dni'] in vistos_dni:
+            mensaje = 'DNI repetido en el archivo.'
+        if not mensaje and datos['email'].lower() in vistos_email:
+            mensaje = 'Email repetido en el archivo.'
+        if mensaje:
+            resultado.agregar_error(numero, datos, mensaje)
+            continue
+        vistos_dni.add(datos['dni'])
+        vistos_email.add(datos['email'].lower())
+        validas.append((numero, datos))
+
+    if not validas:
+        return
+
+    # Unicidad contra la base de datos: una consulta por columna para todo el lote
+    dnis_existentes = {dni for (dni,) in db.session.query(Usuario.dni).filter(
+        Usuario.dni.in_([datos['dni'] for _, datos in validas]))}
+    emails_existentes = {email.lower() for (email,) in db.session.query(Usuario.email).filter(
+        Usuario.email.in_([datos['email'] for _, datos in validas]))}
+
+    nuevas = []
+    for numero, datos in validas:
+        if datos['dni'] in dnis_existentes:
+            resultado.agregar_error(numero, datos, 'El DNI ya está registrado.')
+        elif datos['email'].lower() in emails_existentes:
+            resultado.agregar_error(numero, datos, 'El email ya está registrado.')
+        else:
+            nuevas.append((numero, datos))
+
+    if not nuevas:
+        return
+
+    hashes = hashear_contrasenas((datos.get('password') or contrasena_inicial for _, datos in nuevas), rol)
+    filas = [
+        {'dni': datos['dni'], 'nombre': datos['nombre'], 'apellido': datos['apellido'], 'email': datos['email'],
+         'password_hash': password_hash, 'rol': rol, 'activo': True}
+        for (_, datos), password_hash in zip(nuevas, hashes)
+    ]
+    try:
+        _insertar(filas)
+        resultado.creados += len(filas)
+    except IntegrityError:
+        # Otro proceso registró alguno de estos usuarios: insertar fila por fila
+        db.session.rollback()
+        for (numero, datos), fila in zip(nuevas, filas):
+            try:
+                _insertar([fila])
+                resultado.creados += 1
+            except IntegrityError:
+                db.session.rollback()
+                resultado.agregar_error(numero, datos, 'El DNI o el email ya está registrado.')
+
+
+def registrar_usuarios(filas, rol, contrasena_inicial=None, tamano_lote=TAMANO_LOTE):
+    """Crea los usuarios de `filas` (ver leer_filas) con el rol indicado.
+
+    Cada lote se confirma por separado; devuelve un ResultadoImportacion.
+    """
+    resultado = ResultadoImportacion()
+    vistos_dni, vistos_email = set(), set()
+    lote = []
+    for numero, datos in filas:
+        resultado.total_filas += 1
+        lote.append((numero, datos))
+        if len(lote) >= tamano_lote:
+            _procesar_lote(lote, rol, contrasena_inicial, vistos_dni, vistos_email, resultado)
+            lote = []
+    if lote:
+        _procesar_lote(lote, rol, contrasena_inicial, vistos_dni, vistos_email, resultado)
+    return resultado
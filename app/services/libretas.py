@@ -0,0 +1,88 @@
+"""
+Libretas de notas: los cursos de un ciclo de cada alumno con sus promedios.
+
+Los datos de todo el ciclo se cargan en una sola consulta (matrícula en los
+cursos del ciclo con LEFT JOIN a la nota final y a las tres tablas de
+detalle por curso y alumno) y los promedios finales se calculan en una sola
+pasada, en lugar de consultar cada curso y cada tabla por alumno como
+docente.reporte_alumno. Las libretas son diccionarios de textos y números
+para que app.services.pdf pueda dibujarlas en otros procesos.
+"""
+
+from app import db
+from app.models import Usuario, Curso, CursoAlumno, Nota, NotaActividades, NotaPracticas, NotaParcial
+from app.services.calificaciones import promedio_ponderado
+
+
+def _consulta_libretas(ciclo_id):
+    def detalle(modelo):
+        return db.and_(modelo.curso_id == Curso.id, modelo.alumno_id == Usuario.id)
+
+    return db.session.query(
+        Usuario.id, Usuario.dni, Usuario.nombre, Usuario.apellido,
+        Curso.codigo, Curso.nombre, Curso.creditos,
+        Nota.promedio_actividades, Nota.promedio_practicas, Nota.promedio_parciales, Nota.estado,
+        NotaActividades.promedio_actividades, NotaPracticas.promedio_practicas, NotaParcial.promedio_parciales
+    ).select_from(CursoAlumno).join(
+        Curso, Curso.id == CursoAlumno.curso_id
+    ).join(
+        Usuario, Usuario.id == CursoAlumno.alumno_id
+    ).outerjoin(
+        Nota, detalle(Nota)
+    ).outerjoin(
+        NotaActividades, detalle(NotaActividades)
+    ).outerjoin(
+        NotaPracticas, detalle(NotaPracticas)
+    ).outerjoin(
+        NotaParcial, detalle(NotaParcial)
+    ).filter(
+        Curso.ciclo_academico_id == ciclo_id,
+        Usuario.rol == 'alumno'
+    ).order_by(
+        Usuario.apellido.asc(), Usuario.nombre.asc(), Usuario.id.asc(), Curso.nombre.asc(), Curso.id.asc()
+    )
+
+
+def datos_libretas_ciclo(ciclo_id):
+    """Libretas de los alumnos matriculados en cursos del ciclo, por apellido y nombre.
+
+    Cada libreta: {'id', 'dni', 'alumno', 'cursos': [{'codigo', 'nombre', 'creditos',
+    'promedio_actividades', 'promedio_practicas', 'promedio_parciales',
+    'promedio_final', 'estado'}]}. Como en los reportes por curso, se usan los
+    promedios guardados en la nota final y, si están en cero, los de las
+    tablas de detalle.
+    """
+    libretas = []
+    cursos = []
+    vistos = set()
+    for (alumno_id, dni, nombre, apellido, codigo, curso, creditos,
+         nota_acts, nota_pracs, nota_parcs, estado, acts, pracs, parcs) in _consulta_libretas(ciclo_id):
+        # Un alumno con registros duplicados genera varias filas: conservar la primera
+        if (alumno_id, codigo) in vistos:
+            continue
+        vistos.add((alumno_id, codigo))
+        if not libretas or libretas[-1]['id'] != alumno_id:
+            libretas.append({'id': alumno_id, 'dni': dni, 'alumno': f'{nombre} {apellido}', 'cursos': []})
+        fila = {
+            'codigo': codigo,
+            'nombre': curso,
+            'creditos': creditos,
+            'promedio_actividades': nota_acts or acts or 0.0,
+            'promedio_practicas': nota_pracs or pracs or 0.0,
+            'promedio_parciales': nota_parcs or parcs or 0.0,
+            'estado': estado,
+        }
+        libretas[-1]['cursos'].append(fila)
+        cursos.append(fila)
+
+    if cursos:
+        finales = promedio_ponderado(
+            [fila['promedio_actividades'] for fila in cursos],
+            [fila['promedio_practicas'] for fila in cursos],
+            [fila['promedio_parciales'] for fila in cursos]
+        ).tolist()
+        for fila, final in zip(cursos, finales):
+            fila['promedio_final'] = round(final, 2)
+            for campo in ('promedio_actividades', 'promedio_practicas', 'promedio_parciales'):
+                fila[campo] = round(fila[campo], 2)
+    return libretas
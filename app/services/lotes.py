@@ -0,0 +1,216 @@
+"""
+Reportes PDF por lotes: los reportes de todos los cursos de un ciclo en un
+ZIP y las libretas de notas de todos sus alumnos (un PDF o un ZIP).
+
+Dibujar un PDF es trabajo de CPU, así que los cursos se reparten en un
+ProcessPoolExecutor compartido de REPORTES_LOTE_PROCESOS procesos (0 o
+vacío: la mitad de los núcleos). El pool es el límite: aunque varios
+administradores descarguen lotes a la vez, nunca se dibujan más PDFs
+simultáneos que procesos tiene, y el resto de núcleos queda para los
+workers web.
+
+Las consultas se hacen en el proceso de la petición: las versiones de todos
+los cursos en una consulta y las notas por bloques de CURSOS_POR_CONSULTA
+cursos; a los procesos solo viajan las filas de texto o el HTML. Los PDFs
+ya guardados para la versión actual de las notas se reutilizan y los nuevos
+se guardan en disco. El ZIP se escribe a medida que cada curso termina y
+se envía por partes; como mucho hay dos tareas por proceso en vuelo, así
+que la memoria no depende del tamaño del ciclo.
+
+Las libretas se reparten en bloques de LIBRETAS_POR_TAREA alumnos, para no
+pagar el envío entre procesos por cada página. Para el PDF único, los
+bloques se unen en orden con pypdf.
+"""
+
+import io
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from flask import current_app
+
+from app.services.pdf import pdf_libretas, pdfs_libretas, renderizar_pdf_curso
+from app.services.procesos import PoolProcesos
+from app.services.reportes import (contenido_pdf_curso, guardar_pdf_curso, motor_pdf, obtener_datos_reportes_cursos,
+                                   ruta_pdf_curso)
+from app.services.versiones import version_notas_cursos
+
+# Tareas enviadas al pool por cada proceso antes de esperar a que alguna termine
+TAREAS_POR_PROCESO = 2
+
+# Libretas que dibuja cada tarea del pool
+LIBRETAS_POR_TAREA = 25
+
+# Cursos cuyas notas se cargan en cada consulta del ZIP de reportes
+CURSOS_POR_CONSULTA = 20
+
+
+def num_procesos():
+    """Procesos del pool según REPORTES_LOTE_PROCESOS (0 o vacío: la mitad de los núcleos)"""
+    return current_app.config.get('REPORTES_LOTE_PROCESOS') or max(1, (os.cpu_count() or 1) // 2)
+
+
+_pool = PoolProcesos(num_procesos)
+
+
+def obtener_pool():
+    """Pool de procesos compartido, creado la primera vez que se usa"""
+    return _pool.obtener()
+
+
+def cerrar_pool():
+    _pool.cerrar()
+
+
+class _SalidaZip(io.RawIOBase):
+    """Destino del ZipFile que acumula lo escrito hasta que se envía.
+
+    No permite seek: zipfile escribe entonces el tamaño de cada archivo
+    después de su contenido y no necesita volver atrás.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def nombre_pdf_curso(curso):
+    return f'reporte_curso_{curso.codigo}.pdf'
+
+
+def zip_reportes_cursos(cursos):
+    """Genera el ZIP con el reporte PDF de cada curso, por partes (bytes).
+
+    Los cursos entran al ZIP en el orden en que terminan. Si alguno no se
+    puede generar, el ZIP incluye errores.txt con los cursos omitidos.
+    """
+    motor = motor_pdf()
+    pool = obtener_pool()
+    limite = _pool.procesos * TAREAS_POR_PROCESO
+    salida = _SalidaZip()
+    pendientes = {}
+    errores = []
+
+    def agregar(archivo, curso, contenido):
+        archivo.writestr(nombre_pdf_curso(curso), contenido)
+        return salida.vaciar()
+
+    def terminar(archivo, futuro):
+        curso, ruta = pendientes.pop(futuro)
+        try:
+            contenido = futuro.result()
+        except Exception as e:
+            current_app.logger.exception('Error generando el PDF del curso %s', curso.codigo)
+            contenido = None
+            errores.append(f'{curso.codigo}: {e}')
+        else:
+            if contenido is None:
+                errores.append(f'{curso.codigo}: error generando PDF')
+        if contenido is None:
+            return b''
+        guardar_pdf_curso(curso.id, ruta, contenido)
+        return agregar(archivo, curso, contenido)
+
+    cursos = list(cursos)
+    versiones = version_notas_cursos([curso.id for curso in cursos])
+    try:
+        with zipfile.ZipFile(salida, 'w', zipfile.ZIP_DEFLATED) as archivo:
+            for inicio in range(0, len(cursos), CURSOS_POR_CONSULTA):
+                por_generar = []
+                for curso in cursos[inicio:inicio + CURSOS_POR_CONSULTA]:
+                    ruta = ruta_pdf_curso(curso.id, versiones.get(curso.id))
+                    if os.path.exists(ruta):
+                        with open(ruta, 'rb') as guardado:
+                            yield agregar(archivo, curso, guardado.read())
+                    else:
+                        por_generar.append((curso, ruta))
+                if not por_generar:
+                    continue
+
+                datos = obtener_datos_reportes_cursos([curso.id for curso, _ in por_generar])
+                for curso, ruta in por_generar:
+                    futuro = pool.submit(renderizar_pdf_curso, motor, curso.nombre, curso.codigo,
+                                         contenido_pdf_curso(curso, motor, datos.pop(curso.id)))
+                    pendientes[futuro] = (curso, ruta)
+                    while len(pendientes) >= limite:
+                        listos, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+                        for futuro in listos:
+                            yield terminar(archivo, futuro)
+
+            while pendientes:
+                listos, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+                for futuro in listos:
+                    yield terminar(archivo, futuro)
+
+            if errores:
+                archivo.writestr('errores.txt', '\n'.join(errores) + '\n')
+        yield salida.vaciar()
+    finally:
+        # Descarga interrumpida: no dibujar lo que ya nadie va a recibir
+        for futuro in pendientes:
+            futuro.cancel()
+
+
+def _mapa_en_pool(funcion, tareas):
+    """Resultados de funcion(*argumentos) para cada tarea, en orden, calculados en el pool
+    con como mucho TAREAS_POR_PROCESO tareas por proceso en vuelo"""
+    pool = obtener_pool()
+    limite = _pool.procesos * TAREAS_POR_PROCESO
+    pendientes = deque()
+    try:
+        for argumentos in tareas:
+            pendientes.append(pool.submit(funcion, *argumentos))
+            if len(pendientes) >= limite:
+                yield pendientes.popleft().result()
+        while pendientes:
+            yield pendientes.popleft().result()
+    finally:
+        for futuro in pendientes:
+            futuro.cancel()
+
+
+def _bloques_libretas(libretas):
+    return [libretas[inicio:inicio + LIBRETAS_POR_TAREA] for inicio in range(0, len(libretas), LIBRETAS_POR_TAREA)]
+
+
+def pdf_libretas_ciclo(ciclo, libretas):
+    """Un solo PDF con las libretas (app.services.libretas), en el orden recibido"""
+    from pypdf import PdfWriter
+
+    escritor = PdfWriter()
+    for contenido in _mapa_en_pool(pdf_libretas, ((ciclo, bloque) for bloque in _bloques_libretas(libretas))):
+        escritor.append(io.BytesIO(contenido))
+    escritor.add_metadata({'/Title': f'Libretas de Notas - {ciclo}'})
+    salida = io.BytesIO()
+    escritor.write(salida)
+    return salida.getvalue()
+
+
+def nombre_pdf_libreta(libreta):
+    return f"libreta_{libreta['dni']}.pdf"
+
+
+def zip_libretas_ciclo(ciclo, libretas):
+    """Genera un ZIP con un PDF por libreta, por partes (bytes), a medida que se dibujan los bloques"""
+    bloques = _bloques_libretas(libretas)
+    salida = _SalidaZip()
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_DEFLATED) as archivo:
+        resultados = _mapa_en_pool(pdfs_libretas, ((ciclo, bloque) for bloque in bloques))
+        for bloque, contenidos in zip(bloques, resultados):
+            for libreta, contenido in zip(bloque, contenidos):
+                archivo.writestr(nombre_pdf_libreta(libreta), contenido)
+            yield salida.vaciar()
+    yield salida.vaciar()
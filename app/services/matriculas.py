@@ -0,0 +1,160 @@
+"""
+Matrícula masiva de alumnos en ciclos académicos y en los cursos de cada ciclo.
+
+Los pares (curso_id, alumno_id) que faltan en curso_alumno se calculan con
+una sola consulta (anti-join entre las matrículas activas, los cursos del
+ciclo y curso_alumno) y se insertan en bloque con una sentencia que ignora
+los pares ya existentes (INSERT OR IGNORE en SQLite, ON DUPLICATE KEY en
+MySQL), apoyándose en el índice único uq_curso_alumno.
+
+Las funciones no confirman la transacción; el llamador hace el commit.
+"""
+
+import csv
+import io
+
+from app import db
+from app.models import Usuario, Curso, CursoAlumno, MatriculaAlumno
+from app.services.versiones import incrementar_version_notas
+
+TAMANO_LOTE = 1000
+
+
+def _lotes(valores, tamano=TAMANO_LOTE):
+    valores = list(valores)
+    for inicio in range(0, len(valores), tamano):
+        yield valores[inicio:inicio + tamano]
+
+
+def _insertar_ignorando_duplicados(modelo, filas):
+    """INSERT de varias filas que omite las que violan un índice único; devuelve las insertadas.
+
+    Se ejecuta como executemany de una sola sentencia compilada: sqlite3 la
+    repite sin volver a Python y los drivers de MySQL la reescriben como un
+    INSERT de varias filas.
+    """
+    from sqlalchemy.dialects import mysql, sqlite
+
+    if not filas:
+        return 0
+    tabla = modelo.__table__
+    dialecto = db.session.get_bind().dialect.name
+    if dialecto == 'sqlite':
+        sentencia = sqlite.insert(tabla).on_conflict_do_nothing()
+    elif dialecto == 'mysql':
+        sentencia = mysql.insert(tabla)
+        # Actualización sin efecto: los pares que ya existen quedan igual
+        sentencia = sentencia.on_duplicate_key_update(id=sentencia.inserted.id)
+    else:
+        sentencia = db.insert(tabla)
+    return db.session.execute(sentencia, filas).rowcount
+
+
+def cursos_faltantes(ciclo_id=None, alumno_ids=None):
+    """Pares (curso_id, alumno_id) de matrículas activas sin su fila en curso_alumno"""
+    query = db.session.query(Curso.id, MatriculaAlumno.alumno_id).join(
+        Curso, Curso.ciclo_academico_id == MatriculaAlumno.ciclo_academico_id
+    ).outerjoin(
+        CursoAlumno, db.and_(CursoAlumno.curso_id == Curso.id, CursoAlumno.alumno_id == MatriculaAlumno.alumno_id)
+    ).filter(
+        MatriculaAlumno.estado == 'activa',
+        CursoAlumno.id.is_(None)
+    ).distinct()
+    if ciclo_id:
+        query = query.filter(MatriculaAlumno.ciclo_academico_id == ciclo_id)
+
+    if alumno_ids is None:
+        return query.all()
+    pares = []
+    for lote in _lotes(alumno_ids):
+        pares.extend(query.filter(MatriculaAlumno.alumno_id.in_(lote)).all())
+    return pares
+
+
+def matricular_en_cursos(ciclo_id=None, alumno_ids=None):
+    """Inscribe a los alumnos con matrícula activa en los cursos de su ciclo que les falten.
+
+    Sin argumentos sincroniza todas las matrículas activas de la institución.
+    Devuelve el número de filas de curso_alumno creadas.
+    """
+    pares = cursos_faltantes(ciclo_id=ciclo_id, alumno_ids=alumno_ids)
+    if pares:
+        incrementar_version_notas({curso_id for curso_id, _ in pares})
+    return _insertar_ignorando_duplicados(
+        CursoAlumno, [{'curso_id': curso_id, 'alumno_id': alumno_id} for curso_id, alumno_id in pares]
+    )
+
+
+class ResultadoMatricula:
+    """Resumen de una matrícula masiva"""
+
+    def __init__(self):
+        self.matriculados = 0
+        self.cursos_creados = 0
+        self.ya_matriculados = []        # alumno_ids con matrícula previa en el ciclo
+        self.con_otro_ciclo = []         # alumno_ids con matrícula activa en otro ciclo (no matriculados)
+        self.suspendidas = 0             # matrículas anteriores suspendidas al forzar
+
+
+def matricular_alumnos_en_ciclo(alumno_ids, ciclo_id, forzar=False):
+    """Matricula varios alumnos en un ciclo y en todos los cursos del ciclo.
+
+    Se omiten los alumnos que ya tienen una matrícula en el ciclo. Los que
+    tienen una matrícula activa en otro ciclo se omiten, salvo con `forzar`,
+    en cuyo caso esa matrícula se suspende (como en matricular_ciclo).
+    """
+    resultado = ResultadoMatricula()
+    alumno_ids = list(dict.fromkeys(alumno_ids))
+
+    ya_matriculados = set()
+    activos_otro_ciclo = set()
+    for lote in _lotes(alumno_ids):
+        ya_matriculados.update(alumno_id for (alumno_id,) in db.session.query(MatriculaAlumno.alumno_id).filter(
+            MatriculaAlumno.alumno_id.in_(lote), MatriculaAlumno.ciclo_academico_id == ciclo_id
+        ))
+        activos_otro_ciclo.update(alumno_id for (alumno_id,) in db.session.query(MatriculaAlumno.alumno_id).filter(
+            MatriculaAlumno.alumno_id.in_(lote), MatriculaAlumno.ciclo_academico_id != ciclo_id,
+            MatriculaAlumno.estado == 'activa'
+        ))
+
+    resultado.ya_matriculados = [alumno_id for alumno_id in alumno_ids if alumno_id in ya_matriculados]
+    nuevos = [alumno_id for alumno_id in alumno_ids if alumno_id not in ya_matriculados]
+    if forzar:
+        suspender = [alumno_id for alumno_id in nuevos if alumno_id in activos_otro_ciclo]
+        for lote in _lotes(suspender):
+            resultado.suspendidas += MatriculaAlumno.query.filter(
+                MatriculaAlumno.alumno_id.in_(lote), MatriculaAlumno.estado == 'activa'
+            ).update({MatriculaAlumno.estado: 'suspendida'}, synchronize_session=False)
+    else:
+        resultado.con_otro_ciclo = [alumno_id for alumno_id in nuevos if alumno_id in activos_otro_ciclo]
+        nuevos = [alumno_id for alumno_id in nuevos if alumno_id not in activos_otro_ciclo]
+
+    if nuevos:
+        db.session.execute(db.insert(MatriculaAlumno.__table__), [
+            {'alumno_id': alumno_id, 'ciclo_academico_id': ciclo_id, 'estado': 'activa'} for alumno_id in nuevos
+        ])
+        resultado.matriculados = len(nuevos)
+        resultado.cursos_creados = matricular_en_cursos(ciclo_id=ciclo_id, alumno_ids=nuevos)
+    return resultado
+
+
+def leer_dnis_csv(archivo):
+    """DNIs de un CSV: columna 'dni' si hay encabezado, si no la primera columna"""
+    filas = [fila for fila in csv.reader(io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')) if fila]
+    columna = 0
+    if filas:
+        encabezado = [celda.strip().lower() for celda in filas[0]]
+        if 'dni' in encabezado:
+            columna = encabezado.index('dni')
+            filas = filas[1:]
+    return [fila[columna].strip() for fila in filas if len(fila) > columna and fila[columna].strip()]
+
+
+def alumnos_por_dni(dnis):
+    """({dni: alumno_id} de los alumnos activos encontrados, [DNIs sin alumno activo])"""
+    encontrados = {}
+    for lote in _lotes(set(dnis)):
+        encontrados.update(db.session.query(Usuario.dni, Usuario.id).filter(
+            Usuario.dni.in_(lote), Usuario.rol == 'alumno', Usuario.activo == True
+        ))
+    return encontrados, [dni for dni in dict.fromkeys(dnis) if dni not in encontrados]
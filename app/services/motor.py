@@ -0,0 +1,33 @@
+"""
+Ajustes del engine de SQLAlchemy que no se pasan como opciones de create_engine.
+
+Las opciones del pool (tamaño, desborde, reciclado, pre-ping, caché de
+sentencias compiladas) y el driver de MySQL se definen en config.py a partir
+de las variables DB_*. Aquí se aplica DB_STATEMENT_TIMEOUT_MS: cada conexión
+nueva a MySQL fija max_execution_time, que cancela los SELECT que superan ese
+tiempo (p. ej. un reporte que bloquea un worker), sea cual sea el driver.
+"""
+
+from sqlalchemy import event
+
+from app import db
+
+
+def _limitar_tiempo_consultas(milisegundos):
+    def al_conectar(conexion_dbapi, registro):
+        cursor = conexion_dbapi.cursor()
+        cursor.execute(f'SET SESSION max_execution_time = {int(milisegundos)}')
+        cursor.close()
+    return al_conectar
+
+
+def init_motor(app):
+    """Registra los eventos de conexión según la configuración del engine"""
+    milisegundos = app.config.get('DB_STATEMENT_TIMEOUT_MS')
+    if not milisegundos:
+        return
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'mysql':
+                event.listen(engine, 'connect', _limitar_tiempo_consultas(milisegundos))
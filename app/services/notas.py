@@ -0,0 +1,264 @@
+"""
+Registro de notas en lote para un curso completo.
+
+Valida toda la grilla recibida en una sola pasada y guarda los registros
+de actividades, prácticas, parciales y la nota final de todos los alumnos
+en una única transacción, con consultas IN en lugar de búsquedas por alumno.
+"""
+
+import weakref
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import inspect
+
+from app import db
+from app.models import CursoAlumno, Nota, NotaActividades, NotaPracticas, NotaParcial
+from app.services.calificaciones import promedio_validas, promedio_ponderado
+from app.services.expedientes import invalidar_expedientes
+from app.services.resumenes import actualizar_resumen_curso
+from app.services.versiones import incrementar_version_notas
+
+CAMPOS_ACTIVIDADES = [f'actividad{i}' for i in range(1, 9)]
+CAMPOS_PRACTICAS = [f'practica{i}' for i in range(1, 5)]
+CAMPOS_PARCIALES = [f'parcial{i}' for i in range(1, 3)]
+ESTADOS_NOTA = ('borrador', 'publicada')
+
+# {engine: tablas de notas con su índice único (curso_id, alumno_id) en la base}
+_tablas_con_indice_unico = weakref.WeakKeyDictionary()
+
+
+def _leer_valor(datos, campo, descripcion, fila):
+    valor = datos.get(campo)
+    if valor is None or (isinstance(valor, str) and valor.strip() == ''):
+        return 0.0
+    try:
+        valor = float(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f'Fila {fila}: error en el formato de {descripcion}. Debe ser un número válido.')
+    # La comparación también descarta NaN e infinito
+    if not 0 <= valor <= 20:
+        raise ValueError(f'Fila {fila}: las notas deben estar entre 0 y 20.')
+    return valor
+
+
+def leer_fila_notas(datos, fila):
+    """Valida y normaliza las notas de un alumno (diccionario con los campos del formulario)"""
+    try:
+        alumno_id = int(datos.get('alumno_id'))
+    except (TypeError, ValueError):
+        raise ValueError(f'Fila {fila}: ID de alumno requerido.')
+
+    estado = datos.get('estado') or 'borrador'
+    if estado not in ESTADOS_NOTA:
+        raise ValueError(f'Fila {fila}: estado de nota no válido.')
+
+    return {
+        'alumno_id': alumno_id,
+        'actividades': {campo: _leer_valor(datos, campo, f'la actividad {i}', fila) for i, campo in enumerate(CAMPOS_ACTIVIDADES, 1)},
+        'practicas': {campo: _leer_valor(datos, campo, f'la práctica {i}', fila) for i, campo in enumerate(CAMPOS_PRACTICAS, 1)},
+        'parciales': {campo: _leer_valor(datos, campo, f'el parcial {i}', fila) for i, campo in enumerate(CAMPOS_PARCIALES, 1)},
+        'comentarios': datos.get('comentarios') or '',
+        'estado': estado
+    }
+
+
+def filas_desde_formulario(form):
+    """Convierte arreglos de formulario (alumno_id, actividad1, ... repetidos) en una lista de filas"""
+    campos = ['alumno_id', 'comentarios', 'estado'] + CAMPOS_ACTIVIDADES + CAMPOS_PRACTICAS + CAMPOS_PARCIALES
+    columnas = {campo: form.getlist(campo) or form.getlist(f'{campo}[]') for campo in campos}
+    total = len(columnas['alumno_id'])
+    for campo, valores in columnas.items():
+        if valores and len(valores) != total:
+            raise ValueError(f'El campo {campo} no tiene un valor por alumno.')
+    return [
+        {campo: valores[i] for campo, valores in columnas.items() if valores}
+        for i in range(total)
+    ]
+
+
+def _ids_por_alumno(modelo, curso_id, alumno_ids):
+    """{alumno_id: id} de los registros de `modelo` del curso, en una sola consulta"""
+    return dict(db.session.query(modelo.alumno_id, modelo.id).filter(
+        modelo.curso_id == curso_id,
+        modelo.alumno_id.in_(alumno_ids)
+    ))
+
+
+def _tiene_indice_unico(conexion, tabla):
+    """True si `tabla` tiene en la base el índice único (curso_id, alumno_id) del modelo.
+
+    create_all no agrega índices a tablas existentes: en una base sin migrar
+    el upsert no tendría con qué chocar (MySQL insertaría filas repetidas y
+    SQLite fallaría). Se revisa una vez por engine; después de ejecutar
+    migrar_indices.py hay que reiniciar la aplicación para usar el upsert.
+    """
+    engine = conexion.engine
+    if engine not in _tablas_con_indice_unico:
+        inspector = inspect(conexion)
+        tablas = set()
+        for modelo in (NotaActividades, NotaPracticas, NotaParcial, Nota):
+            nombre = modelo.__tablename__
+            if not inspector.has_table(nombre):
+                continue
+            unicos = [indice['column_names'] for indice in inspector.get_indexes(nombre) if indice['unique']]
+            unicos += [restriccion['column_names'] for restriccion in inspector.get_unique_constraints(nombre)]
+            if any(set(columnas) == {'curso_id', 'alumno_id'} for columnas in unicos):
+                tablas.add(nombre)
+            else:
+                current_app.logger.warning(
+                    f'{nombre} no tiene su índice único (curso_id, alumno_id); las notas se guardan '
+                    f'sin upsert. Ejecute python migrar_indices.py.'
+                )
+        _tablas_con_indice_unico[engine] = tablas
+    return tabla in _tablas_con_indice_unico[engine]
+
+
+def _guardar_filas(modelo, filas, actualizar):
+    """INSERT de varias filas que actualiza las columnas `actualizar` de las que ya
+    existen por (curso_id, alumno_id), en una sola sentencia.
+
+    Se apoya en el índice único uq_*_curso_alumno de cada tabla: dos
+    guardados simultáneos del mismo alumno no fallan con IntegrityError, el
+    segundo actualiza la fila que insertó el primero. Como en
+    matriculas._insertar_ignorando_duplicados, se ejecuta como executemany
+    de una sentencia compilada. Si la tabla no tiene el índice (base sin
+    migrar) se usan UPDATE e INSERT por separado.
+    """
+    from sqlalchemy.dialects import mysql, sqlite
+
+    tabla = modelo.__table__
+    conexion = db.session.connection()
+    dialecto = conexion.dialect.name
+    upsert = dialecto in ('sqlite', 'mysql') and _tiene_indice_unico(conexion, tabla.name)
+    if upsert and dialecto == 'sqlite':
+        sentencia = sqlite.insert(tabla)
+        sentencia = sentencia.on_conflict_do_update(
+            index_elements=['curso_id', 'alumno_id'],
+            set_={columna: sentencia.excluded[columna] for columna in actualizar}
+        )
+    elif upsert:
+        sentencia = mysql.insert(tabla)
+        sentencia = sentencia.on_duplicate_key_update({columna: sentencia.inserted[columna] for columna in actualizar})
+    else:
+        # Sin upsert: UPDATE por id de las existentes (executemany) e INSERT de las nuevas
+        existentes = _ids_por_alumno(modelo, filas[0]['curso_id'], [fila['alumno_id'] for fila in filas])
+        actualizadas = [
+            dict({columna: fila[columna] for columna in actualizar}, id=existentes[fila['alumno_id']])
+            for fila in filas if fila['alumno_id'] in existentes
+        ]
+        if actualizadas:
+            db.session.execute(db.update(modelo), actualizadas)
+        filas = [fila for fila in filas if fila['alumno_id'] not in existentes]
+        if not filas:
+            return
+        sentencia = db.insert(tabla)
+    db.session.execute(sentencia, filas)
+
+
+def guardar_notas_curso(curso_id, docente_id, filas):
+    """Valida y guarda las notas de varios alumnos del curso en una transacción.
+
+    `filas` es una lista de diccionarios con los campos del formulario de notas.
+    Lanza ValueError (sin escribir nada) si alguna fila no es válida y
+    devuelve la lista de promedios calculados por alumno.
+
+    Cada tabla (actividades, prácticas, parciales y nota final) se escribe
+    con un solo INSERT ... ON DUPLICATE KEY UPDATE (ON CONFLICT en SQLite)
+    para todos los alumnos, existan o no sus registros; el número de
+    sentencias no depende del tamaño del curso. En una base sin los índices
+    únicos de migrar_indices.py se usan UPDATE e INSERT por separado.
+    """
+    if not filas:
+        raise ValueError('No se recibieron notas para guardar.')
+
+    notas = [leer_fila_notas(datos, i) for i, datos in enumerate(filas, 1)]
+
+    alumno_ids = [nota['alumno_id'] for nota in notas]
+    if len(set(alumno_ids)) != len(alumno_ids):
+        raise ValueError('Un alumno aparece más de una vez en el lote.')
+
+    matriculados = {
+        alumno_id for (alumno_id,) in db.session.query(CursoAlumno.alumno_id).filter(
+            CursoAlumno.curso_id == curso_id,
+            CursoAlumno.alumno_id.in_(alumno_ids)
+        )
+    }
+    no_matriculados = [alumno_id for alumno_id in alumno_ids if alumno_id not in matriculados]
+    if no_matriculados:
+        raise ValueError(f'Alumnos no matriculados en este curso: {", ".join(map(str, no_matriculados))}.')
+
+    publicadas_antes = {
+        alumno_id for (alumno_id,) in db.session.query(Nota.alumno_id).filter(
+            Nota.curso_id == curso_id,
+            Nota.alumno_id.in_(alumno_ids),
+            Nota.estado == 'publicada'
+        )
+    }
+    ahora = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    try:
+        # Registros de detalle; los promedios de todo el lote se calculan en una sola pasada
+        promedios = {}
+        ids = {}
+        for modelo, clave, campos, columna_promedio in (
+            (NotaActividades, 'actividades', CAMPOS_ACTIVIDADES, 'promedio_actividades'),
+            (NotaPracticas, 'practicas', CAMPOS_PRACTICAS, 'promedio_practicas'),
+            (NotaParcial, 'parciales', CAMPOS_PARCIALES, 'promedio_parciales')
+        ):
+            promedios[clave] = promedio_validas([[nota[clave][campo] for campo in campos] for nota in notas]).tolist()
+            _guardar_filas(modelo, [
+                dict(nota[clave], curso_id=curso_id, alumno_id=nota['alumno_id'], docente_id=docente_id,
+                     fecha_actualizacion=ahora, **{columna_promedio: promedio})
+                for nota, promedio in zip(notas, promedios[clave])
+            ], campos + [columna_promedio, 'fecha_actualizacion'])
+            ids[clave] = _ids_por_alumno(modelo, curso_id, alumno_ids)
+
+        finales = promedio_ponderado(promedios['actividades'], promedios['practicas'], promedios['parciales']).tolist()
+
+        resultados = []
+        filas_notas = []
+        for i, (nota, promedio_final) in enumerate(zip(notas, finales)):
+            alumno_id = nota['alumno_id']
+            filas_notas.append({
+                'curso_id': curso_id,
+                'alumno_id': alumno_id,
+                'docente_id': docente_id,
+                'nota_actividades_id': ids['actividades'][alumno_id],
+                'nota_practicas_id': ids['practicas'][alumno_id],
+                'nota_parcial_id': ids['parciales'][alumno_id],
+                'promedio_actividades': promedios['actividades'][i],
+                'promedio_practicas': promedios['practicas'][i],
+                'promedio_parciales': promedios['parciales'][i],
+                'promedio_final': promedio_final,
+                'estado': nota['estado'],
+                'comentarios': nota['comentarios'],
+                'fecha_actualizacion': ahora
+            })
+            resultados.append({
+                'alumno_id': alumno_id,
+                'promedio_final': promedio_final,
+                'promedio_actividades': promedios['actividades'][i],
+                'promedio_practicas': promedios['practicas'][i],
+                'promedio_parciales': promedios['parciales'][i],
+                'estado': nota['estado']
+            })
+        _guardar_filas(Nota, filas_notas, [
+            'nota_actividades_id', 'nota_practicas_id', 'nota_parcial_id',
+            'promedio_actividades', 'promedio_practicas', 'promedio_parciales', 'promedio_final',
+            'estado', 'comentarios', 'fecha_actualizacion'
+        ])
+
+        # Los INSERT directos no pasan por el evento de la sesión
+        incrementar_version_notas([curso_id])
+        actualizar_resumen_curso(curso_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    # El expediente del alumno solo muestra notas publicadas
+    invalidar_expedientes(publicadas_antes | {
+        resultado['alumno_id'] for resultado in resultados if resultado['estado'] == 'publicada'
+    })
+    return resultados
@@ -0,0 +1,100 @@
+"""
+Paginación por clave (keyset) para listados largos ordenados de forma descendente.
+
+En lugar de OFFSET, cada página se pide a partir de un cursor con los valores
+de la clave de orden de la última (o primera) fila mostrada:
+
+    WHERE (fecha, id) < (:fecha, :id) ORDER BY fecha DESC, id DESC LIMIT n
+
+Con un índice sobre las columnas de la clave, todas las páginas cuestan lo
+mismo sin importar su profundidad. Las columnas de la clave no deben admitir
+NULL y la última debe ser única (normalmente el id).
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from app import db
+
+
+def codificar_cursor(valores):
+    """Cursor opaco (base64 URL-safe) con los valores de la clave de una fila"""
+    datos = [{'dt': valor.isoformat()} if isinstance(valor, datetime) else valor for valor in valores]
+    return base64.urlsafe_b64encode(json.dumps(datos, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, num_columnas):
+    """Valores de la clave de un cursor; ValueError si el cursor no es válido"""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        valores = [datetime.fromisoformat(valor['dt']) if isinstance(valor, dict) else valor for valor in datos]
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError, ValueError):
+        raise ValueError('Cursor de paginación inválido.')
+    if len(valores) != num_columnas or any(valor is None for valor in valores):
+        raise ValueError('Cursor de paginación inválido.')
+    return valores
+
+
+def _anterior_en_orden(columnas, valores):
+    """Condición para filas que van después del cursor en orden descendente.
+
+    Se expande como c1 <= v1 AND (c1 < v1 OR (c1 = v1 AND ...)) para que la
+    primera columna se resuelva como un rango sobre el índice.
+    """
+    columna, valor = columnas[0], valores[0]
+    if len(columnas) == 1:
+        return columna < valor
+    return db.and_(columna <= valor, db.or_(columna < valor, _anterior_en_orden(columnas[1:], valores[1:])))
+
+
+def _posterior_en_orden(columnas, valores):
+    """Condición para filas que van antes del cursor en orden descendente"""
+    columna, valor = columnas[0], valores[0]
+    if len(columnas) == 1:
+        return columna > valor
+    return db.and_(columna >= valor, db.or_(columna > valor, _posterior_en_orden(columnas[1:], valores[1:])))
+
+
+class PaginaClave:
+    """Página de resultados con cursores hacia la página siguiente y la anterior"""
+
+    def __init__(self, items, claves, por_pagina, has_prev, has_next):
+        self.items = items
+        self.por_pagina = por_pagina
+        self.has_prev = has_prev
+        self.has_next = has_next
+        # Total de resultados, si el llamador lo conoce (puede ser aproximado)
+        self.total = None
+        self.total_aproximado = False
+        self.cursor_anterior = codificar_cursor(claves[0]) if items and has_prev else None
+        self.cursor_siguiente = codificar_cursor(claves[-1]) if items and has_next else None
+
+
+def paginar_por_clave(query, columnas, clave, despues=None, antes=None, por_pagina=20):
+    """Página de `query` en orden descendente por `columnas`.
+
+    `clave` obtiene de cada fila los valores de `columnas` (para los cursores).
+    `despues` pide la página que sigue al cursor y `antes` la que lo precede;
+    sin cursor se devuelve la primera página. Un cursor inválido lanza ValueError.
+    """
+    if antes:
+        valores = decodificar_cursor(antes, len(columnas))
+        filas = query.filter(_posterior_en_orden(columnas, valores)).order_by(
+            *(columna.asc() for columna in columnas)
+        ).limit(por_pagina + 1).all()
+        has_prev = len(filas) > por_pagina
+        items = list(reversed(filas[:por_pagina]))
+        has_next = True
+    else:
+        if despues:
+            valores = decodificar_cursor(despues, len(columnas))
+            query = query.filter(_anterior_en_orden(columnas, valores))
+        filas = query.order_by(*(columna.desc() for columna in columnas)).limit(por_pagina + 1).all()
+        has_next = len(filas) > por_pagina
+        items = filas[:por_pagina]
+        has_prev = bool(despues)
+
+    return PaginaClave(items, [clave(item) for item in items], por_pagina, has_prev, has_next)
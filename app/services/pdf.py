@@ -0,0 +1,205 @@
+"""
+PDFs de reportes renderizados directamente con ReportLab (platypus).
+
+El reporte de curso es una tabla de formato fijo (alumno, 8 actividades,
+4 prácticas, 2 parciales, promedios y estado); armarla con platypus evita
+renderizar HTML y que xhtml2pdf lo vuelva a interpretar. Las columnas y las
+filas tienen medidas fijas, así ReportLab no mide cada celda, y la tabla se
+parte en bloques de una página para que dividirla no recorra todo el curso
+una y otra vez (con una sola tabla larga, 5000 filas tardan ~8 veces más).
+
+Las funciones reciben datos simples (textos y números, o el HTML ya
+renderizado para xhtml2pdf), sin modelos ni contexto de Flask, para poder
+ejecutarse en otros procesos.
+"""
+
+from io import BytesIO
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import mm
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+NUM_ACTIVIDADES = 8
+NUM_PRACTICAS = 4
+NUM_PARCIALES = 2
+
+ENCABEZADO_CURSO = [
+    ['Alumno', 'Actividades'] + [''] * (NUM_ACTIVIDADES - 1) + ['Prácticas'] + [''] * (NUM_PRACTICAS - 1)
+    + ['Parciales'] + [''] * (NUM_PARCIALES - 1) + ['Prom. Act.', 'Prom. Prac.', 'Prom. Par.', 'Prom. Final', 'Estado'],
+    [''] + [f'A{i}' for i in range(1, NUM_ACTIVIDADES + 1)] + [f'P{i}' for i in range(1, NUM_PRACTICAS + 1)]
+    + [f'Par{i}' for i in range(1, NUM_PARCIALES + 1)] + [''] * 5,
+]
+
+# Ancho de cada columna en una página A4 horizontal con márgenes de 10 mm
+ANCHOS_CURSO = [56 * mm] + [10 * mm] * (NUM_ACTIVIDADES + NUM_PRACTICAS + NUM_PARCIALES) + [15 * mm] * 4 + [18 * mm]
+ALTO_FILA = 5.2 * mm
+MARGEN = 10 * mm
+
+_TITULO = ParagraphStyle('titulo', fontName='Helvetica-Bold', fontSize=14, leading=18, spaceAfter=4)
+_TEXTO = ParagraphStyle('texto', fontName='Helvetica', fontSize=9, leading=12)
+_CELDA = ParagraphStyle('celda', fontName='Helvetica', fontSize=8, leading=10)
+
+_ESTILO_TABLA = [
+    ('FONT', (0, 0), (-1, -1), 'Helvetica', 7),
+    ('FONT', (0, 0), (-1, 1), 'Helvetica-Bold', 7),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#333333')),
+    ('BACKGROUND', (0, 0), (-1, 1), colors.HexColor('#f0f0f0')),
+    ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('LEFTPADDING', (0, 0), (-1, -1), 2),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 2),
+    ('TOPPADDING', (0, 0), (-1, -1), 1),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
+    # Celdas combinadas del encabezado (como rowspan/colspan en la plantilla HTML)
+    ('SPAN', (0, 0), (0, 1)),
+    ('SPAN', (1, 0), (NUM_ACTIVIDADES, 0)),
+    ('SPAN', (NUM_ACTIVIDADES + 1, 0), (NUM_ACTIVIDADES + NUM_PRACTICAS, 0)),
+    ('SPAN', (NUM_ACTIVIDADES + NUM_PRACTICAS + 1, 0), (NUM_ACTIVIDADES + NUM_PRACTICAS + NUM_PARCIALES, 0)),
+] + [('SPAN', (columna, 0), (columna, 1)) for columna in range(-5, 0)]
+
+
+def _nota(valor):
+    return f'{valor:.2f}' if valor is not None and valor > 0 else '-'
+
+
+def _completar(valores, cantidad):
+    """Notas de una tabla de detalle; '-' si el alumno no tiene el registro"""
+    return [_nota(valor) for valor in valores] + ['-'] * (cantidad - len(valores))
+
+
+def filas_reporte_curso(datos):
+    """Convierte las filas de obtener_datos_reporte_curso en celdas de texto"""
+    return [
+        [f"{fila['alumno'].nombre} {fila['alumno'].apellido}"]
+        + _completar(fila['actividades'], NUM_ACTIVIDADES)
+        + _completar(fila['practicas'], NUM_PRACTICAS)
+        + _completar(fila['parciales'], NUM_PARCIALES)
+        + [f"{fila[campo]:.2f}" for campo in ('promedio_actividades', 'promedio_practicas', 'promedio_parciales', 'promedio_final')]
+        + [fila['estado'] or '-']
+        for fila in datos
+    ]
+
+
+def _tabla(filas):
+    tabla = Table(ENCABEZADO_CURSO + filas, colWidths=ANCHOS_CURSO,
+                  rowHeights=ALTO_FILA, repeatRows=len(ENCABEZADO_CURSO))
+    tabla.setStyle(TableStyle(_ESTILO_TABLA))
+    return tabla
+
+
+def _filas_que_caben(alto):
+    """Filas de datos que entran en `alto` puntos junto con el encabezado de la tabla"""
+    return max(1, int((alto - 1) // ALTO_FILA) - len(ENCABEZADO_CURSO))
+
+
+def pdf_reporte_curso(nombre, codigo, filas):
+    """PDF del reporte de un curso a partir de filas_reporte_curso; devuelve los bytes"""
+    salida = BytesIO()
+    documento = SimpleDocTemplate(
+        salida, pagesize=landscape(A4), leftMargin=MARGEN, rightMargin=MARGEN,
+        topMargin=MARGEN, bottomMargin=MARGEN, title=f'Reporte de Curso {codigo}'
+    )
+    elementos = [
+        Paragraph(f'Reporte de Curso: {_escapar(nombre)} ({_escapar(codigo)})', _TITULO),
+        Paragraph('Pesos: 10% Actividades, 30% Prácticas, 60% Parciales', _TEXTO),
+        Spacer(1, 3 * mm),
+    ]
+
+    # Un bloque por página: el primero comparte la página con el título
+    alto_pagina = documento.height - 12  # el marco de la página tiene 6 puntos de relleno arriba y abajo
+    ocupado = sum(elemento.wrap(documento.width, alto_pagina)[1] + elemento.getSpaceAfter() for elemento in elementos)
+    inicio, cantidad = 0, _filas_que_caben(alto_pagina - ocupado)
+    while True:
+        elementos.append(_tabla(filas[inicio:inicio + cantidad]))
+        inicio += cantidad
+        if inicio >= len(filas):
+            break
+        cantidad = _filas_que_caben(alto_pagina)
+
+    documento.build(elementos)
+    return salida.getvalue()
+
+
+ENCABEZADO_LIBRETA = ['Curso', 'Código', 'Créditos', 'Prom. Act.', 'Prom. Prac.', 'Prom. Par.', 'Prom. Final', 'Estado']
+# Ancho de cada columna en una página A4 vertical con márgenes de 15 mm
+ANCHOS_LIBRETA = [62 * mm, 20 * mm, 15 * mm, 17 * mm, 17 * mm, 17 * mm, 17 * mm, 15 * mm]
+MARGEN_LIBRETA = 15 * mm
+
+_ESTILO_LIBRETA = [
+    ('FONT', (0, 0), (-1, -1), 'Helvetica', 8),
+    ('FONT', (0, 0), (-1, 0), 'Helvetica-Bold', 8),
+    ('FONT', (6, 1), (6, -1), 'Helvetica-Bold', 8),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#333333')),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f0f0f0')),
+    ('ALIGN', (2, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('TOPPADDING', (0, 0), (-1, -1), 3),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+]
+
+
+def _elementos_libreta(ciclo, libreta):
+    filas = [
+        [Paragraph(_escapar(curso['nombre']), _CELDA), curso['codigo'], str(curso['creditos'] or '-')]
+        + [f"{curso[campo]:.2f}" for campo in ('promedio_actividades', 'promedio_practicas', 'promedio_parciales', 'promedio_final')]
+        + [curso['estado'] or '-']
+        for curso in libreta['cursos']
+    ]
+    # Pocas filas por libreta: el alto se ajusta a los nombres de curso largos
+    tabla = Table([ENCABEZADO_LIBRETA] + filas, colWidths=ANCHOS_LIBRETA, repeatRows=1)
+    tabla.setStyle(TableStyle(_ESTILO_LIBRETA))
+    return [
+        Paragraph('Libreta de Notas', _TITULO),
+        Paragraph(_escapar(ciclo), _TEXTO),
+        Paragraph(f"Alumno: {_escapar(libreta['alumno'])} (DNI: {_escapar(libreta['dni'])})", _TEXTO),
+        Spacer(1, 4 * mm),
+        tabla,
+        Spacer(1, 3 * mm),
+        Paragraph('Pesos: 10% Actividades, 30% Prácticas, 60% Parciales', _TEXTO),
+    ]
+
+
+def pdf_libretas(ciclo, libretas):
+    """Un PDF con las libretas de app.services.libretas, cada una desde una página nueva"""
+    salida = BytesIO()
+    documento = SimpleDocTemplate(
+        salida, pagesize=A4, leftMargin=MARGEN_LIBRETA, rightMargin=MARGEN_LIBRETA,
+        topMargin=MARGEN_LIBRETA, bottomMargin=MARGEN_LIBRETA, title=f'Libretas de Notas - {ciclo}'
+    )
+    elementos = []
+    for libreta in libretas:
+        if elementos:
+            elementos.append(PageBreak())
+        elementos.extend(_elementos_libreta(ciclo, libreta))
+    documento.build(elementos)
+    return salida.getvalue()
+
+
+def pdfs_libretas(ciclo, libretas):
+    """Un PDF por libreta, en el mismo orden"""
+    return [pdf_libretas(ciclo, [libreta]) for libreta in libretas]
+
+
+def html_a_pdf(html):
+    """Convierte HTML con xhtml2pdf; devuelve los bytes o None si falla"""
+    from xhtml2pdf import pisa
+
+    salida = BytesIO()
+    resultado = pisa.CreatePDF(html, dest=salida)
+    if getattr(resultado, 'err', 0):
+        return None
+    return salida.getvalue()
+
+
+def renderizar_pdf_curso(motor, nombre, codigo, contenido):
+    """PDF de un curso con `motor`: `contenido` son las filas de filas_reporte_curso
+    ('reportlab') o el HTML de la plantilla del reporte ('xhtml2pdf')"""
+    if motor == 'reportlab':
+        return pdf_reporte_curso(nombre, codigo, contenido)
+    return html_a_pdf(contenido)
+
+
+def _escapar(texto):
+    return str(texto).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
@@ -0,0 +1,233 @@
+"""
+Perfilador de consultas SQL por petición.
+
+Registra, mediante los eventos del engine de SQLAlchemy, cuántas sentencias
+ejecuta cada petición, el tiempo total en la base de datos y las sentencias
+que se repiten con distinta forma de parámetros (huella), que suelen indicar
+un bucle N+1. El resultado se expone en cabeceras de respuesta, en un panel
+al pie de las páginas HTML y en /debug/consultas (JSON).
+
+Fuera de una petición, `capturar_consultas()` mide cualquier bloque de código;
+sirve para comprobar presupuestos de consultas en pruebas y benchmarks:
+
+    with capturar_consultas() as perfil:
+        cliente.get('/admin/docentes')
+    perfil.verificar(maximo=5)
+"""
+
+import re
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+from flask import current_app, g, render_template, request
+from sqlalchemy import event
+
+from app import db
+
+# Perfiles que están registrando consultas en el contexto actual
+_perfiles_activos = ContextVar('perfiles_consultas', default=())
+
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTAS = re.compile(r'\(\s*(\?|%s|%\(\w+\)s|:\w+)(\s*,\s*(\?|%s|%\(\w+\)s|:\w+))+\s*\)')
+
+
+class PresupuestoConsultasExcedido(AssertionError):
+    """La petición o el bloque medido superó el número de consultas permitido"""
+
+
+def huella_consulta(sql):
+    """Forma normalizada de la sentencia: sin literales, con las listas IN colapsadas"""
+    sql = _LITERALES.sub('?', sql)
+    sql = _LISTAS.sub('(?)', sql)
+    return ' '.join(sql.split())
+
+
+class PerfilConsultas:
+    """Consultas ejecutadas durante una petición o un bloque de código"""
+
+    def __init__(self, descripcion=''):
+        self.id = uuid.uuid4().hex[:12]
+        self.descripcion = descripcion
+        self.fecha = datetime.utcnow()
+        self.total = 0
+        self.tiempo_ms = 0.0
+        self.huellas = {}
+
+    def registrar(self, sql, duracion_ms):
+        self.total += 1
+        self.tiempo_ms += duracion_ms
+        huella = huella_consulta(sql)
+        datos = self.huellas.get(huella)
+        if datos is None:
+            datos = self.huellas[huella] = {'huella': huella, 'veces': 0, 'tiempo_ms': 0.0}
+        datos['veces'] += 1
+        datos['tiempo_ms'] += duracion_ms
+
+    def repetidas(self, umbral):
+        """Sentencias ejecutadas `umbral` veces o más (posibles N+1), de más a menos frecuentes"""
+        return sorted(
+            (datos for datos in self.huellas.values() if datos['veces'] >= umbral),
+            key=lambda datos: datos['veces'], reverse=True
+        )
+
+    def como_dict(self, umbral, detalle=True):
+        datos = {
+            'id': self.id,
+            'descripcion': self.descripcion,
+            'fecha': self.fecha.isoformat(),
+            'consultas': self.total,
+            'tiempo_ms': round(self.tiempo_ms, 2),
+            'repetidas': len(self.repetidas(umbral))
+        }
+        if detalle:
+            datos['sentencias'] = [
+                dict(sentencia, tiempo_ms=round(sentencia['tiempo_ms'], 2))
+                for sentencia in sorted(self.huellas.values(), key=lambda s: s['veces'], reverse=True)
+            ]
+        return datos
+
+    def verificar(self, maximo=None, umbral_repetidas=None):
+        """Lanza PresupuestoConsultasExcedido si se superó `maximo` consultas o
+        si alguna sentencia se repitió `umbral_repetidas` veces o más"""
+        if maximo is not None and self.total > maximo:
+            raise PresupuestoConsultasExcedido(
+                f'{self.descripcion or "Bloque"}: {self.total} consultas (máximo {maximo}).'
+            )
+        if umbral_repetidas is not None:
+            repetidas = self.repetidas(umbral_repetidas)
+            if repetidas:
+                raise PresupuestoConsultasExcedido(
+                    f'{self.descripcion or "Bloque"}: sentencia repetida {repetidas[0]["veces"]} veces: {repetidas[0]["huella"]}'
+                )
+
+
+@contextmanager
+def capturar_consultas(descripcion=''):
+    """Registra las consultas ejecutadas dentro del bloque (también las de peticiones anidadas)"""
+    perfil = PerfilConsultas(descripcion)
+    token = _perfiles_activos.set(_perfiles_activos.get() + (perfil,))
+    try:
+        yield perfil
+    finally:
+        _perfiles_activos.reset(token)
+
+
+def _antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    # El inicio se guarda en el contexto de la sentencia y no en la conexión:
+    # una sentencia que falla no llega a after_cursor_execute y su inicio no
+    # debe quedar en la conexión del pool para la siguiente
+    if _perfiles_activos.get() and context is not None:
+        context._perfil_inicio = time.perf_counter()
+
+
+def _despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    perfiles = _perfiles_activos.get()
+    inicio = getattr(context, '_perfil_inicio', None)
+    if not perfiles or inicio is None:
+        return
+    duracion_ms = (time.perf_counter() - inicio) * 1000
+    for perfil in perfiles:
+        perfil.registrar(statement, duracion_ms)
+
+
+def escuchar_engine(engine):
+    """Conecta el perfilador a un engine (se puede llamar más de una vez)"""
+    if not event.contains(engine, 'before_cursor_execute', _antes_de_ejecutar):
+        event.listen(engine, 'before_cursor_execute', _antes_de_ejecutar)
+        event.listen(engine, 'after_cursor_execute', _despues_de_ejecutar)
+
+
+def _omitir_peticion():
+    return request.endpoint in (None, 'static') or request.endpoint.startswith('depuracion.')
+
+
+def _iniciar_perfil():
+    if _omitir_peticion():
+        return
+    perfil = PerfilConsultas(f'{request.method} {request.path}')
+    g._perfil_consultas = perfil
+    g._perfil_consultas_token = _perfiles_activos.set(_perfiles_activos.get() + (perfil,))
+
+
+def _terminar_perfil(response):
+    perfil = g.get('_perfil_consultas')
+    if perfil is None:
+        return response
+
+    config = current_app.config
+    umbral = config['PERFIL_CONSULTAS_UMBRAL_REPETIDAS']
+    repetidas = perfil.repetidas(umbral)
+
+    response.headers['X-Consultas-SQL'] = str(perfil.total)
+    response.headers['X-Tiempo-SQL-ms'] = f'{perfil.tiempo_ms:.2f}'
+    response.headers['X-Consultas-Repetidas'] = str(len(repetidas))
+    response.headers['X-Perfil-Consultas'] = perfil.id
+
+    current_app.extensions['perfil_consultas'].append({
+        'perfil': perfil,
+        'endpoint': request.endpoint,
+        'estado': response.status_code
+    })
+
+    if repetidas:
+        current_app.logger.warning(
+            'Posible N+1 en %s: sentencia repetida %s veces: %s',
+            perfil.descripcion, repetidas[0]['veces'], repetidas[0]['huella']
+        )
+
+    # Presupuesto de consultas por endpoint (PERFIL_CONSULTAS_PRESUPUESTOS)
+    maximo = config['PERFIL_CONSULTAS_PRESUPUESTOS'].get(request.endpoint)
+    if maximo is not None and perfil.total > maximo:
+        response.headers['X-Presupuesto-Consultas'] = f'excedido ({perfil.total}/{maximo})'
+        current_app.logger.warning('%s superó su presupuesto: %s consultas (máximo %s)', request.endpoint, perfil.total, maximo)
+        if current_app.testing:
+            perfil.verificar(maximo=maximo)
+
+    if (config['PERFIL_CONSULTAS_PANEL'] and response.mimetype == 'text/html'
+            and not response.is_streamed and not response.direct_passthrough):
+        html = response.get_data(as_text=True)
+        posicion = html.rfind('</body>')
+        if posicion != -1:
+            panel = render_template('global/perfil_consultas.html', perfil=perfil, repetidas=repetidas, umbral=umbral)
+            response.set_data(html[:posicion] + panel + html[posicion:])
+
+    return response
+
+
+def _limpiar_perfil(exc=None):
+    g.pop('_perfil_consultas', None)
+    token = g.pop('_perfil_consultas_token', None)
+    if token is not None:
+        _perfiles_activos.reset(token)
+
+
+def perfiles_recientes():
+    """Perfiles de las últimas peticiones, del más reciente al más antiguo"""
+    return list(reversed(current_app.extensions.get('perfil_consultas', ())))
+
+
+def init_perfilador(app):
+    """Activa el perfilador si PERFIL_CONSULTAS está habilitado en la configuración"""
+    if not app.config.get('PERFIL_CONSULTAS'):
+        return
+
+    app.config.setdefault('PERFIL_CONSULTAS_UMBRAL_REPETIDAS', 5)
+    app.config.setdefault('PERFIL_CONSULTAS_HISTORIAL', 50)
+    app.config.setdefault('PERFIL_CONSULTAS_PANEL', app.debug)
+    app.config.setdefault('PERFIL_CONSULTAS_PRESUPUESTOS', {})
+    app.extensions['perfil_consultas'] = deque(maxlen=app.config['PERFIL_CONSULTAS_HISTORIAL'])
+
+    with app.app_context():
+        for engine in db.engines.values():
+            escuchar_engine(engine)
+
+    app.before_request(_iniciar_perfil)
+    app.after_request(_terminar_perfil)
+    app.teardown_request(_limpiar_perfil)
+
+    from app.modules.depuracion import depuracion_bp
+    app.register_blueprint(depuracion_bp)
@@ -0,0 +1,38 @@
+"""
+Pools de procesos compartidos para trabajo de CPU (hashes de contraseñas,
+dibujo de PDFs).
+
+Cada servicio crea su PoolProcesos a nivel de módulo con una función que
+indica cuántos procesos usar; el ProcessPoolExecutor se crea la primera vez
+que se pide (dentro de un contexto de aplicación, para leer la
+configuración) y se cierra al terminar el proceso.
+"""
+
+import atexit
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+
+class PoolProcesos:
+    """ProcessPoolExecutor perezoso y compartido entre los hilos del proceso"""
+
+    def __init__(self, num_procesos):
+        self._num_procesos = num_procesos
+        self._pool = None
+        self._lock = threading.Lock()
+        self.procesos = 0
+        atexit.register(self.cerrar)
+
+    def obtener(self):
+        """Pool de procesos compartido, creado la primera vez que se usa"""
+        with self._lock:
+            if self._pool is None:
+                self.procesos = self._num_procesos()
+                self._pool = ProcessPoolExecutor(max_workers=self.procesos)
+            return self._pool
+
+    def cerrar(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,80 @@
+"""
+Control de las cargas perezosas de relaciones.
+
+Las relaciones de app/models.py no se cargan solas: las vistas que recorren
+listas piden lo que usan con opciones de consulta (`selectinload`,
+`joinedload`, `contains_eager` o cargando las entidades en la misma
+consulta). Una relación que se carga perezosamente dentro de un bucle es una
+consulta por fila; las colecciones que ninguna vista recorre se declaran con
+lazy='raise'.
+
+CARGA_PEREZOSA indica qué hacer cuando una relación se carga con una
+consulta al acceder al atributo:
+
+    'permitir'  se carga normalmente (producción)
+    'avisar'    se carga y se registra una advertencia (desarrollo)
+    'error'     lanza CargaPerezosaNoPrevista (pruebas y benchmarks)
+
+Las relaciones que ya están en el mapa de identidad no ejecutan consultas y
+no cuentan. Para un bloque en el que la carga perezosa es intencional:
+
+    with permitir_carga_perezosa():
+        ...
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import current_app, has_app_context, has_request_context, request
+from sqlalchemy import event
+
+MODOS = ('permitir', 'avisar', 'error')
+
+_permitidas = ContextVar('cargas_perezosas_permitidas', default=False)
+
+
+class CargaPerezosaNoPrevista(AssertionError):
+    """Se cargó perezosamente una relación que la vista no pidió en su consulta"""
+
+
+@contextmanager
+def permitir_carga_perezosa():
+    """Desactiva el control dentro del bloque"""
+    token = _permitidas.set(True)
+    try:
+        yield
+    finally:
+        _permitidas.reset(token)
+
+
+def _relacion(estado):
+    ruta = estado.loader_strategy_path
+    return str(ruta[-1]) if ruta is not None and len(ruta) else '?'
+
+
+def _al_ejecutar(estado):
+    # Solo las cargas perezosas: no las consultas de la vista, ni selectinload,
+    # ni las que hace el unit of work al guardar o eliminar
+    if not estado.is_select or estado.lazy_loaded_from is None or estado.session._flushing:
+        return
+    if _permitidas.get() or not has_app_context():
+        return
+    modo = current_app.config.get('CARGA_PEREZOSA', 'permitir')
+    if modo == 'permitir':
+        return
+
+    donde = request.endpoint if has_request_context() else 'fuera de una petición'
+    mensaje = f'Carga perezosa de {_relacion(estado)} en {donde}'
+    if modo == 'error':
+        raise CargaPerezosaNoPrevista(f'{mensaje}: cárguela en la consulta (selectinload, joinedload).')
+    current_app.logger.warning(mensaje)
+
+
+def init_relaciones(app):
+    """Valida CARGA_PEREZOSA y conecta el control a la sesión de la aplicación"""
+    db = app.extensions['sqlalchemy']
+    app.config.setdefault('CARGA_PEREZOSA', 'permitir')
+    if app.config['CARGA_PEREZOSA'] not in MODOS:
+        raise ValueError(f"CARGA_PEREZOSA debe ser uno de {', '.join(MODOS)}")
+    if not event.contains(db.session, 'do_orm_execute', _al_ejecutar):
+        event.listen(db.session, 'do_orm_execute', _al_ejecutar)
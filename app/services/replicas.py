@@ -0,0 +1,149 @@
+"""
+Lecturas de reportes y paneles desde una réplica de la base de datos.
+
+Si REPLICA_DATABASE_URI está configurada, Flask-SQLAlchemy crea un segundo
+engine (bind 'replica'). Las vistas decoradas con `@lectura_en_replica`
+ejecutan sus SELECT en la réplica; las escrituras (flush, INSERT, UPDATE,
+DELETE) siempre van a la base principal. Sin réplica configurada, o si la
+réplica no responde, todo se lee de la principal.
+
+Lectura de las propias escrituras: cuando una petición escribe en la base
+principal, la sesión del usuario guarda la hora de la escritura y durante
+REPLICA_LECTURA_PROPIA_SEGUNDOS sus vistas de lectura siguen usando la
+principal, para que un docente vea de inmediato las notas que acaba de
+guardar aunque la réplica vaya con retraso.
+
+Este módulo no importa `app.db`: la clase de sesión se usa al crearlo.
+"""
+
+import time
+from functools import wraps
+
+from flask import Response, current_app, g, has_app_context, has_request_context, session, stream_with_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+BIND_REPLICA = 'replica'
+
+
+class SesionConReplica(Session):
+    """Sesión que envía las lecturas a la réplica cuando la vista lo pide"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and self.info.get('usar_replica') and not self._flushing
+                and not getattr(clause, 'is_dml', False)):
+            replica = self._db.engines.get(BIND_REPLICA)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _estado():
+    return current_app.extensions['replicas']
+
+
+def replica_disponible():
+    """True si hay réplica configurada y no falló recientemente"""
+    estado = _estado()
+    return estado['configurada'] and time.time() >= estado['caida_hasta']
+
+
+def escritura_reciente():
+    """True si el usuario escribió en la base principal hace menos de REPLICA_LECTURA_PROPIA_SEGUNDOS"""
+    ultima = session.get('_ultima_escritura')
+    return ultima is not None and time.time() - ultima < current_app.config['REPLICA_LECTURA_PROPIA_SEGUNDOS']
+
+
+def _marcar_caida():
+    _estado()['caida_hasta'] = time.time() + current_app.config['REPLICA_REINTENTO_SEGUNDOS']
+    current_app.logger.warning('Réplica no disponible; leyendo de la base principal.')
+
+
+def _fallo_en_replica():
+    """True (una sola vez) si la última consulta fallida de la petición fue en la réplica"""
+    return g.pop('_fallo_replica', False)
+
+
+def _leer_en_replica(partes):
+    """Recorre el cuerpo de una respuesta por partes con las lecturas en la réplica.
+
+    La consulta de una exportación en streaming se ejecuta al enviar la
+    respuesta, después de que la vista terminó, así que la marca de la
+    sesión se mantiene mientras dura el generador y no solo durante la vista.
+    """
+    db = current_app.extensions['sqlalchemy']
+    db.session.info['usar_replica'] = True
+    try:
+        yield from partes
+    except OperationalError:
+        # Las cabeceras ya se enviaron: no se puede repetir en la principal
+        if _fallo_en_replica():
+            _marcar_caida()
+        raise
+    finally:
+        db.session.info.pop('usar_replica', None)
+
+
+def lectura_en_replica(vista):
+    """Decorador para vistas de solo lectura (reportes, paneles, exportaciones)
+
+    Si la vista devuelve una respuesta por partes (stream_with_context), sus
+    lecturas también van a la réplica mientras se envía.
+    """
+    @wraps(vista)
+    def decorated_function(*args, **kwargs):
+        db = current_app.extensions['sqlalchemy']
+        if not replica_disponible() or escritura_reciente():
+            return vista(*args, **kwargs)
+
+        g.pop('_fallo_replica', None)
+        db.session.info['usar_replica'] = True
+        try:
+            respuesta = vista(*args, **kwargs)
+        except OperationalError:
+            # Solo un fallo de la réplica se repite en la principal; los errores
+            # de la base principal (bloqueos, tiempo máximo) se propagan
+            if not _fallo_en_replica():
+                raise
+            db.session.rollback()
+            db.session.info.pop('usar_replica', None)
+            _marcar_caida()
+            return vista(*args, **kwargs)
+        finally:
+            db.session.info.pop('usar_replica', None)
+
+        if isinstance(respuesta, Response) and respuesta.is_streamed:
+            respuesta.response = stream_with_context(_leer_en_replica(respuesta.response))
+        return respuesta
+    return decorated_function
+
+
+def _registrar_fallo_replica(contexto):
+    if has_app_context() and isinstance(contexto.sqlalchemy_exception, OperationalError):
+        g._fallo_replica = True
+
+
+def _registrar_escritura(conexion, cursor, sentencia, parametros, contexto, executemany):
+    if has_request_context() and (contexto.isinsert or contexto.isupdate or contexto.isdelete):
+        g._escritura_en_principal = True
+
+
+def _marcar_sesion(respuesta):
+    if g.pop('_escritura_en_principal', False):
+        session['_ultima_escritura'] = time.time()
+    return respuesta
+
+
+def init_replicas(app):
+    """Registra el estado de la réplica, sus fallos y el seguimiento de escrituras por usuario"""
+    db = app.extensions['sqlalchemy']
+    app.config.setdefault('REPLICA_LECTURA_PROPIA_SEGUNDOS', 10)
+    app.config.setdefault('REPLICA_REINTENTO_SEGUNDOS', 30)
+    with app.app_context():
+        configurada = BIND_REPLICA in db.engines
+        app.extensions['replicas'] = {'configurada': configurada, 'caida_hasta': 0.0}
+        if configurada:
+            event.listen(db.engines[None], 'after_cursor_execute', _registrar_escritura)
+            event.listen(db.engines[BIND_REPLICA], 'handle_error', _registrar_fallo_replica)
+            app.after_request(_marcar_sesion)
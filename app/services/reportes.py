@@ -0,0 +1,211 @@
+"""
+Construcción de los datos de reportes de notas por curso.
+
+Carga la grilla completa de un curso (alumnos, actividades, prácticas,
+parciales y nota final) en una sola consulta, en lugar de consultar cada
+tabla de notas por alumno. También genera y guarda en disco los PDFs de
+cada curso, identificados por la versión de sus notas y el motor que los
+generó (REPORTES_PDF_MOTOR: 'reportlab' o 'xhtml2pdf').
+"""
+
+import glob
+import os
+import uuid
+
+from flask import current_app, render_template
+
+from app import db
+from app.models import Usuario, Curso, CursoAlumno, Nota, NotaActividades, NotaPracticas, NotaParcial
+from app.services.calificaciones import promedio_ponderado
+from app.services.trabajos import registrar_tarea
+from app.services.versiones import version_notas_cursos
+
+MOTORES_PDF = ('reportlab', 'xhtml2pdf')
+
+
+def _promedios_componentes(na, np, npa, nota):
+    """Promedios de actividades, prácticas y parciales de un alumno.
+
+    Se usan los guardados en la nota final; si están en cero, los de las
+    tablas de detalle.
+    """
+    prom_acts = 0.0
+    prom_pracs = 0.0
+    prom_parcs = 0.0
+    if nota:
+        prom_acts = nota.promedio_actividades or 0.0
+        prom_pracs = nota.promedio_practicas or 0.0
+        prom_parcs = nota.promedio_parciales or 0.0
+
+    if prom_acts == 0.0 and na:
+        prom_acts = na.promedio_actividades or 0.0
+    if prom_pracs == 0.0 and np:
+        prom_pracs = np.promedio_practicas or 0.0
+    if prom_parcs == 0.0 and npa:
+        prom_parcs = npa.promedio_parciales or 0.0
+
+    return prom_acts, prom_pracs, prom_parcs
+
+
+def _fila_reporte(alumno, na, np, npa, nota, promedios, promedio_final):
+    """Arma una fila del reporte a partir de los registros de notas del alumno"""
+    prom_acts, prom_pracs, prom_parcs = promedios
+    return {
+        'alumno': alumno,
+        'actividades': [na.actividad1, na.actividad2, na.actividad3, na.actividad4, na.actividad5, na.actividad6, na.actividad7, na.actividad8] if na else [],
+        'practicas': [np.practica1, np.practica2, np.practica3, np.practica4] if np else [],
+        'parciales': [npa.parcial1, npa.parcial2] if npa else [],
+        'promedio_actividades': round(prom_acts, 2),
+        'promedio_practicas': round(prom_pracs, 2),
+        'promedio_parciales': round(prom_parcs, 2),
+        'promedio_final': round(promedio_final, 2),
+        'estado': nota.estado if nota else None
+    }
+
+
+def obtener_datos_reportes_cursos(curso_ids):
+    """{curso_id: filas del reporte} de varios cursos, en una sola consulta.
+
+    Las filas de cada curso van ordenadas por apellido y nombre. Todas las
+    notas se cargan con LEFT JOIN por (curso_id, alumno_id), por lo que el
+    costo no crece con la matrícula ni con el número de cursos. Los
+    promedios finales de todos los cursos se calculan en una sola pasada.
+    """
+    def detalle(modelo):
+        return db.and_(modelo.curso_id == CursoAlumno.curso_id, modelo.alumno_id == Usuario.id)
+
+    curso_ids = list(curso_ids)
+    filas = db.session.query(
+        CursoAlumno.curso_id, Usuario, NotaActividades, NotaPracticas, NotaParcial, Nota
+    ).select_from(Usuario).join(
+        CursoAlumno, CursoAlumno.alumno_id == Usuario.id
+    ).outerjoin(
+        NotaActividades, detalle(NotaActividades)
+    ).outerjoin(
+        NotaPracticas, detalle(NotaPracticas)
+    ).outerjoin(
+        NotaParcial, detalle(NotaParcial)
+    ).outerjoin(
+        Nota, detalle(Nota)
+    ).filter(
+        CursoAlumno.curso_id.in_(curso_ids),
+        Usuario.rol == 'alumno'
+    ).order_by(
+        CursoAlumno.curso_id.asc(), Usuario.apellido.asc(), Usuario.nombre.asc(), Usuario.id.asc()
+    ).all()
+
+    # Un alumno con registros duplicados genera varias filas: conservar la primera
+    unicas = []
+    vistos = set()
+    for fila in filas:
+        if (fila[0], fila[1].id) in vistos:
+            continue
+        vistos.add((fila[0], fila[1].id))
+        unicas.append(fila)
+
+    promedios = [_promedios_componentes(na, np, npa, nota) for _, _, na, np, npa, nota in unicas]
+    finales = promedio_ponderado(*zip(*promedios)).tolist() if promedios else []
+
+    datos = {curso_id: [] for curso_id in curso_ids}
+    for (curso_id, alumno, na, np, npa, nota), promedios_alumno, final in zip(unicas, promedios, finales):
+        datos[curso_id].append(_fila_reporte(alumno, na, np, npa, nota, promedios_alumno, final))
+    return datos
+
+
+def obtener_datos_reporte_curso(curso_id):
+    """Devuelve las filas del reporte de un curso, ordenadas por apellido y nombre"""
+    return obtener_datos_reportes_cursos([curso_id])[curso_id]
+
+
+def version_notas_curso(curso_id):
+    """Identificador que cambia cada vez que cambian las notas, la matrícula, el nombre
+    del curso o los datos de sus alumnos (cursos.version_notas, ver
+    app/services/versiones.py); None si el curso no existe"""
+    return version_notas_cursos([curso_id]).get(curso_id)
+
+
+def _directorio_pdfs():
+    directorio = current_app.config.get('REPORTES_PDF_DIR') or os.path.join(current_app.instance_path, 'reportes')
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+def motor_pdf():
+    """Motor de los PDFs de curso configurado en REPORTES_PDF_MOTOR"""
+    motor = current_app.config.get('REPORTES_PDF_MOTOR') or 'reportlab'
+    if motor not in MOTORES_PDF:
+        raise ValueError(f"REPORTES_PDF_MOTOR debe ser uno de {', '.join(MOTORES_PDF)}")
+    return motor
+
+
+def ruta_pdf_curso(curso_id, version):
+    return os.path.join(_directorio_pdfs(), f'curso_{curso_id}_{version}_{motor_pdf()}.pdf')
+
+
+def contenido_pdf_curso(curso, motor, datos=None):
+    """Lo que el motor necesita para dibujar el PDF del curso: las filas de texto
+    del reporte ('reportlab') o la plantilla docente/reporte_curso_pdf.html
+    renderizada ('xhtml2pdf'). `datos` son las filas del reporte si ya se cargaron"""
+    if datos is None:
+        datos = obtener_datos_reporte_curso(curso.id)
+    if motor == 'reportlab':
+        from app.services.pdf import filas_reporte_curso
+        return filas_reporte_curso(datos)
+    return render_template('docente/reporte_curso_pdf.html', curso=curso, datos=datos)
+
+
+def generar_pdf_curso(curso, motor=None):
+    """Renderiza el PDF del curso; devuelve los bytes o None si falla.
+
+    'reportlab' arma la tabla directamente con platypus; 'xhtml2pdf' convierte
+    la plantilla docente/reporte_curso_pdf.html. Sin `motor`, REPORTES_PDF_MOTOR.
+    """
+    from app.services.pdf import renderizar_pdf_curso
+
+    motor = motor or motor_pdf()
+    return renderizar_pdf_curso(motor, curso.nombre, curso.codigo, contenido_pdf_curso(curso, motor))
+
+
+def guardar_pdf_curso(curso_id, ruta, contenido):
+    """Guarda el PDF en `ruta` y elimina las versiones anteriores del curso"""
+    # Escritura atómica: otro proceso puede estar generando el mismo archivo
+    temporal = f'{ruta}.{uuid.uuid4().hex}.tmp'
+    with open(temporal, 'wb') as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, ruta)
+
+    for anterior in glob.glob(os.path.join(_directorio_pdfs(), f'curso_{curso_id}_*.pdf')):
+        if anterior != ruta:
+            try:
+                os.remove(anterior)
+            except OSError:
+                pass
+
+
+def obtener_pdf_curso(curso):
+    """Devuelve la ruta del PDF del curso para la versión actual de sus notas.
+
+    Si ya fue generado se reutiliza el archivo en disco; si no, se genera y
+    se eliminan las versiones anteriores. Devuelve None si la generación falla.
+    """
+    ruta = ruta_pdf_curso(curso.id, version_notas_curso(curso.id))
+    if os.path.exists(ruta):
+        return ruta
+
+    contenido = generar_pdf_curso(curso)
+    if contenido is None:
+        return None
+    guardar_pdf_curso(curso.id, ruta, contenido)
+    return ruta
+
+
+@registrar_tarea('reporte_curso_pdf')
+def tarea_reporte_curso_pdf(curso_id):
+    """Tarea de la cola: genera (o reutiliza) el PDF del curso"""
+    curso = Curso.query.get(curso_id)
+    if not curso:
+        raise ValueError('Curso no encontrado.')
+    ruta = obtener_pdf_curso(curso)
+    if not ruta:
+        raise RuntimeError('Error generando PDF.')
+    return {'ruta': ruta, 'nombre': f'reporte_curso_{curso.codigo}.pdf'}
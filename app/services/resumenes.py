@@ -0,0 +1,117 @@
+"""
+Resumen precalculado de notas finales por curso y docente (tabla resumen_curso).
+
+Cada escritura de notas recalcula solo las filas del curso afectado con una
+consulta agregada, de modo que los paneles del administrador leen una fila
+por curso en lugar de cargar todas las notas para contarlas y promediarlas.
+"""
+
+from app import db
+from app.models import Curso, Nota, ResumenCurso
+
+
+def _agregados(*filtros):
+    """Filas (curso_id, docente_id, total, publicadas, con_promedio, suma, mínimo, máximo)"""
+    positivo = Nota.promedio_final > 0
+    promedio_valido = db.case((positivo, Nota.promedio_final))
+    return db.session.query(
+        Nota.curso_id,
+        Nota.docente_id,
+        db.func.count(Nota.id),
+        db.func.coalesce(db.func.sum(db.case((Nota.estado == 'publicada', 1), else_=0)), 0),
+        db.func.count(promedio_valido),
+        db.func.coalesce(db.func.sum(promedio_valido), 0.0),
+        db.func.min(promedio_valido),
+        db.func.max(promedio_valido)
+    ).filter(*filtros).group_by(Nota.curso_id, Nota.docente_id)
+
+
+def _asignar(resumen, fila):
+    (_, _, resumen.total_notas, resumen.notas_publicadas, resumen.notas_con_promedio,
+     resumen.suma_promedios, resumen.promedio_minimo, resumen.promedio_maximo) = fila
+
+
+def actualizar_resumen_curso(curso_id):
+    """Recalcula las filas de resumen de un curso en la transacción actual.
+
+    Debe llamarse después de modificar notas del curso y antes del commit;
+    el llamador confirma la transacción.
+
+    Dos guardados simultáneos del mismo curso se ordenan con un bloqueo de
+    la fila del curso (SELECT ... FOR UPDATE), y después el resumen y las
+    notas se leen con lecturas bloqueantes: en InnoDB (REPEATABLE READ) ven
+    lo último confirmado y no la instantánea del inicio de la transacción,
+    así que el segundo ve la fila de resumen que creó el primero y agrega
+    también sus notas.
+    """
+    db.session.query(Curso.id).filter(Curso.id == curso_id).with_for_update().one_or_none()
+    existentes = {
+        resumen.docente_id: resumen
+        for resumen in ResumenCurso.query.filter_by(curso_id=curso_id).with_for_update().populate_existing()
+    }
+    for fila in _agregados(Nota.curso_id == curso_id).with_for_update(read=True):
+        resumen = existentes.pop(fila[1], None)
+        if not resumen:
+            resumen = ResumenCurso(curso_id=curso_id, docente_id=fila[1])
+            db.session.add(resumen)
+        _asignar(resumen, fila)
+
+    # Docentes que ya no tienen notas en el curso
+    for resumen in existentes.values():
+        db.session.delete(resumen)
+
+
+def reconstruir_resumenes():
+    """Vuelve a calcular toda la tabla de resumen desde las notas; devuelve el número de filas"""
+    try:
+        ResumenCurso.query.delete()
+        resumenes = []
+        for fila in _agregados():
+            resumen = ResumenCurso(curso_id=fila[0], docente_id=fila[1])
+            _asignar(resumen, fila)
+            resumenes.append(resumen)
+        db.session.add_all(resumenes)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(resumenes)
+
+
+def combinar_resumenes(resumenes):
+    """Suma varias filas de resumen en un ResumenCurso no persistido (totales de un docente o curso)"""
+    resumenes = list(resumenes)
+    minimos = [r.promedio_minimo for r in resumenes if r.promedio_minimo is not None]
+    maximos = [r.promedio_maximo for r in resumenes if r.promedio_maximo is not None]
+    return ResumenCurso(
+        total_notas=sum(r.total_notas for r in resumenes),
+        notas_publicadas=sum(r.notas_publicadas for r in resumenes),
+        notas_con_promedio=sum(r.notas_con_promedio for r in resumenes),
+        suma_promedios=sum(r.suma_promedios for r in resumenes),
+        promedio_minimo=min(minimos) if minimos else None,
+        promedio_maximo=max(maximos) if maximos else None
+    )
+
+
+def resumenes_docente(docente_id):
+    """Filas de resumen del docente por curso: {curso_id: ResumenCurso}"""
+    return {resumen.curso_id: resumen for resumen in ResumenCurso.query.filter_by(docente_id=docente_id)}
+
+
+def resumen_curso(curso_id):
+    """Totales del curso considerando las notas de todos sus docentes"""
+    return combinar_resumenes(ResumenCurso.query.filter_by(curso_id=curso_id))
+
+
+def total_notas(ciclo_id=None, curso_id=None):
+    """Número de notas según la tabla de resumen (sin contar la tabla notas).
+
+    Es aproximado en la medida en que el resumen puede estar desactualizado
+    si las notas se modificaron fuera de la aplicación.
+    """
+    query = db.session.query(db.func.coalesce(db.func.sum(ResumenCurso.total_notas), 0))
+    if ciclo_id:
+        query = query.join(Curso, Curso.id == ResumenCurso.curso_id).filter(Curso.ciclo_academico_id == ciclo_id)
+    if curso_id:
+        query = query.filter(ResumenCurso.curso_id == curso_id)
+    return int(query.scalar())
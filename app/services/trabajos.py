@@ -0,0 +1,346 @@
+"""
+Cola de trabajos en segundo plano (por ejemplo, generación de PDFs).
+
+Backends disponibles (COLA_TRABAJOS_BACKEND):
+- 'memoria': la cola vive en el proceso web y la atienden hilos propios.
+  Solo sirve con un único proceso: con varios workers de gunicorn, el
+  estado de un trabajo no se ve desde los otros procesos.
+- 'sqlite' (por defecto): la cola se guarda en un archivo SQLite compartido
+  entre los procesos web y los workers locales (`python worker.py`). Cada
+  proceso web que encola la atiende también con COLA_TRABAJOS_HILOS hilos
+  (0: solo los workers).
+
+Los trabajos idénticos (mismo tipo, parámetros y propietario) aún activos se
+reutilizan. Un trabajo 'en_proceso' sin terminar tras COLA_TRABAJOS_TIMEOUT
+segundos (el worker murió) vuelve a 'pendiente', y los trabajos terminados
+se descartan tras COLA_TRABAJOS_RETENCION segundos.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+
+# Tareas registradas: nombre -> función(**parametros) que devuelve un resultado serializable
+TAREAS = {}
+
+ESTADOS_ACTIVOS = ('pendiente', 'en_proceso')
+
+
+def registrar_tarea(nombre):
+    """Decorator para registrar una función como tarea ejecutable por la cola"""
+    def decorator(f):
+        TAREAS[nombre] = f
+        return f
+    return decorator
+
+
+def ejecutar_tarea(tipo, parametros):
+    """Ejecuta una tarea registrada; debe llamarse dentro de un contexto de aplicación"""
+    if tipo not in TAREAS:
+        raise ValueError(f'Tarea desconocida: {tipo}')
+    return TAREAS[tipo](**parametros)
+
+
+def _ahora(segundos_atras=0):
+    """Fecha UTC en ISO (sin zona, comparable como texto), opcionalmente en el pasado"""
+    fecha = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=segundos_atras)
+    return fecha.isoformat(timespec='seconds')
+
+
+def _clave_trabajo(tipo, parametros, propietario_id):
+    return tipo, json.dumps(parametros, sort_keys=True), propietario_id
+
+
+class ColaTrabajos:
+    """Interfaz común de los backends de la cola"""
+
+    def __init__(self, app, hilos=2, timeout=900, retencion=3600):
+        self.app = app
+        self.hilos = hilos
+        self.timeout = timeout
+        self.retencion = retencion
+        self._lock = threading.Lock()
+        self._hilos_iniciados = False
+
+    def _iniciar_hilos(self):
+        """Arranca (una vez por proceso) los hilos que atienden la cola"""
+        with self._lock:
+            if self._hilos_iniciados:
+                return
+            for i in range(self.hilos):
+                hilo = threading.Thread(target=self._atender, name=f'cola-trabajos-{i}', daemon=True)
+                hilo.start()
+            self._hilos_iniciados = True
+
+    def _atender(self):
+        raise NotImplementedError
+
+    def encolar(self, tipo, parametros, propietario_id=None):
+        """Agrega un trabajo y devuelve su id (reutiliza uno idéntico aún activo)"""
+        raise NotImplementedError
+
+    def obtener(self, trabajo_id):
+        """Devuelve el trabajo como diccionario o None si no existe"""
+        raise NotImplementedError
+
+    def tomar_siguiente(self):
+        """Marca como 'en_proceso' el trabajo pendiente más antiguo y lo devuelve"""
+        raise NotImplementedError
+
+    def finalizar(self, trabajo_id, resultado=None, error=None):
+        """Registra el resultado ('terminado') o el error ('error') de un trabajo"""
+        raise NotImplementedError
+
+    def procesar(self, trabajo):
+        """Ejecuta un trabajo tomado de la cola y guarda su resultado"""
+        try:
+            resultado = ejecutar_tarea(trabajo['tipo'], trabajo['parametros'])
+        except Exception as e:
+            current_app.logger.exception('Error en el trabajo %s', trabajo['id'])
+            self.finalizar(trabajo['id'], error=str(e))
+        else:
+            self.finalizar(trabajo['id'], resultado=resultado)
+
+
+class ColaMemoria(ColaTrabajos):
+    """Cola en memoria atendida por hilos del proceso actual"""
+
+    def __init__(self, app, hilos=2, retencion=3600):
+        super().__init__(app, hilos=hilos, retencion=retencion)
+        self._trabajos = {}
+        # Trabajos activos por (tipo, parámetros, propietario) y terminados por antigüedad
+        self._activos = {}
+        self._terminados = deque()
+        self._pendientes = queue.Queue()
+
+    def _purgar(self):
+        """Descarta los trabajos terminados hace más de `retencion` segundos (con el lock tomado)"""
+        limite = time.monotonic() - self.retencion
+        while self._terminados and self._terminados[0][0] < limite:
+            self._trabajos.pop(self._terminados.popleft()[1], None)
+
+    def _atender(self):
+        while True:
+            trabajo = self.tomar_siguiente(bloquear=True)
+            with self.app.app_context():
+                self.procesar(trabajo)
+
+    def encolar(self, tipo, parametros, propietario_id=None):
+        clave = _clave_trabajo(tipo, parametros, propietario_id)
+        with self._lock:
+            self._purgar()
+            if clave in self._activos:
+                return self._activos[clave]
+            trabajo_id = uuid.uuid4().hex
+            self._activos[clave] = trabajo_id
+            self._trabajos[trabajo_id] = {
+                'id': trabajo_id,
+                'tipo': tipo,
+                'parametros': dict(parametros),
+                'propietario_id': propietario_id,
+                'estado': 'pendiente',
+                'resultado': None,
+                'error': None,
+                'fecha_creacion': _ahora(),
+                'fecha_actualizacion': _ahora()
+            }
+        self._pendientes.put(trabajo_id)
+        self._iniciar_hilos()
+        return trabajo_id
+
+    def obtener(self, trabajo_id):
+        with self._lock:
+            trabajo = self._trabajos.get(trabajo_id)
+            return dict(trabajo) if trabajo else None
+
+    def tomar_siguiente(self, bloquear=False):
+        try:
+            trabajo_id = self._pendientes.get(block=bloquear)
+        except queue.Empty:
+            return None
+        with self._lock:
+            trabajo = self._trabajos[trabajo_id]
+            trabajo['estado'] = 'en_proceso'
+            trabajo['fecha_actualizacion'] = _ahora()
+            return dict(trabajo)
+
+    def finalizar(self, trabajo_id, resultado=None, error=None):
+        with self._lock:
+            trabajo = self._trabajos[trabajo_id]
+            trabajo['estado'] = 'error' if error else 'terminado'
+            trabajo['resultado'] = resultado
+            trabajo['error'] = error
+            trabajo['fecha_actualizacion'] = _ahora()
+            self._activos.pop(_clave_trabajo(trabajo['tipo'], trabajo['parametros'], trabajo['propietario_id']), None)
+            self._terminados.append((time.monotonic(), trabajo_id))
+            self._purgar()
+
+
+class ColaSQLite(ColaTrabajos):
+    """Cola persistente en un archivo SQLite, compartida entre procesos"""
+
+    def __init__(self, ruta, app=None, hilos=0, timeout=900, retencion=3600):
+        super().__init__(app, hilos=hilos, timeout=timeout, retencion=retencion)
+        self.ruta = ruta
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        with self._conectar() as conexion:
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS trabajos (
+                    id TEXT PRIMARY KEY,
+                    tipo TEXT NOT NULL,
+                    parametros TEXT NOT NULL,
+                    propietario_id INTEGER,
+                    estado TEXT NOT NULL,
+                    resultado TEXT,
+                    error TEXT,
+                    fecha_creacion TEXT NOT NULL,
+                    fecha_actualizacion TEXT NOT NULL
+                )
+            """)
+            conexion.execute('CREATE INDEX IF NOT EXISTS ix_trabajos_estado ON trabajos (estado, fecha_creacion)')
+
+    def _recuperar_vencidos(self, conexion):
+        """Devuelve a 'pendiente' los trabajos 'en_proceso' cuyo worker dejó de actualizarlos
+        y descarta los terminados hace más de `retencion` segundos"""
+        conexion.execute(
+            "UPDATE trabajos SET estado = 'pendiente', fecha_actualizacion = ? "
+            "WHERE estado = 'en_proceso' AND fecha_actualizacion < ?",
+            (_ahora(), _ahora(self.timeout))
+        )
+        conexion.execute(
+            "DELETE FROM trabajos WHERE estado IN ('terminado', 'error') AND fecha_actualizacion < ?",
+            (_ahora(self.retencion),)
+        )
+
+    def _conectar(self):
+        conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+        conexion.row_factory = sqlite3.Row
+        return conexion
+
+    @staticmethod
+    def _a_diccionario(fila):
+        trabajo = dict(fila)
+        trabajo['parametros'] = json.loads(trabajo['parametros'])
+        trabajo['resultado'] = json.loads(trabajo['resultado']) if trabajo['resultado'] else None
+        return trabajo
+
+    def encolar(self, tipo, parametros, propietario_id=None):
+        _, parametros_json, _ = _clave_trabajo(tipo, parametros, propietario_id)
+        conexion = self._conectar()
+        try:
+            conexion.execute('BEGIN IMMEDIATE')
+            self._recuperar_vencidos(conexion)
+            fila = conexion.execute(
+                'SELECT id FROM trabajos WHERE tipo = ? AND parametros = ? AND propietario_id IS ? '
+                "AND estado IN ('pendiente', 'en_proceso')",
+                (tipo, parametros_json, propietario_id)
+            ).fetchone()
+            if fila:
+                trabajo_id = fila['id']
+            else:
+                trabajo_id = uuid.uuid4().hex
+                conexion.execute(
+                    'INSERT INTO trabajos (id, tipo, parametros, propietario_id, estado, fecha_creacion, fecha_actualizacion) '
+                    "VALUES (?, ?, ?, ?, 'pendiente', ?, ?)",
+                    (trabajo_id, tipo, parametros_json, propietario_id, _ahora(), _ahora())
+                )
+            conexion.execute('COMMIT')
+        except Exception:
+            conexion.execute('ROLLBACK')
+            raise
+        finally:
+            conexion.close()
+        if self.hilos:
+            self._iniciar_hilos()
+        return trabajo_id
+
+    def obtener(self, trabajo_id):
+        conexion = self._conectar()
+        try:
+            fila = conexion.execute('SELECT * FROM trabajos WHERE id = ?', (trabajo_id,)).fetchone()
+            return self._a_diccionario(fila) if fila else None
+        finally:
+            conexion.close()
+
+    def tomar_siguiente(self):
+        conexion = self._conectar()
+        try:
+            # BEGIN IMMEDIATE evita que dos workers tomen el mismo trabajo
+            conexion.execute('BEGIN IMMEDIATE')
+            self._recuperar_vencidos(conexion)
+            fila = conexion.execute(
+                "SELECT * FROM trabajos WHERE estado = 'pendiente' ORDER BY fecha_creacion LIMIT 1"
+            ).fetchone()
+            if fila:
+                conexion.execute(
+                    "UPDATE trabajos SET estado = 'en_proceso', fecha_actualizacion = ? WHERE id = ?",
+                    (_ahora(), fila['id'])
+                )
+            conexion.execute('COMMIT')
+        except Exception:
+            conexion.execute('ROLLBACK')
+            raise
+        finally:
+            conexion.close()
+
+        if not fila:
+            return None
+        trabajo = self._a_diccionario(fila)
+        trabajo['estado'] = 'en_proceso'
+        return trabajo
+
+    def finalizar(self, trabajo_id, resultado=None, error=None):
+        conexion = self._conectar()
+        try:
+            conexion.execute(
+                'UPDATE trabajos SET estado = ?, resultado = ?, error = ?, fecha_actualizacion = ? WHERE id = ?',
+                ('error' if error else 'terminado',
+                 json.dumps(resultado) if resultado is not None else None,
+                 error, _ahora(), trabajo_id)
+            )
+        finally:
+            conexion.close()
+
+    def atender(self, app, intervalo=1.0, detener=None):
+        """Bucle del worker: procesa trabajos pendientes hasta que `detener` se active"""
+        while not (detener and detener.is_set()):
+            trabajo = self.tomar_siguiente()
+            if not trabajo:
+                time.sleep(intervalo)
+                continue
+            with app.app_context():
+                self.procesar(trabajo)
+
+    def _atender(self):
+        self.atender(self.app)
+
+
+def init_cola_trabajos(app):
+    """Crea la cola configurada y la registra en app.extensions['cola_trabajos']"""
+    backend = app.config.get('COLA_TRABAJOS_BACKEND', 'sqlite')
+    hilos = app.config.get('COLA_TRABAJOS_HILOS', 2)
+    retencion = app.config.get('COLA_TRABAJOS_RETENCION', 3600)
+    if backend == 'sqlite':
+        ruta = app.config.get('COLA_TRABAJOS_SQLITE') or os.path.join(app.instance_path, 'trabajos.db')
+        cola = ColaSQLite(ruta, app=app, hilos=hilos, timeout=app.config.get('COLA_TRABAJOS_TIMEOUT', 900),
+                          retencion=retencion)
+    elif backend == 'memoria':
+        cola = ColaMemoria(app, hilos=hilos, retencion=retencion)
+    else:
+        raise ValueError(f'Backend de cola de trabajos desconocido: {backend}')
+    app.extensions['cola_trabajos'] = cola
+    return cola
+
+
+def obtener_cola():
+    return current_app.extensions['cola_trabajos']
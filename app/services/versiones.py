@@ -0,0 +1,94 @@
+"""
+Versión de las notas de cada curso (columna cursos.version_notas).
+
+El reporte del curso, su PDF en disco, el ETag de sus páginas y los
+fragmentos de plantilla en caché se identifican por esta versión. Es un
+contador que se incrementa en la misma transacción que la escritura, así
+que dos cambios en el mismo segundo dan versiones distintas (una fecha de
+modificación de MySQL DATETIME no las distingue):
+
+- las escrituras por el ORM lo incrementan solas, desde el evento
+  before_flush de la sesión: notas y detalle del curso, matrícula
+  (curso_alumno), nombre o código del curso y nombre, apellido o DNI de un
+  alumno (en todos sus cursos);
+- las escrituras con INSERT/UPDATE directos (guardar_notas_curso,
+  matricular_en_cursos) llaman a incrementar_version_notas.
+
+Los cambios hechos fuera de la aplicación (scripts SQL) no la incrementan.
+"""
+
+from sqlalchemy import event, inspect, or_, select
+
+from app import db
+from app.models import Usuario, Curso, CursoAlumno, Nota, NotaActividades, NotaPracticas, NotaParcial
+
+# Modelos con curso_id cuyas filas aparecen en el reporte del curso
+MODELOS_CURSO = (Nota, NotaActividades, NotaPracticas, NotaParcial, CursoAlumno)
+
+# Columnas que se muestran en el reporte
+CAMPOS_CURSO = ('nombre', 'codigo')
+CAMPOS_ALUMNO = ('nombre', 'apellido', 'dni')
+
+
+def _incrementar(session, curso_ids=(), alumno_ids=()):
+    cursos, matricula = Curso.__table__, CursoAlumno.__table__
+    condiciones = []
+    if curso_ids:
+        condiciones.append(cursos.c.id.in_(sorted(set(curso_ids))))
+    if alumno_ids:
+        condiciones.append(cursos.c.id.in_(
+            select(matricula.c.curso_id).where(matricula.c.alumno_id.in_(sorted(set(alumno_ids))))
+        ))
+    if condiciones:
+        session.execute(
+            cursos.update().where(or_(*condiciones)).values(version_notas=cursos.c.version_notas + 1)
+        )
+
+
+def incrementar_version_notas(curso_ids=(), alumno_ids=()):
+    """Incrementa en la transacción actual la versión de los cursos indicados y de
+    los cursos de los alumnos indicados; el llamador confirma la transacción"""
+    _incrementar(db.session, curso_ids, alumno_ids)
+
+
+def _cambio(objeto, campos):
+    estado = inspect(objeto)
+    return any(estado.attrs[campo].history.has_changes() for campo in campos)
+
+
+def _antes_de_guardar(session, contexto, instancias):
+    curso_ids = set()
+    alumno_ids = set()
+    for objeto in session.new | session.deleted:
+        if isinstance(objeto, MODELOS_CURSO):
+            curso_ids.add(objeto.curso_id)
+    for objeto in session.dirty:
+        if isinstance(objeto, MODELOS_CURSO):
+            if session.is_modified(objeto):
+                curso_ids.add(objeto.curso_id)
+        elif isinstance(objeto, Curso):
+            if _cambio(objeto, CAMPOS_CURSO):
+                curso_ids.add(objeto.id)
+        elif isinstance(objeto, Usuario):
+            if objeto.rol == 'alumno' and _cambio(objeto, CAMPOS_ALUMNO):
+                alumno_ids.add(objeto.id)
+    curso_ids.discard(None)
+    alumno_ids.discard(None)
+    _incrementar(session, curso_ids, alumno_ids)
+
+
+def version_notas_cursos(curso_ids):
+    """{curso_id: versión} de varios cursos en una consulta"""
+    if not curso_ids:
+        return {}
+    return {
+        curso_id: str(version or 0)
+        for curso_id, version in db.session.query(Curso.id, Curso.version_notas).filter(Curso.id.in_(list(curso_ids)))
+    }
+
+
+def init_versiones_notas(app):
+    """Conecta el incremento automático de la versión a la sesión de la aplicación"""
+    db = app.extensions['sqlalchemy']
+    if not event.contains(db.session, 'before_flush', _antes_de_guardar):
+        event.listen(db.session, 'before_flush', _antes_de_guardar)
@@ -12,11 +12,11 @@ def clean_database():
     
     with app.app_context():
         print("Eliminando todas las tablas de la base de datos...")
-        db.drop_all()
+        db.drop_all(bind_key=None)
         print("✅ Todas las tablas han sido eliminadas")
         
         print("Creando tablas nuevamente...")
-        db.create_all()
+        db.create_all(bind_key=None)
         print("✅ Tablas creadas exitosamente")
         
         print("\n🎉 Base de datos limpia y lista para usar")
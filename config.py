@@ -8,35 +8,157 @@ from dotenv import load_dotenv
 # Cargar variables de entorno desde .env
 load_dotenv()
 
+# Driver de MySQL: 'mysqlconnector' (mysql-connector-python), 'mysqldb' (mysqlclient, extensión en C) o 'pymysql'
+DRIVERS_MYSQL = {'mysqlconnector': 'mysqlconnector', 'mysqlclient': 'mysqldb', 'mysqldb': 'mysqldb', 'pymysql': 'pymysql'}
+
+
+def _entero(variable, por_defecto):
+    return int(os.environ.get(variable) or por_defecto)
+
+
+def opciones_motor(pool_size=5, max_overflow=10, pool_recycle=1800):
+    """Opciones de create_engine (SQLALCHEMY_ENGINE_OPTIONS); las variables DB_* tienen prioridad.
+
+    Con varios workers de gunicorn, cada proceso abre hasta pool_size + max_overflow
+    conexiones: el total debe quedar por debajo de max_connections de MySQL.
+    """
+    return {
+        'pool_size': _entero('DB_POOL_SIZE', pool_size),
+        'max_overflow': _entero('DB_MAX_OVERFLOW', max_overflow),
+        'pool_timeout': _entero('DB_POOL_TIMEOUT', 30),  # segundos esperando una conexión libre
+        # Renovar las conexiones antes de que MySQL las cierre por wait_timeout
+        'pool_recycle': _entero('DB_POOL_RECYCLE', pool_recycle),
+        # Comprobar la conexión al sacarla del pool (evita errores por conexiones caídas)
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1').lower() in ('1', 'true', 'si'),
+        # Sentencias SQL compiladas que SQLAlchemy conserva para reutilizar
+        'query_cache_size': _entero('DB_QUERY_CACHE_SIZE', 500),
+    }
+
+
 class Config:
     """Configuración base"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'tu_clave_secreta_muy_segura_aqui'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Crear las tablas que falten al iniciar cada proceso (en producción: flask --app app crear-tablas)
+    CREAR_TABLAS_AL_INICIAR = os.environ.get('CREAR_TABLAS_AL_INICIAR', '').lower() in ('1', 'true', 'si')
+    
     # Configuración de base de datos
     DB_HOST = os.environ.get('DB_HOST') or 'localhost'
     DB_USER = os.environ.get('DB_USER') or 'root'
     DB_PASSWORD = os.environ.get('DB_PASSWORD') or ''
     DB_NAME = os.environ.get('DB_NAME') or 'sistema_academico'
     
+    DB_DRIVER = DRIVERS_MYSQL[(os.environ.get('DB_DRIVER') or 'mysqlconnector').lower()]
+    
     # URI de conexión a la base de datos
-    SQLALCHEMY_DATABASE_URI = f'mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}'
+    SQLALCHEMY_DATABASE_URI = f'mysql+{DB_DRIVER}://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}'
+    
+    # Pool de conexiones (ver opciones_motor) y tiempo máximo de los SELECT en milisegundos (0: sin límite)
+    SQLALCHEMY_ENGINE_OPTIONS = opciones_motor()
+    DB_STATEMENT_TIMEOUT_MS = _entero('DB_STATEMENT_TIMEOUT_MS', 0)
+    
+    # Réplica de solo lectura para reportes y paneles: REPLICA_DATABASE_URI o DB_REPLICA_HOST (vacío: sin réplica)
+    DB_REPLICA_HOST = os.environ.get('DB_REPLICA_HOST')
+    REPLICA_DATABASE_URI = os.environ.get('REPLICA_DATABASE_URI') or (
+        f'mysql+{DB_DRIVER}://{DB_USER}:{DB_PASSWORD}@{DB_REPLICA_HOST}/{DB_NAME}' if DB_REPLICA_HOST else None
+    )
+    SQLALCHEMY_BINDS = {'replica': REPLICA_DATABASE_URI} if REPLICA_DATABASE_URI else {}
+    # Segundos que un usuario sigue leyendo de la principal después de escribir (lee sus propias escrituras)
+    REPLICA_LECTURA_PROPIA_SEGUNDOS = _entero('REPLICA_LECTURA_PROPIA_SEGUNDOS', 10)
+    # Segundos sin usar la réplica después de un error de conexión
+    REPLICA_REINTENTO_SEGUNDOS = _entero('REPLICA_REINTENTO_SEGUNDOS', 30)
+    
+    # Cola de trabajos en segundo plano: 'sqlite' (compartida entre procesos, también con worker.py)
+    # o 'memoria' (hilos del proceso web; solo con un único proceso)
+    COLA_TRABAJOS_BACKEND = os.environ.get('COLA_TRABAJOS_BACKEND') or 'sqlite'
+    COLA_TRABAJOS_SQLITE = os.environ.get('COLA_TRABAJOS_SQLITE')  # Por defecto: instance/trabajos.db
+    COLA_TRABAJOS_HILOS = int(os.environ.get('COLA_TRABAJOS_HILOS') or 2)  # hilos por proceso web (0: solo worker.py)
+    # Segundos 'en_proceso' tras los que un trabajo se reintenta y segundos que se conservan los terminados
+    COLA_TRABAJOS_TIMEOUT = int(os.environ.get('COLA_TRABAJOS_TIMEOUT') or 900)
+    COLA_TRABAJOS_RETENCION = int(os.environ.get('COLA_TRABAJOS_RETENCION') or 3600)
+    
+    # Directorio de PDFs generados. Por defecto: instance/reportes
+    REPORTES_PDF_DIR = os.environ.get('REPORTES_PDF_DIR')
+    # Motor de los PDFs de curso: 'reportlab' (tabla directa, rápido) o 'xhtml2pdf' (plantilla HTML)
+    REPORTES_PDF_MOTOR = os.environ.get('REPORTES_PDF_MOTOR') or 'reportlab'
+    # Procesos que dibujan los PDFs de un lote (ZIP del ciclo). 0: la mitad de los núcleos
+    REPORTES_LOTE_PROCESOS = int(os.environ.get('REPORTES_LOTE_PROCESOS') or 0)
+    
+    # Hashes de contraseñas: 'procesos' (pool de CONTRASENAS_PROCESOS procesos, 0: uno por núcleo) o 'local'
+    CONTRASENAS_EJECUTOR = os.environ.get('CONTRASENAS_EJECUTOR') or 'procesos'
+    CONTRASENAS_PROCESOS = int(os.environ.get('CONTRASENAS_PROCESOS') or 0)
+    # Método de hash por rol, en el formato de werkzeug ('scrypt:32768:8:1', 'pbkdf2:sha256:600000').
+    # Las contraseñas guardadas con otro método se recalculan al iniciar sesión.
+    CONTRASENAS_METODO_ADMIN = os.environ.get('CONTRASENAS_METODO_ADMIN') or 'scrypt:32768:8:1'
+    CONTRASENAS_METODO_DOCENTE = os.environ.get('CONTRASENAS_METODO_DOCENTE') or 'scrypt:32768:8:1'
+    CONTRASENAS_METODO_ALUMNO = os.environ.get('CONTRASENAS_METODO_ALUMNO') or 'scrypt:32768:8:1'
+    
+    # Caché de la identidad del usuario autenticado: 'memoria' (LRU por proceso), 'sqlite' (compartida) o 'ninguno'
+    USUARIOS_CACHE_BACKEND = os.environ.get('USUARIOS_CACHE_BACKEND') or 'memoria'
+    USUARIOS_CACHE_TTL = int(os.environ.get('USUARIOS_CACHE_TTL') or 300)  # segundos
+    USUARIOS_CACHE_MAXIMO = int(os.environ.get('USUARIOS_CACHE_MAXIMO') or 5000)
+    USUARIOS_CACHE_SQLITE = os.environ.get('USUARIOS_CACHE_SQLITE')  # Por defecto: instance/cache.db
+    
+    # Caché de las búsquedas de autocompletado (alumnos y cursos); mismos backends
+    BUSQUEDA_CACHE_BACKEND = os.environ.get('BUSQUEDA_CACHE_BACKEND') or 'memoria'
+    BUSQUEDA_CACHE_TTL = int(os.environ.get('BUSQUEDA_CACHE_TTL') or 60)  # segundos
+    BUSQUEDA_CACHE_MAXIMO = int(os.environ.get('BUSQUEDA_CACHE_MAXIMO') or 2000)
+    BUSQUEDA_CACHE_SQLITE = os.environ.get('BUSQUEDA_CACHE_SQLITE')  # Por defecto: instance/cache.db
+    
+    # Caché del expediente de cada alumno (cursos y notas publicadas); mismos backends
+    EXPEDIENTES_CACHE_BACKEND = os.environ.get('EXPEDIENTES_CACHE_BACKEND') or 'memoria'
+    EXPEDIENTES_CACHE_TTL = int(os.environ.get('EXPEDIENTES_CACHE_TTL') or 300)  # segundos
+    EXPEDIENTES_CACHE_MAXIMO = int(os.environ.get('EXPEDIENTES_CACHE_MAXIMO') or 5000)
+    EXPEDIENTES_CACHE_SQLITE = os.environ.get('EXPEDIENTES_CACHE_SQLITE')  # Por defecto: instance/cache.db
+    
+    # Caché de fragmentos HTML de las plantillas ({% cache %}); mismos backends, 'sqlite' la guarda en archivo
+    FRAGMENTOS_CACHE_BACKEND = os.environ.get('FRAGMENTOS_CACHE_BACKEND') or 'memoria'
+    FRAGMENTOS_CACHE_TTL = int(os.environ.get('FRAGMENTOS_CACHE_TTL') or 600)  # segundos
+    FRAGMENTOS_CACHE_MAXIMO = int(os.environ.get('FRAGMENTOS_CACHE_MAXIMO') or 500)
+    FRAGMENTOS_CACHE_MAXIMO_BYTES = int(os.environ.get('FRAGMENTOS_CACHE_MAXIMO_BYTES') or 64 * 1024 * 1024)
+    FRAGMENTOS_CACHE_SQLITE = os.environ.get('FRAGMENTOS_CACHE_SQLITE')  # Por defecto: instance/cache.db
+    
+    # Perfilador de consultas SQL por petición (cabeceras X-Consultas-*, panel y /debug/consultas)
+    PERFIL_CONSULTAS = os.environ.get('PERFIL_CONSULTAS', '').lower() in ('1', 'true', 'si')
+    PERFIL_CONSULTAS_UMBRAL_REPETIDAS = int(os.environ.get('PERFIL_CONSULTAS_UMBRAL_REPETIDAS') or 5)
+    # Máximo de consultas por endpoint, p. ej. {'admin.docentes': 5}
+    PERFIL_CONSULTAS_PRESUPUESTOS = {}
+    
+    # Relaciones cargadas perezosamente (una consulta por acceso): 'permitir', 'avisar' (log) o 'error'
+    CARGA_PEREZOSA = os.environ.get('CARGA_PEREZOSA') or 'permitir'
+    
+    # ETag y 304 en las páginas de notas del alumno y los reportes de curso
+    RESPUESTAS_CONDICIONALES = os.environ.get('RESPUESTAS_CONDICIONALES', '1').lower() in ('1', 'true', 'si')
 
 
 class DevelopmentConfig(Config):
     """Configuración para desarrollo"""
     DEBUG = True
     SQLALCHEMY_ECHO = True
+    CREAR_TABLAS_AL_INICIAR = os.environ.get('CREAR_TABLAS_AL_INICIAR', '1').lower() in ('1', 'true', 'si')
+    PERFIL_CONSULTAS = True
+    CARGA_PEREZOSA = os.environ.get('CARGA_PEREZOSA') or 'avisar'
+    # Las plantillas se recargan sin reiniciar: no reutilizar páginas en el navegador
+    RESPUESTAS_CONDICIONALES = os.environ.get('RESPUESTAS_CONDICIONALES', '0').lower() in ('1', 'true', 'si')
+    FRAGMENTOS_CACHE_BACKEND = os.environ.get('FRAGMENTOS_CACHE_BACKEND') or 'ninguno'
+    SQLALCHEMY_ENGINE_OPTIONS = opciones_motor(pool_size=2, max_overflow=3)
 
 class ProductionConfig(Config):
     """Configuración para producción"""
     DEBUG = False
     SQLALCHEMY_ECHO = False
+    SQLALCHEMY_ENGINE_OPTIONS = opciones_motor(pool_size=10, max_overflow=20)
 
 class TestingConfig(Config):
     """Configuración para pruebas"""
     TESTING = True
+    CREAR_TABLAS_AL_INICIAR = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}  # SQLite en memoria usa una sola conexión (StaticPool)
+    SQLALCHEMY_BINDS = {}
+    PERFIL_CONSULTAS = True
+    CARGA_PEREZOSA = 'error'
 
 # Configuración por defecto
 config = {
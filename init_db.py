@@ -6,6 +6,7 @@ Ejecutar este script para crear las tablas y datos iniciales
 
 from app import create_app, db
 from app.models import Usuario, Curso, CursoDocente, CursoAlumno, Nota, NotaActividades, NotaPracticas, NotaParcial
+from app.services.resumenes import reconstruir_resumenes
 
 def init_database():
     """Inicializa la base de datos con tablas y datos de ejemplo"""
@@ -14,7 +15,7 @@ def init_database():
     with app.app_context():
         # Crear todas las tablas
         print("Creando tablas de la base de datos...")
-        db.create_all()
+        db.create_all(bind_key=None)
         print("✅ Tablas creadas exitosamente")
         
         # Verificar si ya existen usuarios
@@ -172,6 +173,9 @@ def init_database():
         db.session.commit()
         print("✅ Notas de ejemplo creadas exitosamente")
         
+        # Resumen de notas por curso usado por los paneles del administrador
+        reconstruir_resumenes()
+        
         print("\n" + "="*50)
         print("🎉 INICIALIZACIÓN COMPLETADA")
         print("="*50)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Script de migración de índices
+Crea en una base de datos existente los índices compuestos y las
+restricciones únicas declarados en los modelos, y las columnas agregadas a
+tablas existentes: db.create_all() solo crea tablas nuevas y no agrega
+índices ni columnas a tablas que ya existen.
+
+Uso:
+    python migrar_indices.py              # crea los índices que falten
+    python migrar_indices.py --verificar  # además revisa los planes de consulta
+"""
+
+import argparse
+import sys
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+
+from app import create_app, db
+from app.models import (Usuario, Curso, CursoDocente, CursoAlumno, NotaActividades, NotaPracticas, NotaParcial, Nota,
+                        MatriculaAlumno, ResumenCurso)
+
+MODELOS = (Usuario, Curso, CursoDocente, CursoAlumno, NotaActividades, NotaPracticas, NotaParcial, Nota,
+           MatriculaAlumno, ResumenCurso)
+
+# Columnas agregadas a tablas que ya existían
+COLUMNAS_NUEVAS = (Curso.__table__.c.version_notas,)
+
+# Columnas que los modelos declaran NOT NULL y que en bases anteriores admitían NULL
+COLUMNAS_NO_NULAS = (Nota.__table__.c.fecha_actualizacion,)
+
+
+def _duplicados(indice):
+    """Combinaciones de valores repetidas que impiden crear un índice único"""
+    columnas = list(indice.columns)
+    return db.session.query(*columnas, db.func.count()).group_by(*columnas).having(db.func.count() > 1).all()
+
+
+def agregar_columnas():
+    """Agrega las columnas de COLUMNAS_NUEVAS que falten; devuelve cuántas se agregaron"""
+    inspector = inspect(db.engine)
+    agregadas = 0
+    for columna in COLUMNAS_NUEVAS:
+        tabla = columna.table.name
+        if not inspector.has_table(tabla) or columna.name in {c['name'] for c in inspector.get_columns(tabla)}:
+            continue
+        definicion = CreateColumn(columna).compile(dialect=db.engine.dialect)
+        with db.engine.begin() as conexion:
+            conexion.execute(text(f'ALTER TABLE {tabla} ADD COLUMN {definicion}'))
+        agregadas += 1
+        print(f"✅ Columna {columna.name} agregada a {tabla}")
+    return agregadas
+
+
+def completar_fechas_actualizacion():
+    """Asigna fecha_actualizacion a las notas que no la tienen.
+
+    La paginación por clave del listado de notas ordena por
+    (fecha_actualizacion, id) y no admite valores NULL.
+    """
+    if not inspect(db.engine).has_table(Nota.__tablename__):
+        return 0
+    actualizadas = Nota.query.filter(Nota.fecha_actualizacion.is_(None)).update(
+        {Nota.fecha_actualizacion: db.func.coalesce(Nota.fecha_creacion, db.func.now())},
+        synchronize_session=False
+    )
+    db.session.commit()
+    if actualizadas:
+        print(f"✅ fecha_actualizacion asignada a {actualizadas} nota(s)")
+    return actualizadas
+
+
+def exigir_no_nulas():
+    """Declara NOT NULL en la base las columnas de COLUMNAS_NO_NULAS (después de completarlas).
+
+    Solo en MySQL (ALTER TABLE ... MODIFY); SQLite no puede cambiar una
+    columna existente. Devuelve el número de columnas modificadas.
+    """
+    inspector = inspect(db.engine)
+    modificadas = 0
+    for columna in COLUMNAS_NO_NULAS:
+        tabla = columna.table.name
+        if not inspector.has_table(tabla):
+            continue
+        actual = next((c for c in inspector.get_columns(tabla) if c['name'] == columna.name), None)
+        if actual is None or not actual['nullable']:
+            continue
+        if db.engine.dialect.name != 'mysql':
+            print(f"⚠️  {tabla}.{columna.name} admite NULL en la base; {db.engine.dialect.name} no permite cambiarla")
+            continue
+        definicion = CreateColumn(columna).compile(dialect=db.engine.dialect)
+        with db.engine.begin() as conexion:
+            conexion.execute(text(f'ALTER TABLE {tabla} MODIFY COLUMN {definicion}'))
+        modificadas += 1
+        print(f"✅ {tabla}.{columna.name} ahora es NOT NULL")
+    return modificadas
+
+
+def migrar_indices():
+    """Crea los índices de los modelos que no existan; devuelve el número de índices no creados"""
+    inspector = inspect(db.engine)
+    errores = 0
+
+    for modelo in MODELOS:
+        tabla = modelo.__table__
+        if not inspector.has_table(tabla.name):
+            print(f"⚠️  La tabla {tabla.name} no existe; se creará con sus índices al iniciar la aplicación.")
+            continue
+
+        existentes = {indice['name'] for indice in inspector.get_indexes(tabla.name)}
+        existentes |= {restriccion['name'] for restriccion in inspector.get_unique_constraints(tabla.name)}
+
+        for indice in sorted(tabla.indexes, key=lambda indice: indice.name):
+            columnas = ', '.join(columna.name for columna in indice.columns)
+            if indice.name in existentes:
+                print(f"   {indice.name} ya existe en {tabla.name}")
+                continue
+
+            if indice.unique:
+                repetidos = _duplicados(indice)
+                if repetidos:
+                    errores += 1
+                    print(f"❌ No se puede crear {indice.name}: {len(repetidos)} combinación(es) de ({columnas}) repetidas en {tabla.name}")
+                    for fila in repetidos[:10]:
+                        print(f"      {tuple(fila[:-1])} aparece {fila[-1]} veces")
+                    continue
+
+            indice.create(db.engine)
+            print(f"✅ Índice {indice.name} creado en {tabla.name} ({columnas})")
+
+    return errores
+
+
+def consultas_frecuentes():
+    """Búsquedas más usadas por la aplicación y el índice que debe resolverlas"""
+    consultas = [
+        (f'{modelo.__tablename__} por curso y alumno', modelo.query.filter_by(curso_id=1, alumno_id=1), nombre)
+        for modelo, nombre in (
+            (Nota, 'uq_notas_curso_alumno'),
+            (NotaActividades, 'uq_notas_actividades_curso_alumno'),
+            (NotaPracticas, 'uq_notas_practicas_curso_alumno'),
+            (NotaParcial, 'uq_notas_parciales_curso_alumno'),
+            (CursoAlumno, 'uq_curso_alumno')
+        )
+    ]
+    consultas.extend([
+        ('curso_alumno por curso', CursoAlumno.query.filter_by(curso_id=1), 'uq_curso_alumno'),
+        ('curso_docente por curso y docente', CursoDocente.query.filter_by(curso_id=1, docente_id=1), 'uq_curso_docente'),
+        ('matriculas_alumnos activas por alumno', MatriculaAlumno.query.filter_by(alumno_id=1, estado='activa'),
+         'ix_matriculas_alumnos_alumno_estado'),
+        ('página de notas por fecha de actualización',
+         Nota.query.order_by(Nota.fecha_actualizacion.desc(), Nota.id.desc()).limit(20),
+         'ix_notas_fecha_actualizacion_id')
+    ])
+    # Búsquedas por prefijo (autocompletado). SQLite solo resuelve LIKE con un
+    # índice si la columna usa la collation NOCASE; en MySQL el prefijo se
+    # busca como un rango del índice
+    if db.engine.dialect.name != 'sqlite':
+        consultas.extend([
+            ('alumnos por prefijo de apellido',
+             Usuario.query.filter(Usuario.rol == 'alumno', Usuario.apellido.like('Gar%')), 'ix_usuarios_rol_apellido'),
+            ('cursos por prefijo de nombre', Curso.query.filter(Curso.nombre.like('Mat%')), 'ix_cursos_nombre')
+        ])
+    return consultas
+
+
+def plan_consulta(query):
+    """Plan de ejecución de la consulta: (índices que usa o puede usar, detalle)
+
+    En SQLite se toma el índice elegido por EXPLAIN QUERY PLAN; en MySQL, las
+    columnas key y possible_keys de EXPLAIN (con tablas casi vacías el
+    optimizador puede no elegir ninguno aunque el índice sea aplicable).
+    """
+    sql = str(query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    dialecto = db.engine.dialect.name
+
+    if dialecto == 'sqlite':
+        detalle = ' | '.join(fila[-1] for fila in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')))
+        indices = {palabra for palabra in detalle.replace('(', ' ').split()}
+        return indices, detalle
+
+    if dialecto == 'mysql':
+        filas = db.session.execute(text(f'EXPLAIN {sql}')).mappings().all()
+        indices = set()
+        for fila in filas:
+            indices.add(fila.get('key'))
+            indices.update((fila.get('possible_keys') or '').split(','))
+        detalle = ' | '.join(f"key={fila.get('key')} possible_keys={fila.get('possible_keys')}" for fila in filas)
+        return indices, detalle
+
+    raise RuntimeError(f'No se pueden revisar planes de consulta en {dialecto}.')
+
+
+def verificar_planes():
+    """Filas (descripción, índice esperado, usa el índice, detalle del plan)"""
+    resultados = []
+    for descripcion, query, indice in consultas_frecuentes():
+        indices, detalle = plan_consulta(query)
+        resultados.append((descripcion, indice, indice in indices, detalle))
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crea los índices declarados en los modelos')
+    parser.add_argument('--verificar', action='store_true', help='Revisar los planes de las consultas frecuentes')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        print("Revisando índices de la base de datos...")
+        agregar_columnas()
+        completar_fechas_actualizacion()
+        exigir_no_nulas()
+        errores = migrar_indices()
+
+        if args.verificar:
+            print("\nPlanes de las consultas frecuentes:")
+            for descripcion, indice, usa_indice, detalle in verificar_planes():
+                marca = '✅' if usa_indice else '❌'
+                print(f"{marca} {descripcion}: {indice}")
+                if not usa_indice:
+                    errores += 1
+                    print(f"      {detalle}")
+
+    if errores:
+        print(f"\n⚠️  Migración incompleta: {errores} problema(s) por resolver")
+        return 1
+    print("\n🎉 Índices al día")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
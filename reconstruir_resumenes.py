@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""
+Script para reconstruir el resumen de notas por curso
+Recalcula la tabla resumen_curso a partir de todas las notas registradas.
+Ejecutarlo después de actualizar el sistema o si se modificaron notas
+directamente en la base de datos.
+"""
+
+from app import create_app
+from app.services.resumenes import reconstruir_resumenes
+
+def main():
+    """Recalcula desde cero el resumen de todos los cursos"""
+    app = create_app()
+    
+    with app.app_context():
+        print("Reconstruyendo el resumen de notas por curso...")
+        filas = reconstruir_resumenes()
+        print(f"✅ Resumen reconstruido: {filas} fila(s) curso-docente")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Worker de trabajos en segundo plano
+Atiende la cola SQLite (COLA_TRABAJOS_BACKEND=sqlite) y genera los PDFs
+solicitados desde la aplicación web.
+
+Uso:
+    python worker.py              # un proceso worker
+    python worker.py --procesos 4 # varios procesos locales
+"""
+
+import argparse
+import multiprocessing
+import os
+
+from app import create_app
+
+
+def atender(intervalo):
+    """Crea una instancia de la aplicación y procesa la cola hasta ser interrumpido"""
+    app = create_app()
+    cola = app.extensions['cola_trabajos']
+    if not hasattr(cola, 'atender'):
+        raise SystemExit("El worker requiere COLA_TRABAJOS_BACKEND=sqlite.")
+
+    print(f"👷 Worker {os.getpid()} atendiendo la cola {cola.ruta}")
+    try:
+        cola.atender(app, intervalo=intervalo)
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Worker de la cola de trabajos')
+    parser.add_argument('--procesos', type=int, default=1, help='Número de procesos worker')
+    parser.add_argument('--intervalo', type=float, default=1.0, help='Segundos de espera cuando la cola está vacía')
+    args = parser.parse_args()
+
+    if args.procesos <= 1:
+        atender(args.intervalo)
+        return
+
+    procesos = [multiprocessing.Process(target=atender, args=(args.intervalo,)) for _ in range(args.procesos)]
+    for proceso in procesos:
+        proceso.start()
+    try:
+        for proceso in procesos:
+            proceso.join()
+    except KeyboardInterrupt:
+        for proceso in procesos:
+            proceso.terminate()
+
+
+if __name__ == '__main__':
+    main()